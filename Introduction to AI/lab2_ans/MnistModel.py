@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import modelLogisticRegression as LR
 import modelTree as Tree
@@ -6,6 +7,20 @@ import modelSoftmaxRegression as SR
 import modelMultiLayerPerceptron as MLP
 import pickle
 import YourTraining as lxy
+from autograd.Serialize import loadgraph
+from autograd.Quantize import quant_path
+
+chunksize = 1024 # 批量预测时每次forward的样本数
+
+
+def chunkedforward(graph, X, chunk=chunksize):
+    """
+    分块进行正向传播, 控制中间结果占用的内存
+    @param graph: 推理流水线
+    @param X: n*... 输入样本
+    @return: n*num_class 输出
+    """
+    return np.concatenate([graph(X[i:i + chunk]) for i in range(0, X.shape[0], chunk)], axis=0)
 
 
 class NullModel:
@@ -15,6 +30,9 @@ class NullModel:
     def __call__(self, figure):
         return 0
 
+    def predict_batch(self, X):
+        return np.zeros(X.shape[0], dtype=np.int64)
+
 class LRModel:
     def __init__(self) -> None:
         with open(LR.save_path, "rb") as f:
@@ -22,61 +40,112 @@ class LRModel:
 
     def __call__(self, figure):
         pred = figure @self.weight + self.bias
+        if np.ndim(self.weight) == 2:
+            # one-vs-rest: d*10 的权重矩阵
+            return int(np.argmax(pred))
         return 0 if pred > 0 else 1
 
+    def predict_batch(self, X):
+        """
+        @param X: n*784 输入样本
+        @return: n 预测值
+        """
+        pred = X.reshape(X.shape[0], -1) @ self.weight + self.bias
+        if np.ndim(self.weight) == 2:
+            return np.argmax(pred, axis=1)
+        return np.where(pred.reshape(-1) > 0, 0, 1)
+
 class TreeModel:
     def __init__(self) -> None:
         with open(Tree.save_path, "rb") as f:
             self.root = pickle.load(f)
+        self.flat = Tree.flattenTrees([self.root])
     
     def __call__(self, figure):
         return Tree.inferTree(self.root, Tree.discretize(figure.flatten()))
 
+    def predict_batch(self, X):
+        return self.flat.infer(Tree.discretize(X.reshape(X.shape[0], -1)))[0]
+
 class ForestModel:
     def __init__(self) -> None:
         with open(Forest.save_path, "rb") as f:
             self.roots = pickle.load(f)
+        self.flat = Forest.flattenTrees(self.roots)
     
     def __call__(self, figure):
         return Forest.infertrees(self.roots, Forest.discretize(figure.flatten()))
 
+    def predict_batch(self, X):
+        return Forest.vote(self.flat.infer(Forest.discretize(X.reshape(X.shape[0], -1))))
+
 class SRModel:
     def __init__(self) -> None:
         with open(SR.save_path, "rb") as f:
             graph = pickle.load(f)
-        self.graph = graph
-        self.graph.eval()
+        self.graph = graph.compile_inference()
 
     def __call__(self, figure):
-        self.graph.flush()
-        pred = self.graph.forward(figure, removelossnode=True)[-1]
+        pred = self.graph(figure)
+        return np.argmax(pred, axis=-1)
+
+    def predict_batch(self, X):
+        pred = chunkedforward(self.graph, X.reshape(X.shape[0], -1))
         return np.argmax(pred, axis=-1)
 
 class MLPModel:
     def __init__(self) -> None:
         with open(MLP.save_path, "rb") as f:
             graph = pickle.load(f)
-        self.graph = graph
-        self.graph.eval()
+        self.graph = graph.compile_inference()
 
     def __call__(self, figure):
-        self.graph.flush()
-        pred = self.graph.forward(figure, removelossnode=True)[-1]
+        pred = self.graph(figure)
+        return np.argmax(pred, axis=-1)
+
+    def predict_batch(self, X):
+        pred = chunkedforward(self.graph, X.reshape(X.shape[0], -1))
         return np.argmax(pred, axis=-1)
 
 class CNNModel:
     def __init__(self) -> None:
-        with open(lxy.save_path, "rb") as f:
-            graph = pickle.load(f)
-        self.graph = graph
-        self.graph.eval()
+        graph = loadgraph(lxy.save_path, mmap_mode="r")
+        self.graph = graph.compile_inference()
 
     def __call__(self, figure):
         figure = figure.reshape(-1, 1, 28, 28)
-        self.graph.flush()
-        pred = self.graph.forward(figure, removelossnode=True)[-1]
+        pred = self.graph(figure)
         return np.argmax(pred, axis=-1)  
 
+    def predict_batch(self, X):
+        pred = chunkedforward(self.graph, X.reshape(-1, 1, 28, 28))
+        return np.argmax(pred, axis=-1)
+
+def loadquant(path):
+    """
+    加载quantize.py生成的int8模型
+    @param path: 浮点模型的保存路径
+    @return: 推理流水线
+    """
+    qpath = quant_path(path)
+    if not os.path.exists(qpath):
+        raise FileNotFoundError(f"{qpath} 不存在, 请先运行 python quantize.py 生成量化模型")
+    return loadgraph(qpath, mmap_mode="r").compile_inference()
+
+class QMLPModel(MLPModel):
+    '''
+    int8量化的MLP, 由quantize.py生成
+    '''
+    def __init__(self) -> None:
+        self.graph = loadquant(MLP.save_path)
+
+class QCNNModel(CNNModel):
+    '''
+    int8量化的CNN, 由quantize.py生成
+    '''
+    def __init__(self) -> None:
+        self.graph = loadquant(lxy.save_path)
+
 
 modeldict = {
     "Null": NullModel,
@@ -85,6 +154,12 @@ modeldict = {
     "Forest": ForestModel,
     "SR": SRModel,
     "MLP": MLPModel,
-    "Your": CNNModel
+    "Your": CNNModel,
 }
 
+# 量化模型不随代码提交, 只在运行quantize.py生成之后才注册
+if os.path.exists(quant_path(MLP.save_path)):
+    modeldict["QMLP"] = QMLPModel
+if os.path.exists(quant_path(lxy.save_path)):
+    modeldict["QYour"] = QCNNModel
+
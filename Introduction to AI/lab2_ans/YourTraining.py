@@ -2,10 +2,10 @@ import mnist
 from autograd.BaseGraph import Graph
 import autograd.BaseNode as BaseNode
 import numpy as np
-import pickle
-from autograd.utils import PermIterator
 from util import setseed
 from autograd.Init import * 
+from autograd.Trainer import Trainer, CosineLR, WarmupLR
+from autograd.Profiler import Profiler
 #import time
 #import pdb
 
@@ -15,6 +15,13 @@ lr = 3e-4   # Learning rate
 wd1 = 1e-4  # L1 regularization
 wd2 = 7e-4  # L2 regularization
 batchsize = 128
+max_epoch = 30
+warmup = 1          # 学习率线性warm-up的epoch数, 之后按余弦下降
+patience = 3        # 验证集准确率连续这么多个epoch没有提升时提前停止
+dtype = np.float32  # 计算精度
+channels_last = True  # 卷积部分使用(N, H, W, C)布局, 减少转置带来的复制
+profile = False     # 每个epoch输出逐节点的耗时统计, 只统计主进程中的计算, 需要num_workers = 1
+num_workers = 1     # 数据并行的进程数, 1表示单进程训练
 
 
 def buildGraph(Y):
@@ -42,10 +49,10 @@ def buildGraph(Y):
         BaseNode.Dropout(p=0.1),
         
         BaseNode.Linear(indim=128, outdim=mnist.num_class),
-        BaseNode.LogSoftmax(),
-        BaseNode.NLLLoss(Y)
+        BaseNode.SoftmaxCrossEntropy(Y)
     ]
-    graph = Graph(nodes)
+    graph = Graph(nodes, dtype=dtype)
+    graph.channelslast(channels_last)
     return graph
 
 
@@ -56,7 +63,7 @@ def buildGraph(Y):
 
 setseed(0) # 固定随机数种子以提高可复现性
 
-save_path = "model/lxy.npy"
+save_path = "model/lxy.model"
 
 
 val_X = mnist.val_X
@@ -80,46 +87,26 @@ val_Y = val_Y[num_val_samples:]
 trn_X = np.concatenate((mnist.trn_X, val_X_to_train), axis=0)
 trn_Y = np.concatenate((mnist.trn_Y, val_Y_to_train), axis=0)
 
-X = trn_X.reshape(-1, 1, 28, 28)
+X = trn_X.reshape(-1, 1, 28, 28).astype(dtype)
 Y = trn_Y
 
 if __name__ == "__main__":
     #print(mnist.val_X.shape)
     #pdb.set_trace()
     graph = buildGraph(Y)
-    # 训练
-    best_train_acc = 0
-    dataloader = PermIterator(X.shape[0], batchsize)
-    for i in range(1, 30+1):
-        #start_time = time.time()
-        hatys = []
-        ys = []
-        losss = []
-        graph.train()
-        for perm in dataloader:
-            #print(f"this mini-batch used time: {time.time() - start_time}")
-            tX = X[perm]
-            tY = Y[perm]
-            graph[-1].y = tY
-            graph.flush()
-            pred, loss = graph.forward(tX)[-2:]
-            hatys.append(np.argmax(pred, axis=1))
-            ys.append(tY)
-            graph.backward()
-            graph.optimstep(lr, wd1, wd2)
-            losss.append(loss)
-        loss = np.average(losss)
-        acc = np.average(np.concatenate(hatys)==np.concatenate(ys))
-        print(f"epoch {i} loss {loss:.3e} acc {acc:.4f}")
-        if acc > best_train_acc:
-            best_train_acc = acc
-            with open(save_path, "wb") as f:
-                pickle.dump(graph, f)
+    if profile:
+        graph.profile(Profiler())
+    # 训练: 后台预取batch, 每个epoch在验证集上评估, 最好的模型在后台写入save_path
+    schedule = WarmupLR(CosineLR(lr, max_epoch), warmup)
+    with Trainer(graph, X, Y, batchsize, schedule, wd1, wd2,
+                 valX=val_X.reshape(-1, 1, 28, 28), valY=val_Y, patience=patience,
+                 save_path=save_path, num_workers=num_workers) as trainer:
+        trainer.fit(max_epoch)
 
 
     '''# 验证
-    with open(save_path, "rb") as f:
-        graph = pickle.load(f)
+    from autograd.Serialize import loadgraph
+    graph = loadgraph(save_path)
     graph.eval()
 
     data_X, data_Y = val_X, val_Y
@@ -147,8 +134,7 @@ if __name__ == "__main__":
     
     
     # 测试
-    with open(save_path, "rb") as f:
-        graph = pickle.load(f)
+    graph = loadgraph(save_path)
     graph.eval()
 
     data_X, data_Y = mnist.data, mnist.targets
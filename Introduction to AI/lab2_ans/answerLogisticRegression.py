@@ -1,22 +1,30 @@
+import pickle
 import numpy as np
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    # 没有scipy时只能使用稠密输入
+    sparse = None
 
 # 超参数
 # TODO: You can change the hyperparameters here
 lr = 1 # 学习率
 wd = 1e-5  # l2正则化项系数
+batchsize = 128  # one-vs-rest训练的mini-batch大小
+max_epoch = 10   # one-vs-rest训练的epoch数
 
 
 def predict(X, weight, bias):
     """
     使用输入的weight和bias预测样本X是否为数字0
-    @param X: n*d 每行是一个输入样本。n: 样本数量, d: 样本的维度
+    @param X: n*d 每行是一个输入样本。n: 样本数量, d: 样本的维度, 可以是tocsr得到的稀疏矩阵
     @param weight: d*1
     @param bias: 1*1
     @return: wx+b
     """
     # TODO: YOUR CODE HERE
-    return np.dot(X, weight) + bias # (n, )
-        # dot: 矩阵乘列向量
+    return X @ weight + bias # (n, )
+        # @: 矩阵乘列向量, 对稀疏矩阵只计算非零元素
         # +: element-wise(broadcast)
 
 def sigmoid(x):
@@ -25,10 +33,21 @@ def sigmoid(x):
     return 1 / (np.exp(-x) + 1)
         # numpy的函数可以以矩阵为参数,进行element-wise mapping
 
+def tocsr(X):
+    """
+    把二值化后大部分为0的样本转为CSR稀疏矩阵, predict和step中的矩阵乘法只计算非零元素
+    @param X: n*d 稠密样本
+    @return: n*d scipy.sparse.csr_matrix
+    """
+    if sparse is None:
+        raise ImportError("tocsr 需要安装scipy")
+    return sparse.csr_matrix(X)
+
+
 def step(X, weight, bias, Y):
     """
     单步训练, 进行一次forward、backward和参数更新
-    @param X: n*d 每行是一个训练样本。 n: 样本数量， d: 样本的维度
+    @param X: n*d 每行是一个训练样本。 n: 样本数量， d: 样本的维度, 可以是tocsr得到的稀疏矩阵
     @param weight: d*1
     @param bias: 1*1
     @param Y: n 样本的label, 1表示为数字0, -1表示不为数字0
@@ -48,10 +67,103 @@ def step(X, weight, bias, Y):
     loss += l2_regularization
     
     temp = (1 - p) * Y # (n, )
-    grad = -np.mean(temp.reshape(-1, 1) * X, axis=0) # (d, )
+    grad = -(X.T @ temp) / X.shape[0] # (d, )
+        # 不构造n*d的临时矩阵
     b_grad = -np.mean(temp) # scalar
     
     weight -= lr * (grad + 2 * wd * weight)  # (d, )
     bias -= lr * b_grad  # scalar
     
-    return haty, loss, weight, bias
\ No newline at end of file
+    return haty, loss, weight, bias
+
+
+def logsigmoid(x):
+    """
+    数值稳定的 log(sigmoid(x)) = min(x, 0) - log(1 + exp(-|x|)), 不需要clip
+    """
+    return np.minimum(x, 0) - np.log1p(np.exp(-np.abs(x)))
+
+
+def stepOVR(X, weight, bias, Y):
+    """
+    one-vs-rest的单步训练: 所有类别的二分类器在一次矩阵乘法中同时计算, 原地更新参数
+    @param X: n*d 每行是一个训练样本, 可以是tocsr得到的稀疏矩阵
+    @param weight: d*k 第j列是"是否为数字j"的二分类器
+    @param bias: k
+    @param Y: n 样本的label, 取值为0~k-1
+    @return:
+        haty: n*k 各二分类器的输出
+        loss: 各二分类器交叉熵损失之和
+    """
+    n = X.shape[0]
+    haty = predict(X, weight, bias) # (n, k)
+    # 第j列: label为j时为1, 否则为-1
+    sign = np.where(Y.reshape(-1, 1) == np.arange(weight.shape[1]), 1.0, -1.0) # (n, k)
+    z = haty * sign
+    loss = -np.sum(logsigmoid(z)) / n + wd * np.sum(np.square(weight))
+
+    # temp = (1 - sigmoid(z)) * sign = sigmoid(-z) * sign
+    temp = np.exp(logsigmoid(-z))
+    temp *= sign
+    grad = -(X.T @ temp) / n # (d, k)
+    b_grad = -np.mean(temp, axis=0) # (k, )
+
+    grad += 2 * wd * weight
+    weight -= lr * grad
+    bias -= lr * b_grad
+    return haty, loss
+
+
+class OVRPredictor:
+    '''
+    one-vs-rest分类器, 预测为输出最大的类别
+    '''
+    def __init__(self, weight, bias):
+        self.weight = weight
+        self.bias = bias
+
+    def __call__(self, X):
+        """
+        @param X: n*d 输入样本
+        @return: n 预测的类别
+        """
+        if X.ndim > 2:
+            X = X.reshape(X.shape[0], -1)
+        return np.argmax(predict(X, self.weight, self.bias), axis=1)
+
+    def save(self, path):
+        """
+        以(weight, bias)的形式保存, 与二分类模型相同, MnistModel.LRModel可以直接加载
+        @param path: 文件路径, 如modelLogisticRegression.save_path
+        """
+        with open(path, "wb") as f:
+            pickle.dump((self.weight, self.bias), f)
+
+
+def trainOVR(X, Y, num_class=10, verbose=False):
+    """
+    用打乱的mini-batch同时训练num_class个"是否为数字j"的二分类器
+    @param X: n*d 训练样本, 可以是tocsr得到的稀疏矩阵
+    @param Y: n 样本的label, 取值为0~num_class-1
+    @param num_class: 类别数
+    @param verbose: 是否输出每个epoch的loss和准确率
+    @return: OVRPredictor
+    """
+    n, d = X.shape
+    # 二值化的输入可能是整数或bool, 参数至少为float32
+    dtype = np.result_type(X.dtype, np.float32)
+    weight = np.zeros((d, num_class), dtype=dtype)
+    bias = np.zeros(num_class, dtype=dtype)
+    for i in range(1, max_epoch + 1):
+        perm = np.random.permutation(n)
+        losss = []
+        hatys = []
+        for j in range(0, n, batchsize):
+            idx = perm[j:j + batchsize]
+            haty, loss = stepOVR(X[idx], weight, bias, Y[idx])
+            losss.append(loss)
+            hatys.append(np.argmax(haty, axis=1))
+        if verbose:
+            acc = np.mean(np.concatenate(hatys) == Y[perm])
+            print(f"epoch {i} loss {np.mean(losss):.3e} acc {acc:.4f}")
+    return OVRPredictor(weight, bias)
@@ -21,8 +21,7 @@ def buildGraph(Y):
         Linear(mnist.num_feat, 128),
         relu(),
         Linear(128, mnist.num_class),
-        LogSoftmax(),
-        NLLLoss(Y)
+        SoftmaxCrossEntropy(Y)
     ]
     graph = Graph(nodes)
     return graph
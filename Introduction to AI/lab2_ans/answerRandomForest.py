@@ -1,4 +1,6 @@
 from numpy.random import rand
+import multiprocessing as mp
+from multiprocessing import shared_memory
 import mnist
 from answerTree import *
 import numpy as np
@@ -10,36 +12,139 @@ num_tree = 128     # 树的数量
 ratio_data = 1 - 1e-2   # 采样的数据比例
 ratio_feat = 0.1 # 采样的特征比例
 hyperparams = {"depth": 17, "purity_bound": 1 - 1.7e-1, "gainfunc": negginiDA} # 每颗树的超参数
+num_workers = 1    # 训练和批量预测使用的进程数, 1表示单进程
+seed = 0           # 每棵树的随机数种子都由它确定地派生, 与进程数无关
+oob_patience = None # OOB准确率连续这么多棵树提升不超过oob_tol时停止加树, None表示总是训练num_tree棵
+oob_tol = 1e-3
 
 
-def buildtrees(X, Y):
+def buildonetree(Xc, Yc, values, labels, seedseq):
+    """
+    用编码后的数据构建一棵树
+    @param Xc, values: encode(X)的结果
+    @param Yc, labels: encode(Y)的结果
+    @param seedseq: 这棵树的np.random.SeedSequence
+    @return: (tree, oob, oobpred)
+        tree: 决策树, feature_indices记录了使用的特征
+        oob: 没有被采样到的样本下标(袋外样本)
+        oobpred: 这棵树对袋外样本的预测, 为labels中的下标
+    """
+    rng = np.random.default_rng(seedseq)
+    n, d = Xc.shape
+    num_samples = int(n * ratio_data)
+    num_features = int(d * ratio_feat)
+
+    sample_indices = rng.choice(n, num_samples, replace=True)
+    feature_indices = rng.choice(d, num_features, replace=False)
+
+    # 有放回采样用每个样本被采到的次数表示
+    weight = np.bincount(sample_indices, minlength=n).astype(np.float64)
+    countfunc = countgains.get(hyperparams["gainfunc"])
+    if countfunc is None:
+        X_sample = Xc[sample_indices][:, feature_indices]
+        tree = buildTree(values[X_sample], labels[Yc[sample_indices]], list(range(num_features)), hyperparams["depth"], hyperparams["purity_bound"], hyperparams["gainfunc"])
+    else:
+        # 不复制数据: 在Xc上用(行下标, 列下标)建树
+        rows = np.flatnonzero(weight)
+        tree = buildTreeIdx(Xc, Yc, values, labels, rows, list(feature_indices), hyperparams["depth"], hyperparams["purity_bound"], countfunc, weight)
+        remapFeatures(tree, feature_indices)
+    tree.feature_indices = feature_indices # 要记录顺序，否则特征乱了，训练和测试不匹配就出问题了
+
+    # 在编码后的数据上预测袋外样本: 把树中的特征取值和label都换成编码
+    oob = np.flatnonzero(weight == 0)
+    flat = flattenTrees([tree])
+    flat.values = np.searchsorted(values, flat.values)
+    flat.label = np.searchsorted(labels, flat.label)
+    return tree, oob, flat.infer(Xc, oob)[0]
+
+
+# 工作进程中共享的只读数据
+_shared = {}
+
+
+def _initworker(specs, values, labels):
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        _shared[key + "_shm"] = shm
+    _shared["values"] = values
+    _shared["labels"] = labels
+
+
+def _buildworker(seedseq):
+    return buildonetree(_shared["Xc"], _shared["Yc"], _shared["values"], _shared["labels"], seedseq)
+
+
+def buildtrees(X, Y, oob: bool = False):
     """
     构建随机森林
     @param X: n*d, 每行是一个输入样本。 n: 样本数量， d: 样本的维度
     @param Y: n, 样本的label
-    @return: List of DecisionTrees, 随机森林
+    @param oob: 是否同时返回OOB准确率曲线, 由训练脚本输出
+    @return: List of DecisionTrees, 随机森林; oob为True时为(trees, curve), 见buildtreesOOB
     """
     # TODO: YOUR CODE HERE
     # 提示：整体流程包括样本扰动、属性扰动和预测输出
-    trees = []
+    trees, curve = buildtreesOOB(X, Y)
+    return (trees, curve) if oob else trees
 
-    n, d = X.shape
-    num_samples = int(n * ratio_data)
-    num_features = int(d * ratio_feat)
-    
-    for _ in range(num_tree):
-        sample_indices = np.random.choice(n, num_samples, replace=True)
-        X_sample = X[sample_indices]
-        Y_sample = Y[sample_indices]
 
-        feature_indices = np.random.choice(d, num_features, replace=False)
-        X_sample = X_sample[:, feature_indices]
+def buildtreesOOB(X, Y):
+    """
+    构建随机森林, 同时记录袋外(OOB)投票
+    每加入一棵树, 用目前所有树对袋外样本的投票计算一次OOB准确率;
+    oob_patience不为None时, OOB准确率不再提升就提前停止
+    @param X: n*d, 每行是一个输入样本
+    @param Y: n, 样本的label
+    @return: (trees, curve) 随机森林, 以及curve[i]为前i+1棵树的OOB准确率
+    """
+    values, Xc = encode(X)
+    labels, Yc = encode(Y)
+    seeds = np.random.SeedSequence(seed).spawn(num_tree)
+    votes = np.zeros((Xc.shape[0], labels.size), dtype=np.int32)
+    trees, curve = [], []
+    best, since = 0.0, 0
 
-        tree = buildTree(X_sample, Y_sample, list(range(num_features)), hyperparams["depth"], hyperparams["purity_bound"], hyperparams["gainfunc"])
-        tree.feature_indices = feature_indices # 要记录顺序，否则特征乱了，训练和测试不匹配就出问题了
+    def addtree(result):
+        # 返回是否应该停止
+        nonlocal best, since
+        tree, oob, oobpred = result
         trees.append(tree)
-    
-    return trees
+        votes[oob, oobpred] += 1
+        voted = np.flatnonzero(votes.any(axis=1))
+        acc = np.mean(np.argmax(votes[voted], axis=1) == Yc[voted]) if voted.size > 0 else 0.0
+        curve.append(float(acc))
+        if acc > best + oob_tol:
+            best, since = acc, 0
+        else:
+            since += 1
+        return oob_patience is not None and since >= oob_patience
+
+    if num_workers <= 1:
+        for s in seeds:
+            if addtree(buildonetree(Xc, Yc, values, labels, s)):
+                break
+        return trees, curve
+
+    # 编码后的训练数据放在共享内存中, 各进程只读, 不需要逐个pickle
+    shms = []
+    specs = {}
+    for key, arr in [("Xc", Xc), ("Yc", Yc)]:
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.copyto(np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf), arr)
+        shms.append(shm)
+        specs[key] = (shm.name, arr.shape, arr.dtype)
+    try:
+        # imap按顺序返回, 提前停止时退出with会终止还在训练的进程
+        with mp.Pool(num_workers, initializer=_initworker, initargs=(specs, values, labels)) as pool:
+            for result in pool.imap(_buildworker, seeds):
+                if addtree(result):
+                    break
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return trees, curve
 
 def infertrees(trees, X):
     """
@@ -55,3 +160,65 @@ def infertrees(trees, X):
     pred = list(filter(lambda x: not np.isnan(x), pred))
     upred, ucnt = np.unique(pred, return_counts=True)
     return upred[np.argmax(ucnt)]
+
+
+def vote(preds):
+    """
+    多数投票, 票数相同时取较小的label, 与infertrees一致
+    @param preds: num_tree*n, 每棵树的预测
+    @return: n, 得票最多的label
+    """
+    labels, inv = np.unique(preds, return_inverse=True)
+    inv = inv.reshape(preds.shape)
+    counts = np.zeros((preds.shape[1], labels.size), dtype=np.int64)
+    cols = np.arange(preds.shape[1])
+    for row in inv:
+        counts[cols, row] += 1
+    return labels[np.argmax(counts, axis=1)]
+
+
+def _initinfer(flat):
+    _shared["flat"] = flat
+
+
+def _inferworker(X):
+    return _shared["flat"].infer(X)
+
+
+def infertreesBatch(trees, X, workers: int = None):
+    """
+    随机森林批量预测, 样本被切分到多个进程上
+    @param trees: 随机森林
+    @param X: n*d, 每行是一个输入样本
+    @param workers: 进程数, 默认为num_workers
+    @return: n, 预测的label
+    """
+    flat = flattenTrees(trees)
+    workers = num_workers if workers is None else workers
+    if workers <= 1 or X.shape[0] < workers:
+        return vote(flat.infer(X))
+    # 森林只在启动每个进程时传一次, 之后只传样本
+    with mp.Pool(workers, initializer=_initinfer, initargs=(flat,)) as pool:
+        preds = pool.map(_inferworker, np.array_split(X, workers))
+    return vote(np.concatenate(preds, axis=1))
+
+
+def printOOB(curve, every: int = 8):
+    """
+    输出OOB准确率曲线
+    @param curve: buildtrees(X, Y, oob=True)返回的曲线
+    @param every: 每隔多少棵树输出一行, 最后一棵树总会输出
+    """
+    for i, acc in enumerate(curve, start=1):
+        if i % every == 0 or i == len(curve):
+            print(f"trees {i:4d}  oob acc {acc:.4f}")
+    if len(curve) < num_tree:
+        print(f"OOB准确率连续{oob_patience}棵树没有提升, 在第{len(curve)}棵树停止")
+
+
+if __name__ == "__main__":
+    # 用训练集的OOB准确率选择num_tree和oob_patience, 不需要验证集上的推理
+    from modelRandomForest import discretize
+    X = discretize(mnist.trn_X.reshape(mnist.trn_X.shape[0], -1))
+    trees, curve = buildtrees(X, mnist.trn_Y, oob=True)
+    printOOB(curve)
@@ -83,6 +83,103 @@ def negginiDA(X: np.ndarray, Y: np.ndarray, idx: int):
     return ret
 
 
+def entropyCounts(counts: np.ndarray):
+    """
+    由计数计算熵
+    @param counts: (..., k) 最后一维为各类别的样本数
+    @return: (...) 熵, 样本数为0时为0
+    """
+    total = counts.sum(axis=-1, keepdims=True)
+    probs = counts / np.maximum(total, 1)
+    return -np.sum(probs * np.log2(probs + EPS), axis=-1)
+
+
+def giniCounts(counts: np.ndarray):
+    """
+    由计数计算基尼指数
+    @param counts: (..., k) 最后一维为各类别的样本数
+    @return: (...) 基尼指数
+    """
+    total = counts.sum(axis=-1, keepdims=True)
+    probs = counts / np.maximum(total, 1)
+    return 1 - np.sum(probs * probs, axis=-1)
+
+
+def gainCounts(counts: np.ndarray):
+    """
+    由计数矩阵同时计算所有候选特征的信息增益, 与gain相同
+    @param counts: f*v*k, counts[i, j, c]为第i个候选特征取第j个值且label为第c类的样本数
+    @return: f 信息增益
+    """
+    featcnt = counts.sum(axis=2)
+    featp = featcnt / featcnt.sum(axis=1, keepdims=True)
+    return entropyCounts(counts.sum(axis=1)) - np.sum(featp * entropyCounts(counts), axis=1)
+
+
+def gainratioCounts(counts: np.ndarray):
+    """
+    由计数矩阵计算信息增益比, 与gainratio相同
+    """
+    return gainCounts(counts) / (entropyCounts(counts.sum(axis=2)) + EPS)
+
+
+def negginiDACounts(counts: np.ndarray):
+    """
+    由计数矩阵计算负的基尼指数增益, 与negginiDA相同
+    """
+    featcnt = counts.sum(axis=2)
+    featp = featcnt / featcnt.sum(axis=1, keepdims=True)
+    return giniCounts(counts.sum(axis=1)) - np.sum(featp * giniCounts(counts), axis=1)
+
+
+# 信息增益函数对应的基于计数矩阵的实现, 以函数对象为键, 同名的其他函数不会被替换
+countgains = {gain: gainCounts, gainratio: gainratioCounts, negginiDA: negginiDACounts}
+
+# countMatrix每次处理的 样本数*特征数 上限, 限制key和权重临时数组的大小
+COUNT_CHUNK = 1 << 22
+
+
+def countMatrix(Xc: np.ndarray, Yc: np.ndarray, idx: np.ndarray, feats: List[int], numvalues: int, numclasses: int, weight: np.ndarray = None):
+    """
+    按特征分块用bincount得到所有候选特征的 (特征值 * 类别) 计数矩阵
+    @param Xc: n*d 编码后的特征, 取值为0..numvalues-1
+    @param Yc: n 编码后的label, 取值为0..numclasses-1
+    @param idx: 当前节点的样本下标
+    @param feats: 候选特征
+    @param weight: n 每个样本被计数的次数(如bootstrap采样次数), None表示都为1
+    @return: len(feats)*numvalues*numclasses
+    """
+    numfeats = len(feats)
+    feats = np.asarray(feats)
+    counts = np.empty((numfeats, numvalues * numclasses), dtype=np.int64 if weight is None else np.float64)
+    y = Yc[idx].astype(np.int32)[:, None]
+    w = None if weight is None else weight[idx]
+    step = max(1, COUNT_CHUNK // max(idx.size, 1))
+    for start in range(0, numfeats, step):
+        chunk = feats[start:start + step]
+        # 块内的key不超过 step*numvalues*numclasses, int32足够
+        key = Xc[np.ix_(idx, chunk)].astype(np.int32)
+        key += (np.arange(chunk.size, dtype=np.int32) * numvalues)[None, :]
+        key *= numclasses
+        key += y
+        cw = None if w is None else np.repeat(w, chunk.size)
+        counts[start:start + chunk.size] = np.bincount(key.ravel(), weights=cw, minlength=chunk.size * numvalues * numclasses).reshape(chunk.size, -1)
+    return counts.reshape(numfeats, numvalues, numclasses)
+
+
+def encode(A: np.ndarray):
+    """
+    把取值编码为0..v-1的整数
+    @return: (values, codes) values[codes] == A
+    """
+    if np.issubdtype(A.dtype, np.integer) and A.size > 0 and A.min() >= 0 and A.max() < 256:
+        # 已经是较小的非负整数, 不需要排序
+        return np.arange(A.max() + 1, dtype=A.dtype), A.astype(np.uint8)
+    values, codes = np.unique(A, return_inverse=True)
+    dtype = np.uint8 if values.size <= 256 else np.int64
+    return values, codes.reshape(A.shape).astype(dtype)
+
+
 class Node:
     """
     决策树中使用的节点类
@@ -102,6 +199,61 @@ class Node:
 
 
 def buildTree(X: np.ndarray, Y: np.ndarray, unused: List[int], depth: int, purity_bound: float, gainfunc: Callable, prefixstr=""):
+    countfunc = countgains.get(gainfunc)
+    if countfunc is None:
+        return buildTreeSplit(X, Y, unused, depth, purity_bound, gainfunc, prefixstr)
+    values, Xc = encode(X)
+    labels, Yc = encode(Y)
+    return buildTreeIdx(Xc, Yc, values, labels, np.arange(X.shape[0]), list(unused), depth, purity_bound, countfunc)
+
+
+def buildTreeIdx(Xc: np.ndarray, Yc: np.ndarray, values: np.ndarray, labels: np.ndarray, idx: np.ndarray,
+                 unused: List[int], depth: int, purity_bound: float, countfunc: Callable, weight: np.ndarray = None):
+    """
+    基于计数矩阵的建树, 子节点只记录样本下标, 不复制数据
+    @param Xc, values: encode(X)的结果
+    @param Yc, labels: encode(Y)的结果
+    @param idx: 当前节点的样本下标
+    @param unused: 可用的特征, 即Xc的列下标
+    @param countfunc: countgains中的函数
+    @param weight: n 每个样本的计数, 与在idx中重复该样本相同; None表示都为1
+    @return: 与buildTree相同的决策树
+    """
+    root = Node()
+    ucnt = np.bincount(Yc[idx], weights=None if weight is None else weight[idx], minlength=labels.size)
+    root.label = labels[np.argmax(ucnt)]
+    if depth == 0 or len(unused) == 0 or np.max(ucnt) / np.sum(ucnt) >= purity_bound:
+        return root
+
+    counts = countMatrix(Xc, Yc, idx, unused, values.size, labels.size, weight)
+    best = np.argmax(countfunc(counts))
+    root.featidx = unused[best]
+    unused = unused[:best] + unused[best + 1:]
+    # 按特征值把下标分组, 组内保持原顺序
+    feat = Xc[idx, root.featidx]
+    order = np.argsort(feat, kind="stable")
+    featcnt = np.bincount(feat, minlength=values.size)
+    bounds = np.cumsum(featcnt)
+    for code in np.flatnonzero(featcnt):
+        sub = idx[order[bounds[code] - featcnt[code]:bounds[code]]]
+        root.children[values[code]] = buildTreeIdx(Xc, Yc, values, labels, sub, unused, depth - 1, purity_bound, countfunc, weight)
+    return root
+
+
+def remapFeatures(root: Node, feature_indices: np.ndarray):
+    """
+    把树中的featidx从Xc的列下标改为在feature_indices中的位置
+    """
+    pos = {f: i for i, f in enumerate(feature_indices)}
+    queue = [root]
+    for node in queue:
+        if not node.isLeaf():
+            node.featidx = pos[node.featidx]
+            queue.extend(node.children.values())
+
+
+def buildTreeSplit(X: np.ndarray, Y: np.ndarray, unused: List[int], depth: int, purity_bound: float, gainfunc: Callable, prefixstr=""):
+    # 逐特征调用gainfunc并复制子矩阵的建树方式, 用于没有计数矩阵实现的gainfunc
     root = Node()
     u, ucnt = np.unique(Y, return_counts=True)
     root.label = u[np.argmax(ucnt)]
@@ -122,7 +274,7 @@ def buildTree(X: np.ndarray, Y: np.ndarray, unused: List[int], depth: int, purit
     # 提示：可以使用prefixstr来打印决策树的结构
     # TODO: YOUR CODE HERE
     for u in ufeat:
-        child = buildTree(X[feat == u], Y[feat == u], unused, depth - 1, purity_bound, gainfunc, prefixstr + "  ")
+        child = buildTreeSplit(X[feat == u], Y[feat == u], unused, depth - 1, purity_bound, gainfunc, prefixstr + "  ")
         root.children[u] = child
     
     return root
@@ -139,3 +291,84 @@ def inferTree(root: Node, x: np.ndarray):
         return root.label
     child = root.children.get(x[root.featidx], None)
     return root.label if child is None else inferTree(child, x)
+
+
+class FlatTree:
+    """
+    数组形式的决策树, 也可以存放多棵树(随机森林)
+    """
+    def __init__(self, featidx: np.ndarray, label: np.ndarray, children: np.ndarray, values: np.ndarray, roots: np.ndarray):
+        self.featidx = featidx      # 节点i划分用的特征(原始输入中的下标), 叶节点为-1
+        self.label = label          # 节点i的标签
+        self.children = children    # children[i, j]: 节点i在特征值为values[j]时的子节点, 不存在为-1
+        self.values = values        # 排好序的全部特征取值
+        self.roots = roots          # 每棵树根节点的编号
+
+    def infer(self, X: np.ndarray, rows: np.ndarray = None):
+        """
+        批量预测: 所有(树, 样本)对同时沿树下降, 每次循环前进一层
+        @param X: n*d 输入样本
+        @param rows: 只预测X中的这些行, 不复制X; None表示全部
+        @return: num_tree*n 每棵树的预测值
+        """
+        if rows is None:
+            rows = np.arange(X.shape[0])
+        n = rows.size
+        cur = np.repeat(self.roots, n)
+        sample = np.tile(rows, self.roots.size)
+        active = np.flatnonzero(self.featidx[cur] >= 0)
+        while active.size > 0:
+            nodes = cur[active]
+            v = X[sample[active], self.featidx[nodes]]
+            j = np.minimum(np.searchsorted(self.values, v), self.values.size - 1)
+            child = np.where(self.values[j] == v, self.children[nodes, j], -1)
+            # 没有对应子节点的样本停在当前节点, 使用当前节点的标签
+            move = child >= 0
+            active = active[move]
+            cur[active] = child[move]
+            active = active[self.featidx[cur[active]] >= 0]
+        return self.label[cur].reshape(self.roots.size, n)
+
+
+def flattenTrees(roots: List[Node]):
+    """
+    把buildTree得到的树编译为FlatTree
+    若树有feature_indices(随机森林中的树), featidx会映射回原始输入的特征下标
+    @param roots: 根节点列表
+    @return: FlatTree
+    """
+    nodes = []
+    featidx = []
+    rootidx = []
+    for root in roots:
+        fmap = getattr(root, "feature_indices", [])
+        fmap = np.asarray(fmap) if len(fmap) > 0 else None
+        rootidx.append(len(nodes))
+        # 广度优先, 避免深树的递归
+        queue = [root]
+        for node in queue:
+            nodes.append(node)
+            if node.isLeaf():
+                featidx.append(-1)
+            else:
+                featidx.append(node.featidx if fmap is None else fmap[node.featidx])
+                queue.extend(node.children.values())
+
+    index = {id(node): i for i, node in enumerate(nodes)}
+    values = np.unique(np.array([u for node in nodes for u in node.children.keys()]))
+    children = np.full((len(nodes), max(values.size, 1)), -1, dtype=np.int64)
+    for i, node in enumerate(nodes):
+        for u, child in node.children.items():
+            children[i, np.searchsorted(values, u)] = index[id(child)]
+    label = np.array([node.label for node in nodes])
+    return FlatTree(np.array(featidx, dtype=np.int64), label, children, values, np.array(rootidx, dtype=np.int64))
+
+
+def inferTreeBatch(root: Node, X: np.ndarray):
+    """
+    批量预测
+    @param root: 决策树的根节点
+    @param X: n*d 输入样本
+    @return: n 预测值
+    """
+    return flattenTrees([root]).infer(X)[0]
@@ -1,14 +1,104 @@
+import copy
 from .BaseNode import *
+from .Optimizer import Optimizer, SGD
+from .Inference import InferenceGraph, compile_inference
+from .Profiler import Profiler
 from typing import List
 
 class Graph(List):
     '''
     计算图类
     '''
-    def __init__(self, nodes: List[Node]):
+    def __init__(self, nodes: List[Node], optimizer: Optimizer = None, dtype=None):
+        """
+        @param nodes: 计算图中的节点
+        @param optimizer: 优化器, 默认为普通SGD
+        @param dtype: 计算精度, 如np.float32。None表示不做转换, 沿用参数和输入的精度
+        """
         super().__init__()
         for node in nodes:
             self.append(node)
+        self.optimizer = SGD() if optimizer is None else optimizer
+        self.dtype = None
+        # 梯度检查点: 各段的起始节点下标, None表示不使用
+        self.checkpoints = None
+        # 检查点模式下forward保存的各段输入
+        self.saved = []
+        # 逐节点性能统计, None表示不统计
+        self.profiler = None
+        # 卷积部分是否使用(N, H, W, C)布局, 由节点的设置决定(加载的模型也保持训练时的布局)
+        self.channels_last = any(getattr(node, "channels_last", False) for node in self)
+        if dtype is not None:
+            self.astype(dtype)
+
+    def astype(self, dtype):
+        """
+        设置计算精度: 参数、激活值和梯度都使用dtype, 输入在forward时转换
+        loss求和与BatchNorm的统计量仍使用float64累加
+        @param dtype: np.float32 或 np.float64
+        """
+        self.dtype = np.dtype(dtype)
+        for node in self:
+            node.astype(self.dtype)
+        # 参数已替换, 优化器状态需要重新初始化
+        self.optimizer.reset()
+
+    def checkpoint(self, segments=None):
+        """
+        梯度检查点(以计算换内存): 把计算图分为若干段, 正向传播时每段算完后释放段内节点的cache,
+        只保存每段的输入; 反向传播到该段时再从保存的输入重新正向计算一次。
+        重算时恢复该段开始时的随机数状态和BatchNorm的滑动统计量, 因此结果与不使用检查点时相同
+        @param segments: 段数, 或各段起始节点下标的列表; 默认约为sqrt(节点数)段; 0或1表示关闭
+        """
+        if segments is None:
+            segments = max(int(round(np.sqrt(len(self)))), 1)
+        if isinstance(segments, int):
+            if segments <= 1:
+                self.checkpoints = None
+                self.saved = []
+                return
+            segments = [chunk[0] for chunk in np.array_split(np.arange(len(self)), segments) if chunk.size > 0]
+        self.checkpoints = sorted(set([0] + [int(i) for i in segments if 0 < i < len(self)]))
+
+    def segments(self):
+        """
+        @return: 各段的(起始下标, 结束下标)
+        """
+        starts = self.checkpoints
+        return list(zip(starts, starts[1:] + [len(self)]))
+
+    def channelslast(self, enable: bool = True):
+        """
+        卷积部分(Conv2D, MyBatchNorm, relu, MaxPool2D, Flatten)使用(N, H, W, C)布局:
+        im2col矩阵乘法的输出直接作为下一层的输入, BatchNorm按最后一维求统计量, 不需要转置
+        forward的输入和backward返回的梯度仍为(N, C, H, W), Flatten仍按(C, H, W)的顺序展平, 参数与布局无关
+        @param enable: True为(N, H, W, C), False为(N, C, H, W)
+        """
+        self.channels_last = enable
+        for node in self:
+            if hasattr(type(node), "channels_last"):
+                node.channels_last = enable
+
+    def profile(self, profiler: Profiler = None):
+        """
+        开启/关闭逐节点性能统计
+        @param profiler: 记录统计结果的Profiler, None表示关闭
+        @return: profiler
+        """
+        self.profiler = profiler
+        return profiler
+
+    def nodeforward(self, k, node: Node, X, debug=False, recompute=False):
+        profiler = getattr(self, "profiler", None)
+        if profiler is None:
+            return node.forward(X, debug)
+        return profiler.forward(k, node, X, debug, recompute)
+
+    def nodebackward(self, k, node: Node, grad, debug=False):
+        profiler = getattr(self, "profiler", None)
+        if profiler is None:
+            return node.backward(grad, debug)
+        return profiler.backward(k, node, grad, debug)
 
     def eval(self):
         for node in self:
@@ -28,18 +118,60 @@ class Graph(List):
         @param X: n*d 输入样本
         @param debug: 用于debug, print输入和输出数据的shape
         @param removelossnode: 训练时设为0, 测试时设为1, 不使用最后的loss节点
-        @return: 计算图中各个节点的输出
+        @return: 计算图中各个节点的输出, channels_last时卷积部分的输出为(N, H, W, C)
         """
         ret = []
+        dtype = getattr(self, "dtype", None)
+        if dtype is not None:
+            X = np.asarray(X, dtype=dtype)
+        if getattr(self, "channels_last", False) and X.ndim == 4:
+            X = X.transpose(0, 2, 3, 1)
+        if getattr(self, "checkpoints", None) is not None and removelossnode == 0:
+            return self.forwardcheckpoint(X, debug)
         if removelossnode > 0:
             nlist = self[:-removelossnode]
         else:
             nlist = self
-        for n in nlist:
-            X = n.forward(X, debug)
+        for k, n in enumerate(nlist):
+            X = self.nodeforward(k, n, X, debug)
             ret.append(X)
         return ret
 
+    def forwardcheckpoint(self, X, debug=False):
+        """
+        检查点模式的正向传播, 除最后一段外, 每段算完后释放段内节点的cache
+        @return: 与forward相同, 但被释放的段中只保留该段最后一个节点的输出, 其余为None
+        """
+        ret = []
+        self.saved = []
+        segments = self.segments()
+        for k, (start, end) in enumerate(segments):
+            running = [{key: copy.deepcopy(getattr(n, key)) for key in n.running} for n in self[start:end]]
+            self.saved.append((X, np.random.get_state(), running))
+            for i in range(start, end):
+                X = self.nodeforward(i, self[i], X, debug)
+                ret.append(X)
+            if k < len(segments) - 1:
+                for n in self[start:end]:
+                    n.dropcache()
+                ret[start:end - 1] = [None] * (end - 1 - start)
+        return ret
+
+    def recompute(self, k, debug=False):
+        """
+        从保存的输入重新计算第k段的正向传播, 恢复段内节点的cache
+        """
+        start, end = self.segments()[k]
+        X, rngstate, running = self.saved[k]
+        state = np.random.get_state()
+        np.random.set_state(rngstate)
+        for n, values in zip(self[start:end], running):
+            for key, value in values.items():
+                setattr(n, key, copy.deepcopy(value))
+        for i in range(start, end):
+            X = self.nodeforward(i, self[i], X, debug, recompute=True)
+        np.random.set_state(state)
+
     def backward(self, grad=1.0, debug=False):
         """
         反向传播
@@ -48,8 +180,28 @@ class Graph(List):
         @return: 反传结束得到的梯度
         """
         # TODO: YOUR CODE HERE
-        for node in reversed(self):
-            grad = node.backward(grad, debug)
+        for node in self:
+            if isinstance(node, QuantNode):
+                # 在修改任何梯度之前检查
+                raise RuntimeError(f"{type(node).__name__}只用于推理, 量化的计算图不支持反向传播")
+        if getattr(self, "checkpoints", None) is not None and len(self.saved) > 0:
+            segments = self.segments()
+            for k in reversed(range(len(segments))):
+                start, end = segments[k]
+                if k < len(segments) - 1:
+                    self.recompute(k, debug)
+                for i in reversed(range(start, end)):
+                    grad = self.nodebackward(i, self[i], grad, debug)
+                # 该段的cache和保存的输入已不再需要
+                for node in self[start:end]:
+                    node.dropcache()
+                self.saved[k] = None
+            self.saved = []
+        else:
+            for i in reversed(range(len(self))):
+                grad = self.nodebackward(i, self[i], grad, debug)
+        if getattr(self, "channels_last", False) and np.ndim(grad) == 4:
+            grad = grad.transpose(0, 3, 1, 2)
         return grad
     
     def optimstep(self, lr, wd1, wd2):
@@ -61,11 +213,24 @@ class Graph(List):
         @return: 不需要返回值
         """  
         # TODO: YOUR CODE HERE
-        for node in self:
-            for i, param in enumerate(node.params):
-                grad = node.grad[i]
-                param -= lr * (grad + wd1 * np.sign(param) + wd2 * param)
+        if getattr(self, "optimizer", None) is None:
+            # 兼容没有optimizer属性的旧模型
+            self.optimizer = SGD()
+        self.optimizer.step(self.parameters(), self.grads(), lr, wd1, wd2)
+
 
+    def compile_inference(self, removelossnode: int = 1) -> InferenceGraph:
+        """
+        生成只用于推理的流水线: 不保存cache, 参数冻结(复制), 并做以下融合
+        StdScaler和eval模式的BatchNorm/MyBatchNorm折叠进相邻的Linear/Conv2D, 去掉Dropout, ReLU融合进前一层
+        调用后计算图处于eval模式
+        @param removelossnode: 不使用最后的removelossnode个节点
+        @return: InferenceGraph, 用法为 pred = infer(X)
+        """
+        self.eval()
+        self.flush()
+        nlist = self[:-removelossnode] if removelossnode > 0 else list(self)
+        return compile_inference(nlist, getattr(self, "dtype", None), getattr(self, "channels_last", False))
 
     def parameters(self):
         """
@@ -1,18 +1,21 @@
 from typing import List
 import math
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from .Init import * 
 
 def shape(x):
     if isinstance(x, np.ndarray):
-        ret = "ndarray"
-        if np.any(np.isposinf(x)):
-            ret += "_posinf"
-        if np.any(np.isneginf(x)):
-            ret += "_neginf"
-        if np.any(np.isnan(x)):
-            ret += "_nan"
-        return f" {x.shape} "
+        ret = f" {x.shape} "
+        # 只有存在非有限值时才逐项检查
+        if not np.isfinite(x).all():
+            if np.any(np.isposinf(x)):
+                ret += "_posinf"
+            if np.any(np.isneginf(x)):
+                ret += "_neginf"
+            if np.any(np.isnan(x)):
+                ret += "_nan"
+        return ret
     if isinstance(x, int):
         return "int"
     if isinstance(x, float):
@@ -28,6 +31,11 @@ def shape(x):
         raise NotImplementedError(f"unsupported type {type(x)}")
 
 class Node(object):
+    # 只在训练中临时使用、保存模型时不需要的属性
+    transient = ()
+    # 训练模式下forward会原地更新的状态, 如BatchNorm的滑动均值和方差
+    running = ()
+
     def __init__(self, name, *params):
         # 节点的梯度，self.grad[i]对应self.params[i]
         self.grad = []
@@ -58,6 +66,10 @@ class Node(object):
         self.grad = []
         self.cache = []
 
+    def dropcache(self):
+        # 只释放正向传播保存的数据, 保留已经算好的梯度
+        self.cache = []
+
     def forward(self, x, debug=False):
         '''
         正向传播
@@ -86,6 +98,14 @@ class Node(object):
     def train(self):
         pass
 
+    def astype(self, dtype):
+        """
+        将参数转换为dtype, 参数、激活值和梯度都将使用该精度
+        @param dtype: np.float32 或 np.float64
+        """
+        self.params = [param.astype(dtype) for param in self.params]
+        self.grad = []
+
 
 class relu(Node):
     # shape x: (*)
@@ -177,13 +197,108 @@ class StdScaler(Node):
 
     def backcal(self, grad):
         return grad/ (self.std + self.EPS)
+
+    def astype(self, dtype):
+        super().astype(dtype)
+        self.mean = np.asarray(self.mean, dtype=dtype)
+        self.std = np.asarray(self.std, dtype=dtype)
     
+def allreduce(node, *arrays):
+    """
+    数据并行时把各进程的arrays求和(见Parallel.DataParallel), 单进程时原样返回
+    """
+    if getattr(node, "allreduce", None) is None:
+        return arrays
+    return node.allreduce(arrays)
+
+
+def checkstats(node):
+    """
+    eval模式需要滑动统计量; 从未在训练模式下forward过的BatchNorm没有统计量
+    """
+    if node.mean is None or node.std is None:
+        raise ValueError(f"{type(node).__name__} has no running statistics; run it in training mode first")
+
+
+def batchnorm_cal(node, X, axes, gamma, beta):
+    """
+    BatchNorm的正向传播: 训练时用当前batch的均值和标准差归一化, 并更新滑动统计量; eval时用滑动统计量
+    缓存归一化后的激活值xhat与1/(std+EPS), 只分配xhat和输出两个数组
+    数据并行时均值和方差在所有进程的样本上计算, 与单进程相同
+    @param X: 已reshape, axes为求统计量的维度, 其余为通道维度
+    @param gamma, beta: 已reshape为可以与X broadcast的形状
+    """
+    # 滑动统计量与keepdims的统计量形状相同, 切换布局后按当前的X调整
+    statshape = tuple(1 if i in axes else d for i, d in enumerate(X.shape))
+    if node.mean is not None and node.std is not None and node.mean.shape != statshape:
+        node.mean = node.mean.reshape(statshape)
+        node.std = node.std.reshape(statshape)
+    count = None
+    if node.updatemean:
+        # 统计量使用float64累加
+        total, count = allreduce(node, np.sum(X, axis=axes, keepdims=True, dtype=np.float64),
+                                 np.float64(X.size // math.prod(statshape)))
+        mean = total / count
+        xhat = X - mean.astype(X.dtype)
+        out = np.square(xhat)
+        sqsum, = allreduce(node, np.sum(out, axis=axes, keepdims=True, dtype=np.float64))
+        std = np.sqrt(sqsum / count)
+        if node.mean is None or node.std is None:
+            node.mean = mean
+            node.std = std
+        else:
+            node.mean *= node.momentum
+            node.mean += (1-node.momentum) * mean
+            node.std *= node.momentum
+            node.std += (1-node.momentum) * std
+    else:
+        checkstats(node)
+        std = None
+        xhat = X - node.mean.astype(X.dtype)
+        out = np.empty_like(xhat)
+    inv_std = (1 / ((node.std if std is None else std) + node.EPS)).astype(X.dtype)
+    xhat *= inv_std
+    node.cache.append((xhat, inv_std, std, count))
+    np.multiply(xhat, gamma, out=out)
+    out += beta
+    return out
+
+
+def batchnorm_backcal(node, grad, axes, gamma):
+    """
+    BatchNorm的反向传播, 训练时包含batch均值和标准差对输入的梯度:
+    dx = (dxhat - mean(dxhat) - xhat * mean(dxhat * xhat) * (std+EPS)/std) / (std+EPS), 其中dxhat = grad * gamma
+    @param grad: 与batchnorm_cal中的X形状相同
+    @return: 对X的梯度, 以及gamma、beta的梯度(按通道, 数据并行时只含本进程的样本, 由DataParallel求和)
+    """
+    xhat, inv_std, std, m = node.cache[-1]
+    dgamma = np.multiply(grad, xhat).sum(axis=axes)
+    dbeta = grad.sum(axis=axes)
+    dx = grad * gamma
+    if std is not None:
+        # 均值和方差依赖于所有进程的样本, 这两项也要在所有进程上求和
+        sgamma, sbeta = allreduce(node, dgamma, dbeta)
+        dx -= (gamma * sbeta.reshape(inv_std.shape) / m).astype(grad.dtype)
+        # std为0的通道xhat也为0, 不需要这一项
+        ratio = np.divide(1, inv_std * std, out=np.zeros_like(std), where=std > 0)
+        # xhat之后不再使用, 原地计算
+        xhat *= (gamma * sgamma.reshape(inv_std.shape) / m * ratio).astype(grad.dtype)
+        dx -= xhat
+    dx *= inv_std
+    return dx, dgamma, dbeta
+
+
 class BatchNorm(Node):
     '''
     input shape (*)
     output shape (*)
     '''
     EPS = 1e-3
+    running = ("mean", "std")
+    # 数据并行时由工作进程设置, 见allreduce
+    transient = ("allreduce",)
+    allreduce = None
+
     def __init__(self, indim, momentum: float = 0.9):
         super().__init__("batchnorm", ones((indim)), zeros(indim))
         self.momentum = momentum
@@ -193,29 +308,14 @@ class BatchNorm(Node):
         self.indim = indim
 
     def cal(self, X):
-        if self.updatemean:
-            tmean, tstd = np.mean(X, axis=0, keepdims=True), np.std(X, axis=0, keepdims=True)
-            if self.std is None or self.std is None:
-                self.mean = tmean
-                self.std = tstd
-            else:
-                self.mean *= self.momentum
-                self.mean += (1-self.momentum) * tmean
-                self.std *= self.momentum
-                self.std += (1-self.momentum) * tstd
-        X = X.copy()
-        X -= self.mean
-        X /= (self.std + self.EPS)
-        self.cache.append(X.copy())
-        X *= self.params[0]
-        X += self.params[1]
-        return X
+        out = batchnorm_cal(self, X.reshape(-1, self.indim), (0,), self.params[0], self.params[1])
+        return out.reshape(X.shape)
 
     def backcal(self, grad):
-        X = self.cache[-1]
-        self.grad.append(np.multiply(X, grad).reshape(-1, self.indim).sum(axis=0))
-        self.grad.append(grad.reshape(-1, self.indim).sum(axis=0))
-        return (grad*self.params[0])/ (self.std + self.EPS)
+        dx, dgamma, dbeta = batchnorm_backcal(self, grad.reshape(-1, self.indim), (0,), self.params[0])
+        self.grad.append(dgamma)
+        self.grad.append(dbeta)
+        return dx.reshape(grad.shape)
     
     def eval(self):
         self.updatemean = False
@@ -227,30 +327,52 @@ class Dropout(Node):
     '''
     input shape (*)
     output shape (*)
+    训练时以概率p置0, 保留的元素乘以1/(1-p)(inverted dropout), eval时为恒等映射
     '''
+    # rng不保存, 加载后重新从np.random派生
+    transient = ("rng",)
+    # 梯度检查点重算时需要恢复随机数状态, 得到相同的mask
+    running = ("rng",)
+    # 旧模型没有该属性, 训练时不缩放、eval时乘以1/(1-p)
+    inverted = False
+
     def __init__(self, p: float = 0.1):
         super().__init__("dropout")
         assert 0<=p<=1, "p 是dropout 概率，必须在[0, 1]中"
         self.p = p
         self.dropout = True
+        self.inverted = True
+        self.rng = None
+
+    def scale(self):
+        return 1 / (1 - self.p) if self.p < 1 else 0.0
 
     def cal(self, X):
         if self.dropout:
-            X = X.copy()
-            mask = np.random.rand(*X.shape) < self.p
-            np.putmask(X, mask, 0)
-            self.cache.append(mask)
-        else:
-            X = X*(1/(1-self.p))
-        return X
+            if getattr(self, "rng", None) is None:
+                # 由np.random派生, 使setseed和各进程不同的种子仍然有效
+                self.rng = np.random.default_rng(np.random.randint(2**31))
+            keep = self.rng.random(X.shape, dtype=np.float32) >= self.p
+            # mask按位存储, 占用为bool的1/8
+            self.cache.append(np.packbits(keep, axis=None))
+            ret = np.multiply(X, keep, dtype=X.dtype)
+            if self.inverted:
+                ret *= self.scale()
+            return ret
+        if self.inverted:
+            return X
+        return X*(1/(1-self.p))
     
     def backcal(self, grad):
         if self.dropout:
-            grad = grad.copy()
-            np.putmask(grad, self.cache[-1], 0)
+            keep = np.unpackbits(self.cache[-1], count=grad.size).reshape(grad.shape).view(bool)
+            ret = np.multiply(grad, keep, dtype=grad.dtype)
+            if self.inverted:
+                ret *= self.scale()
+            return ret
+        if self.inverted:
             return grad
-        else:
-            return (1/(1-self.p)) * grad
+        return (1/(1-self.p)) * grad
     
     def eval(self):
         self.dropout=False
@@ -307,6 +429,8 @@ class NLLLoss(Node):
     # shape value: number 
     # 输入：x: (*) 个预测，每个预测是个d维向量，代表d个类别上分别的log概率。  y：(*) 个整数类别标签
     # 输出：NLL损失
+    transient = ("y",)
+
     def __init__(self, y):
         """
         初始化
@@ -319,7 +443,7 @@ class NLLLoss(Node):
         y = self.y
         self.cache.append(X)
         return - np.sum(
-            np.take_along_axis(X, np.expand_dims(y, axis=-1), axis=-1))
+            np.take_along_axis(X, np.expand_dims(y, axis=-1), axis=-1), dtype=np.float64)
 
     def backcal(self, grad):
         X, y = self.cache[-1], self.y
@@ -335,6 +459,8 @@ class CrossEntropyLoss(Node):
     # shape value: number 
     # 输入：x: (*) 个预测，每个预测是个d维向量，代表d个类别上分别的概率。  y：(*) 个整数类别标签
     # 输出：交叉熵损失
+    transient = ("y",)
+
     def __init__(self, y):
         """
         初始化
@@ -348,7 +474,7 @@ class CrossEntropyLoss(Node):
         # 提示，可以对照NLLLoss的cal
         y = self.y
         self.cache.append(X)
-        return -np.sum(np.log(np.take_along_axis(X, np.expand_dims(y, axis=-1), axis=-1) + 1e-6))
+        return -np.sum(np.log(np.take_along_axis(X, np.expand_dims(y, axis=-1), axis=-1) + 1e-6), dtype=np.float64)
 
     def backcal(self, grad):
         # TODO: YOUR CODE HERE
@@ -358,74 +484,398 @@ class CrossEntropyLoss(Node):
         np.put_along_axis(ret, np.expand_dims(y, axis=-1), -grad, axis=-1)
         return np.multiply(ret, 1 / (np.take_along_axis(X, np.expand_dims(y, axis=-1), axis=-1) + 1e-6))
 
+class SoftmaxCrossEntropy(Node):
+    '''
+    LogSoftmax与NLLLoss融合的损失函数, 可以直接替换计算图末尾的这两个节点
+    正向只计算一次exp, 反向为 softmax - onehot, 在缓存的softmax的副本上计算, 可以重复反向传播
+    '''
+    # shape x: (*, d), y: (*)
+    # shape value: number
+    # 输入：x: (*) 个预测，每个预测是个d维向量，代表d个类别上分别的得分(logits)。  y：(*) 个整数类别标签
+    # 输出：交叉熵损失
+    transient = ("y",)
 
+    def __init__(self, y):
+        """
+        初始化
+        @param y: n 样本的label
+        """
+        super().__init__("SoftmaxCE")
+        self.y = y
 
-# TODO: Design my own nodes for CNN here
-def im2col(input_data, filter_h, filter_w, stride=1, pad=0):
-    N, C, H, W = input_data.shape
-    out_h = (H + 2 * pad - filter_h) // stride + 1
-    out_w = (W + 2 * pad - filter_w) // stride + 1
+    def cal(self, X):
+        y = np.expand_dims(self.y, axis=-1)
+        shifted = X - np.max(X, axis=-1, keepdims=True)
+        prob = np.exp(shifted)
+        sumexp = np.sum(prob, axis=-1, keepdims=True)
+        prob /= sumexp
+        self.cache.append(prob)
+        # loss = sum(log(sumexp) - shifted[y]), 使用float64累加
+        return np.sum(np.log(sumexp), dtype=np.float64) - np.sum(np.take_along_axis(shifted, y, axis=-1), dtype=np.float64)
+
+    def backcal(self, grad):
+        y = np.expand_dims(self.y, axis=-1)
+        ret = self.cache[-1].copy()
+        np.put_along_axis(ret, y, np.take_along_axis(ret, y, axis=-1) - 1, axis=-1)
+        if not (np.isscalar(grad) and grad == 1):
+            ret *= grad
+        return ret
 
-    img = np.pad(input_data, [(0, 0), (0, 0), (pad, pad), (pad, pad)], 'constant')
-    col = np.zeros((N, C, filter_h, filter_w, out_h, out_w))
 
-    for y in range(filter_h):
-        y_max = y + stride * out_h
-        for x in range(filter_w):
-            x_max = x + stride * out_w
-            col[:, :, y, x, :, :] = img[:, :, y:y_max:stride, x:x_max:stride]
 
-    col = col.transpose(0, 4, 5, 1, 2, 3).reshape(N * out_h * out_w, -1)
-    return col
+# TODO: Design my own nodes for CNN here
+# 自动选择卷积实现的阈值, 按benchmarks/conv.py中正向加反向的总耗时确定
+# 64通道时winograd的正向和反向都慢于im2col, 128通道时总耗时略快
+WINOGRAD_MIN_CHANNELS = 128
+FFT_MIN_KERNEL = 7
+
+def im2col(input_data, filter_h, filter_w, stride=1, pad=0, channels_last=False):
+    """
+    将输入展开为列矩阵
+    @param input_data: (N, C, H, W) 输入, channels_last时为(N, H, W, C)
+    @return: (N*out_h*out_w, C*filter_h*filter_w) 列矩阵
+    """
+    if channels_last:
+        N, H, W, C = input_data.shape
+        axes = (1, 2)
+    else:
+        N, C, H, W = input_data.shape
+        axes = (2, 3)
+    out_h = (H + 2 * pad - filter_h) // stride + 1
+    out_w = (W + 2 * pad - filter_w) // stride + 1
 
-def col2im(col, input_shape, filter_h, filter_w, stride=1, pad=0):
-    N, C, H, W = input_shape
+    img = input_data
+    if pad > 0:
+        padding = [(0, 0)] * 4
+        padding[axes[0]] = padding[axes[1]] = (pad, pad)
+        img = np.pad(input_data, padding, 'constant')
+    # sliding_window_view 只是原数组上的strided视图, 不会复制数据
+    # shape: (N, C, out_h, out_w, filter_h, filter_w), channels_last时为(N, out_h, out_w, C, filter_h, filter_w)
+    col = sliding_window_view(img, (filter_h, filter_w), axis=axes)
+    if channels_last:
+        col = col[:, ::stride, ::stride]
+    else:
+        col = col[:, :, ::stride, ::stride].transpose(0, 2, 3, 1, 4, 5)
+    # 唯一的一次复制: 按 (N, out_h, out_w, C, filter_h, filter_w) 展平
+    return col.reshape(N * out_h * out_w, -1)
+
+def col2im(col, input_shape, filter_h, filter_w, stride=1, pad=0, channels_last=False):
+    """
+    im2col的逆操作, 重叠位置的梯度相加
+    @param col: (N*out_h*out_w, C*filter_h*filter_w) 列矩阵
+    @param input_shape: (N, C, H, W) 输入的shape, channels_last时为(N, H, W, C)
+    @return: 与input_shape相同
+    """
+    if channels_last:
+        N, H, W, C = input_shape
+    else:
+        N, C, H, W = input_shape
     out_h = (H + 2 * pad - filter_h) // stride + 1
     out_w = (W + 2 * pad - filter_w) // stride + 1
-    col = col.reshape(N, out_h, out_w, C, filter_h, filter_w).transpose(0, 3, 4, 5, 1, 2)
+    # 只是视图, 不复制
+    col = col.reshape(N, out_h, out_w, C, filter_h, filter_w)
 
-    img = np.zeros((N, C, H + 2 * pad + stride - 1, W + 2 * pad + stride - 1))
+    # 按 (N, H, W, C) 的顺序累加, 与col的内存布局一致
+    img = np.zeros((N, H + 2 * pad, W + 2 * pad, C), dtype=col.dtype)
     for y in range(filter_h):
-        y_max = y + stride * out_h
+        y_max = y + stride * (out_h - 1) + 1
         for x in range(filter_w):
-            x_max = x + stride * out_w
-            img[:, :, y:y_max:stride, x:x_max:stride] += col[:, :, y, x, :, :]
+            x_max = x + stride * (out_w - 1) + 1
+            img[:, y:y_max:stride, x:x_max:stride, :] += col[:, :, :, :, y, x]
+
+    img = img[:, pad:H + pad, pad:W + pad, :]
+    return img if channels_last else img.transpose(0, 3, 1, 2)
+
+def winograd_weight(weight):
+    """
+    Winograd F(2,3)的卷积核变换 U = G g G^T
+    @param weight: (FN, C, 3, 3)
+    @return: (16, FN, C)
+    """
+    g = weight.transpose(2, 3, 0, 1)
+    # 沿行: G = [[1, 0, 0], [1/2, 1/2, 1/2], [1/2, -1/2, 1/2], [0, 0, 1]]
+    t = np.stack([g[0], (g[0] + g[1] + g[2]) / 2, (g[0] - g[1] + g[2]) / 2, g[2]])
+    # 沿列
+    u = np.stack([t[:, 0], (t[:, 0] + t[:, 1] + t[:, 2]) / 2, (t[:, 0] - t[:, 1] + t[:, 2]) / 2, t[:, 2]], axis=1)
+    return u.reshape(16, *weight.shape[:2]).astype(weight.dtype)
+
+def winograd_weight_backward(dU):
+    """
+    winograd_weight的反向传播 dW = G^T dU G
+    @param dU: (16, FN, C)
+    @return: (FN, C, 3, 3)
+    """
+    dU = dU.reshape(4, 4, *dU.shape[1:])
+    t = np.stack([dU[0] + (dU[1] + dU[2]) / 2, (dU[1] - dU[2]) / 2, (dU[1] + dU[2]) / 2 + dU[3]])
+    dW = np.stack([t[:, 0] + (t[:, 1] + t[:, 2]) / 2, (t[:, 1] - t[:, 2]) / 2, (t[:, 1] + t[:, 2]) / 2 + t[:, 3]], axis=1)
+    return dW.transpose(2, 3, 0, 1)
+
+def tiles(x, axis, k, n):
+    # 沿axis取第k个位置起、步长为2的n个元素, 即n个相互重叠的4元素块中的第k个元素
+    index = [slice(None)] * x.ndim
+    index[axis] = slice(k, k + 2 * n, 2)
+    return x[tuple(index)]
+
+def winograd_input(x, axis, n, out):
+    """
+    沿axis对n个重叠的4元素块做输入变换 B^T d, B^T = [[1, 0, -1, 0], [0, 1, 1, 0], [0, -1, 1, 0], [0, 1, 0, -1]]
+    @param out: (4, ...) 结果写入out[i]
+    """
+    d = [tiles(x, axis, k, n) for k in range(4)]
+    np.subtract(d[0], d[2], out=out[0])
+    np.add(d[1], d[2], out=out[1])
+    np.subtract(d[2], d[1], out=out[2])
+    np.subtract(d[1], d[3], out=out[3])
+
+def winograd_input_backward(dv, axis, n, dx):
+    """
+    winograd_input的反向传播 B dv, 重叠位置的梯度累加到dx
+    """
+    d = [tiles(dx, axis, k, n) for k in range(4)]
+    d[0] += dv[0]
+    d[1] += dv[1]
+    d[1] -= dv[2]
+    d[1] += dv[3]
+    d[2] -= dv[0]
+    d[2] += dv[1]
+    d[2] += dv[2]
+    d[3] -= dv[3]
+
+def winograd_cal(X, weight, bias, pad=0):
+    """
+    Winograd F(2,3)卷积, 只用于3*3、stride为1的卷积核
+    每个2*2的输出块只需16次乘法(im2col为36次), 乘法集中在 (FN, C) @ (C, tiles) 的批量矩阵乘法中,
+    输入和输出变换只有加减法, 直接在整张图上按行、按列进行
+    @param X: (N, C, H, W) 输入
+    @param weight: (FN, C, 3, 3)
+    @return: 输出 (N, FN, out_h, out_w), 以及反向传播需要的cache
+    """
+    N, C, H, W = X.shape
+    FN = weight.shape[0]
+    out_h, out_w = H + 2 * pad - 2, W + 2 * pad - 2
+    th, tw = -(-out_h // 2), -(-out_w // 2)
+    # 补齐为整数个4*4的输入块, 相邻的块重叠2行/列
+    eh, ew = 2 * th + 2 - H - 2 * pad, 2 * tw + 2 - W - 2 * pad
+    xp = np.pad(X, [(0, 0), (0, 0), (pad, pad + eh), (pad, pad + ew)]) if pad or eh or ew else X
+
+    # 输入变换 V = B^T d B, (4, 4, N, C, th, tw)
+    t = np.empty((4, N, C, th, xp.shape[3]), dtype=X.dtype)
+    winograd_input(xp, 2, th, t)
+    V = np.empty((4, 4, N, C, th, tw), dtype=X.dtype)
+    winograd_input(t, 4, tw, V.transpose(1, 0, 2, 3, 4, 5))
+    V = V.reshape(16, N, C, th * tw)
+
+    U = winograd_weight(weight)
+    M = np.matmul(U.reshape(16, 1, FN, C), V).reshape(4, 4, N, FN, th, tw)
+
+    # 输出变换 Y = A^T M A, A^T = [[1, 1, 1, 0], [0, 1, -1, -1]], 直接写入输出的对应位置
+    s = np.empty((2, 4, N, FN, th, tw), dtype=X.dtype)
+    np.add(M[0], M[1], out=s[0])
+    s[0] += M[2]
+    np.subtract(M[1], M[2], out=s[1])
+    s[1] -= M[3]
+    out = np.empty((N, FN, th, 2, tw, 2), dtype=X.dtype)
+    y = out.transpose(3, 5, 0, 1, 2, 4)
+    np.add(s[:, 0], s[:, 1], out=y[:, 0])
+    y[:, 0] += s[:, 2]
+    np.subtract(s[:, 1], s[:, 2], out=y[:, 1])
+    y[:, 1] -= s[:, 3]
+    out = out.reshape(N, FN, 2 * th, 2 * tw)
+    out += bias.reshape(1, -1, 1, 1)
+    return out[:, :, :out_h, :out_w], (X.shape, pad, xp.shape, V, U)
+
+def winograd_backcal(grad, weight, cache):
+    """
+    Winograd F(2,3)卷积的反向传播, 在变换域中计算:
+    dM = A dY A^T, dU = dM V^T, dV = U^T dM, 再做G与B的逆变换
+    @return: dx, dW, db
+    """
+    (N, C, H, W), pad, xpshape, V, U = cache
+    FN = weight.shape[0]
+    out_h, out_w = grad.shape[2], grad.shape[3]
+    th, tw = -(-out_h // 2), -(-out_w // 2)
+    db = grad.sum(axis=(0, 2, 3))
+
+    gp = np.zeros((N, FN, th, 2, tw, 2), dtype=grad.dtype)
+    gp.reshape(N, FN, 2 * th, 2 * tw)[:, :, :out_h, :out_w] = grad
+    dY = gp.transpose(3, 5, 0, 1, 2, 4)
+    # A = [[1, 0], [1, 1], [1, -1], [0, -1]]
+    s = np.empty((4, 2, N, FN, th, tw), dtype=grad.dtype)
+    np.copyto(s[0], dY[0])
+    np.add(dY[0], dY[1], out=s[1])
+    np.subtract(dY[0], dY[1], out=s[2])
+    np.negative(dY[1], out=s[3])
+    dM = np.empty((4, 4, N, FN, th, tw), dtype=grad.dtype)
+    np.copyto(dM[:, 0], s[:, 0])
+    np.add(s[:, 0], s[:, 1], out=dM[:, 1])
+    np.subtract(s[:, 0], s[:, 1], out=dM[:, 2])
+    np.negative(s[:, 1], out=dM[:, 3])
+    dM = dM.reshape(16, N, FN, th * tw)
+
+    dU = np.matmul(dM, V.transpose(0, 1, 3, 2)).sum(axis=1)
+    dW = winograd_weight_backward(dU)
+
+    dV = np.matmul(U.transpose(0, 2, 1).reshape(16, 1, C, FN), dM).reshape(4, 4, N, C, th, tw)
+    dt = np.zeros((4, N, C, th, xpshape[3]), dtype=grad.dtype)
+    winograd_input_backward(dV.transpose(1, 0, 2, 3, 4, 5), 4, tw, dt)
+    dxp = np.zeros(xpshape, dtype=grad.dtype)
+    winograd_input_backward(dt, 2, th, dxp)
+    return dxp[:, :, pad:pad + H, pad:pad + W], dW, db
+
+def fft_cal(X, weight, bias, stride=1, pad=0):
+    """
+    FFT卷积, 计算量与卷积核大小无关, 适合大卷积核
+    卷积(互相关)在频域中为逐频率的 (N, C) @ (C, FN) 矩阵乘法
+    @return: 输出 (N, FN, out_h, out_w), 以及反向传播需要的cache
+    """
+    FN, C, FH, FW = weight.shape
+    xp = np.pad(X, [(0, 0), (0, 0), (pad, pad), (pad, pad)]) if pad > 0 else X
+    Hp, Wp = xp.shape[2], xp.shape[3]
+    # 输入长度为Hp, 只取有效的互相关结果, 不会发生循环卷积的混叠
+    # float32输入的频域结果用complex64缓存, 不升为complex128
+    ctype = np.result_type(X.dtype, np.complex64)
+    Xf = np.fft.rfft2(xp).astype(ctype, copy=False)
+    Wf = np.fft.rfft2(weight, s=(Hp, Wp)).astype(ctype, copy=False)
+    Of = np.matmul(Xf.transpose(2, 3, 0, 1), Wf.conj().transpose(2, 3, 1, 0)).transpose(2, 3, 0, 1)
+    out = np.fft.irfft2(Of, s=(Hp, Wp))[:, :, :Hp - FH + 1:stride, :Wp - FW + 1:stride]
+    out = out.astype(X.dtype) + bias.reshape(1, -1, 1, 1)
+    return out, (X.shape, stride, pad, Xf, Wf)
+
+def fft_backcal(grad, weight, cache):
+    """
+    FFT卷积的反向传播: dW为输入与上游梯度的互相关, dx为上游梯度与卷积核的卷积
+    @return: dx, dW, db
+    """
+    (N, C, H, W), stride, pad, Xf, Wf = cache
+    FN, C, FH, FW = weight.shape
+    Hp, Wp = H + 2 * pad, W + 2 * pad
+    db = grad.sum(axis=(0, 2, 3))
+    # 还原stride前的输出位置
+    gfull = np.zeros((N, FN, Hp, Wp), dtype=grad.dtype)
+    gfull[:, :, :Hp - FH + 1:stride, :Wp - FW + 1:stride] = grad
+    Gf = np.fft.rfft2(gfull).transpose(2, 3, 0, 1)
+    dWf = np.matmul(Gf.conj().transpose(0, 1, 3, 2), Xf.transpose(2, 3, 0, 1))
+    dW = np.fft.irfft2(dWf.transpose(2, 3, 0, 1), s=(Hp, Wp))[:, :, :FH, :FW]
+    dxf = np.matmul(Gf, Wf.transpose(2, 3, 0, 1))
+    dx = np.fft.irfft2(dxf.transpose(2, 3, 0, 1), s=(Hp, Wp))[:, :, pad:pad + H, pad:pad + W]
+    return dx.astype(grad.dtype), dW.astype(grad.dtype), db
+
+def checkbackend(backend, weight_shape, stride):
+    """
+    检查卷积实现是否支持该卷积核, 不支持时抛出ValueError
+    @param backend: "auto", "im2col", "winograd" 或 "fft"
+    """
+    if backend not in ("auto", "im2col", "winograd", "fft"):
+        raise ValueError(f"unknown conv backend {backend!r}")
+    FH, FW = weight_shape[2:]
+    if backend == "winograd" and (FH != 3 or FW != 3 or stride != 1):
+        raise ValueError(f"winograd backend needs a 3x3 kernel with stride 1, got {FH}x{FW} with stride {stride}")
+
+def autobackend(weight_shape, stride, pad):
+    """
+    按卷积核的形状选择实现, 阈值来自benchmarks/conv.py中一次训练步(正向加反向)的耗时
+    @return: "im2col", "winograd" 或 "fft"
+    """
+    FN, C, FH, FW = weight_shape
+    if FH == FW == 3 and stride == 1 and pad <= 2 and C >= WINOGRAD_MIN_CHANNELS:
+        return "winograd"
+    if FH == FW and FH >= FFT_MIN_KERNEL and stride == 1:
+        return "fft"
+    return "im2col"
+
+def conv_cal(backend, X, weight, bias, stride=1, pad=0, channels_last=False):
+    """
+    按backend计算卷积
+    @param channels_last: X和输出为(N, H, W, C)布局, im2col的矩阵乘法结果本身就是这个布局, 不需要转置;
+        winograd和fft只支持(N, C, H, W), 在前后各转置一次
+    @return: 输出 (N, FN, out_h, out_w) 或 (N, out_h, out_w, FN), 以及反向传播需要的cache
+    """
+    if backend != "im2col":
+        checkbackend(backend, weight.shape, stride)
+        if channels_last:
+            out, cache = conv_cal(backend, X.transpose(0, 3, 1, 2), weight, bias, stride, pad)
+            return out.transpose(0, 2, 3, 1), cache
+        if backend == "winograd":
+            return winograd_cal(X, weight, bias, pad)
+        return fft_cal(X, weight, bias, stride, pad)
+    FN, C, FH, FW = weight.shape
+    if channels_last:
+        N, H, W, C = X.shape
+    else:
+        N, C, H, W = X.shape
+    out_h = 1 + (H + 2 * pad - FH) // stride
+    out_w = 1 + (W + 2 * pad - FW) // stride
+
+    col = im2col(X, FH, FW, stride, pad, channels_last)
+    col_W = weight.reshape(FN, -1).T
+    out = np.dot(col, col_W)
+    out += bias
+    out = out.reshape(N, out_h, out_w, -1)
+    if not channels_last:
+        out = out.transpose(0, 3, 1, 2)
+    return out, (X.shape, col, col_W)
+
+def conv_backcal(backend, grad, weight, cache, stride=1, pad=0, channels_last=False):
+    """
+    按backend计算卷积的反向传播
+    @param channels_last: grad和dx为(N, H, W, C)布局
+    @return: dx, dW, db
+    """
+    if backend != "im2col":
+        if channels_last:
+            dx, dW, db = conv_backcal(backend, grad.transpose(0, 3, 1, 2), weight, cache, stride, pad)
+            return dx.transpose(0, 2, 3, 1), dW, db
+        if backend == "winograd":
+            return winograd_backcal(grad, weight, cache)
+        return fft_backcal(grad, weight, cache)
+    FN, C, FH, FW = weight.shape
+    xshape, col, col_W = cache
+    if channels_last:
+        # (N, out_h, out_w, FN)本身就是矩阵乘法的布局, reshape不复制
+        grad = grad.reshape(-1, FN)
+    else:
+        grad = grad.transpose(0, 2, 3, 1).reshape(-1, FN)
 
-    return img[:, :, pad:H + pad, pad:W + pad]
+    db = np.sum(grad, axis=0)
+    dW = np.dot(col.T, grad)
+    dW = dW.transpose(1, 0).reshape(FN, C, FH, FW)
+
+    dcol = np.dot(grad, col_W.T)
+    dx = col2im(dcol, xshape, FH, FW, stride, pad, channels_last)
+    return dx, dW, db
 
 class Conv2D(Node):
-    def __init__(self, input_channels, output_channels, kernel_size, stride=1, padding=0):
+    # 旧模型没有该属性, 使用im2col
+    backend = "im2col"
+    # 输入输出是否为(N, H, W, C)布局, 由Graph.channelslast设置
+    channels_last = False
+
+    def __init__(self, input_channels, output_channels, kernel_size, stride=1, padding=0, backend="auto"):
+        """
+        @param backend: "im2col"、"winograd"(3*3, stride为1)、"fft"(stride任意, 适合大卷积核), "auto"表示按形状自动选择
+        """
         weight = 0.01 * np.random.randn(output_channels, input_channels, kernel_size, kernel_size)
         bias = np.zeros(output_channels)
+        checkbackend(backend, weight.shape, stride)
         super().__init__("Conv2D", weight, bias)
         self.stride = stride
         self.padding = padding
+        self.backend = backend
 
-    def cal(self, X):
-        FN, C, FH, FW = self.params[0].shape
-        N, C, H, W = X.shape
-        out_h = 1 + (H + 2 * self.padding - FH) // self.stride
-        out_w = 1 + (W + 2 * self.padding - FW) // self.stride
-
-        col = im2col(X, FH, FW, self.stride, self.padding)
-        col_W = self.params[0].reshape(FN, -1).T
-        out = np.dot(col, col_W) + self.params[1]
-        out = out.reshape(N, out_h, out_w, -1).transpose(0, 3, 1, 2)
+    def choosebackend(self):
+        if self.backend != "auto":
+            return self.backend
+        return autobackend(self.params[0].shape, self.stride, self.padding)
 
-        self.cache.append((X, col, col_W))
+    def cal(self, X):
+        backend = self.choosebackend()
+        out, cache = conv_cal(backend, X, self.params[0], self.params[1], self.stride, self.padding, self.channels_last)
+        self.cache.append((backend, cache))
         return out
 
     def backcal(self, grad):
-        FN, C, FH, FW = self.params[0].shape
-        X, col, col_W = self.cache[-1]
-        grad = grad.transpose(0, 2, 3, 1).reshape(-1, FN)
-
-        db = np.sum(grad, axis=0)
-        dW = np.dot(col.T, grad)
-        dW = dW.transpose(1, 0).reshape(FN, C, FH, FW)
-
-        dcol = np.dot(grad, col_W.T)
-        dx = col2im(dcol, X.shape, FH, FW, self.stride, self.padding)
+        backend, cache = self.cache[-1]
+        dx, dW, db = conv_backcal(backend, grad, self.params[0], cache, self.stride, self.padding, self.channels_last)
 
         self.grad.append(dW)
         self.grad.append(db)
@@ -433,25 +883,40 @@ class Conv2D(Node):
         return dx
 
 class MaxPool2D(Node):
+    transient = ("x", "x_shape", "arg_max")
+    channels_last = False
+
     def __init__(self, pool_size, stride=2, padding=0):
         super().__init__("MaxPool2D")
         self.pool_size = pool_size
         self.stride = stride
         self.padding = padding
         self.x = None
+        self.x_shape = None
         self.arg_max = None
 
+    def isdirect(self):
+        # 窗口不重叠且无padding时, 直接reshape做池化, 不需要im2col
+        return self.pool_size == self.stride and self.padding == 0
+
     def cal(self, x):
-        N, C, H, W = x.shape
+        if self.isdirect():
+            return self.caldirect(x)
+        if self.channels_last:
+            N, H, W, C = x.shape
+        else:
+            N, C, H, W = x.shape
         out_h = (H - self.pool_size) // self.stride + 1
         out_w = (W - self.pool_size) // self.stride + 1
 
-        col = im2col(x,self.pool_size,self.pool_size,self.stride,self.padding)
+        col = im2col(x,self.pool_size,self.pool_size,self.stride,self.padding,self.channels_last)
         col = col.reshape(-1,self.pool_size * self.pool_size)
         
         arg_max = np.argmax(col, axis=1)
         out = np.max(col, axis=1)
-        out = out.reshape(N,out_h,out_w,C).transpose(0,3,1,2)
+        out = out.reshape(N,out_h,out_w,C)
+        if not self.channels_last:
+            out = out.transpose(0,3,1,2)
 
         self.x = x
         self.arg_max = arg_max
@@ -459,45 +924,110 @@ class MaxPool2D(Node):
         return out
 
     def backcal(self, grad):
-        grad = grad.transpose(0, 2, 3, 1)
+        if self.isdirect():
+            return self.backcaldirect(grad)
+        if not self.channels_last:
+            grad = grad.transpose(0, 2, 3, 1)
         pool_size = self.pool_size ** 2
         
-        dmax = np.zeros((grad.size, pool_size))
+        dmax = np.zeros((grad.size, pool_size), dtype=grad.dtype)
         dmax[np.arange(self.arg_max.size), self.arg_max.flatten()] = grad.flatten()
         dmax = dmax.reshape(grad.shape + (pool_size,))
         
         dcol = dmax.reshape(dmax.shape[0] * dmax.shape[1] * dmax.shape[2], -1)
-        dx = col2im(dcol, self.x.shape, self.pool_size, self.pool_size, self.stride, self.padding)
+        dx = col2im(dcol, self.x.shape, self.pool_size, self.pool_size, self.stride, self.padding, self.channels_last)
 
         return dx
+
+    def windows(self, x, out_h, out_w):
+        """
+        不重叠窗口的视图
+        @param x: (N, C, H, W) 或 channels_last时的(N, H, W, C)
+        @return: k*k个视图, 第j个为每个窗口中第j个位置的元素, 形状与输出相同
+        """
+        k = self.pool_size
+        if self.channels_last:
+            N, H, W, C = x.shape
+            # (N, out_h, k, out_w, k, C) 只是视图
+            win = x[:, :out_h * k, :out_w * k].reshape(N, out_h, k, out_w, k, C)
+            return [win[:, :, j // k, :, j % k] for j in range(k * k)]
+        N, C, H, W = x.shape
+        # (N, C, out_h, k, out_w, k) 只是视图
+        win = x[:, :, :out_h * k, :out_w * k].reshape(N, C, out_h, k, out_w, k)
+        return [win[:, :, :, j // k, :, j % k] for j in range(k * k)]
+
+    def caldirect(self, x):
+        k = self.pool_size
+        H, W = x.shape[1:3] if self.channels_last else x.shape[2:]
+        out_h, out_w = H // k, W // k
+        win = self.windows(x, out_h, out_w)
+
+        # 逐个窗口位置比较, 只缓存窗口内的argmax下标(uint8), 相等时取第一个, 与np.argmax一致
+        out = win[0].copy()
+        arg_max = np.zeros(out.shape, dtype=np.uint8)
+        for j in range(1, k * k):
+            s = win[j]
+            mask = s > out
+            np.copyto(out, s, where=mask)
+            np.copyto(arg_max, j, where=mask)
+
+        self.x_shape = x.shape
+        self.arg_max = arg_max
+        return out
+
+    def backcaldirect(self, grad):
+        k = self.pool_size
+        out_h, out_w = grad.shape[1:3] if self.channels_last else grad.shape[2:]
+
+        dx = np.zeros(self.x_shape, dtype=grad.dtype)
+        for j, dwin in enumerate(self.windows(dx, out_h, out_w)):
+            np.copyto(dwin, grad, where=self.arg_max == j)
+        return dx
     
     def flush(self):
         self.x = None
+        self.x_shape = None
         self.arg_max = None
 
+    def dropcache(self):
+        self.flush()
+
 class Flatten(Node):
+    # 输入为(N, H, W, C)时仍按(C, H, W)的顺序展平, 使后面Linear的权重与布局无关
+    channels_last = False
+
     def __init__(self):
         super().__init__("Flatten")
 
     def cal(self, X):
         # Flatten the input tensor
         batch_size = X.shape[0]
-        output = X.reshape(batch_size, -1)
         self.cache = X.shape
+        if self.channels_last and X.ndim == 4:
+            X = X.transpose(0, 3, 1, 2)
+        output = X.reshape(batch_size, -1)
         return output
 
     def backcal(self, grad):
         # Calculate the gradient
         original_shape = self.cache
+        if self.channels_last and len(original_shape) == 4:
+            N, H, W, C = original_shape
+            return grad.reshape(N, C, H, W).transpose(0, 2, 3, 1)
         dX = grad.reshape(original_shape)
         return dX
 
 class MyBatchNorm(Node):
     '''
-    input shape (*)
-    output shape (*)
+    input shape (n, c, h, w), channels_last时为(n, h, w, c)
+    output shape 与输入相同, 按通道归一化
     '''
     EPS = 1e-3
+    running = ("mean", "std")
+    transient = ("allreduce",)
+    allreduce = None
+    channels_last = False
+
     def __init__(self, indim, momentum: float = 0.9):
         super().__init__("mybatchnorm", np.ones((indim)), np.zeros(indim))
         self.momentum = momentum
@@ -507,46 +1037,156 @@ class MyBatchNorm(Node):
         self.indim = indim
 
     def cal(self, X):
+        if self.channels_last:
+            # Reshape to (n*h*w, c), 通道在最后一维, 不需要转置
+            c = X.shape[3]
+            out = batchnorm_cal(self, X.reshape(-1, c), (0,), self.params[0], self.params[1])
+            return out.reshape(X.shape)
         n, c, h, w = X.shape
-        X = X.reshape(n, c, -1)  # Reshape to (n, c, h*w)
-        
-        if self.updatemean:
-            tmean, tstd = np.mean(X, axis=(0, 2), keepdims=True), np.std(X, axis=(0, 2), keepdims=True)
-            if self.std is None or self.std is None:
-                self.mean = tmean
-                self.std = tstd
-            else:
-                self.mean *= self.momentum
-                self.mean += (1-self.momentum) * tmean
-                self.std *= self.momentum
-                self.std += (1-self.momentum) * tstd
-        X = X.copy()
-        X -= self.mean
-        X /= (self.std + self.EPS)
-        self.cache.append(X.copy())
-        
-        gamma = self.params[0].reshape(1, c, 1)  # Reshape gamma to (1, c, 1) for proper broadcasting
-        beta = self.params[1].reshape(1, c, 1)   # Reshape beta to (1, c, 1) for proper broadcasting
-        
-        X *= gamma
-        X += beta
-        
-        return X.reshape(n, c, h, w)  # Reshape back to (n, c, h, w)
+        # Reshape to (n, c, h*w), gamma和beta reshape为(1, c, 1)以便broadcast
+        out = batchnorm_cal(self, X.reshape(n, c, -1), (0, 2),
+                            self.params[0].reshape(1, c, 1), self.params[1].reshape(1, c, 1))
+        return out.reshape(n, c, h, w)
 
     def backcal(self, grad):
-        n, c, h, w = grad.shape
-        grad = grad.reshape(n, c, -1)  # Reshape to (n, c, h*w)
-        X = self.cache[-1]
-
-        self.grad.append(np.multiply(X, grad).sum(axis=(0, 2)))
-        self.grad.append(grad.sum(axis=(0, 2)))
-
-        gamma = self.params[0].reshape(1, c, 1)  # Reshape gamma to (1, c, 1) for proper broadcasting
-
-        return ((grad * gamma) / (self.std + self.EPS)).reshape(n, c, h, w)  # Reshape back to (n, c, h, w)
+        if self.channels_last:
+            c = grad.shape[3]
+            dx, dgamma, dbeta = batchnorm_backcal(self, grad.reshape(-1, c), (0,), self.params[0])
+        else:
+            n, c, h, w = grad.shape
+            dx, dgamma, dbeta = batchnorm_backcal(self, grad.reshape(n, c, -1), (0, 2), self.params[0].reshape(1, c, 1))
+        self.grad.append(dgamma)
+        self.grad.append(dbeta)
+        return dx.reshape(grad.shape)
 
     def eval(self):
         self.updatemean = False
 
     def train(self):
         self.updatemean = True
+
+
+# int8量化推理: 权重按输出通道、输入按整个张量对称量化到[-127, 127]
+QMAX = 127
+# int8*int8的乘积不超过127^2, K不超过该值时float32矩阵乘法的累加结果(< 2^24)是精确的整数
+INT8_EXACT_K = 2**24 // QMAX**2
+
+def quantize(X, mul, add=None):
+    """
+    把X对称量化为int8的值: X * mul + add 四舍五入后截断到[-127, 127]
+    @param mul: 1 / 量化步长; 也可以是按特征/通道的数组, 用于合并输入端的仿射变换
+    @param add: None或与mul形状相同的数组
+    @return: 取值为整数的float32数组, 直接用于int8dot, 不需要再转换类型
+    """
+    q = np.multiply(X, np.asarray(mul, dtype=np.float32), dtype=np.float32)
+    if add is not None:
+        q += add
+    np.rint(q, out=q)
+    np.clip(q, -QMAX, QMAX, out=q)
+    return q
+
+def int8dot(xq, wq):
+    """
+    int8矩阵乘法, 累加与int32完全相同
+    numpy的整数矩阵乘法不使用BLAS, 比float32慢约50倍; 这里把取值为整数的数组交给float32的BLAS,
+    K按INT8_EXACT_K分块保证每块的结果精确, 多块时用int32累加
+    @param xq: (M, K) quantize的结果
+    @param wq: (K, N) int8权重, 或已转换为float32的int8权重
+    @return: (M, N) 取值为整数的float32数组, 等于int32结果转换为float32(绝对值超过2**24时舍入一次)
+    """
+    K = wq.shape[0]
+    wq = wq.astype(np.float32, copy=False)
+    if K <= INT8_EXACT_K:
+        return np.dot(xq, wq)
+    acc = np.zeros((xq.shape[0], wq.shape[1]), dtype=np.int32)
+    for i in range(0, K, INT8_EXACT_K):
+        acc += np.dot(xq[:, i:i + INT8_EXACT_K], wq[i:i + INT8_EXACT_K]).astype(np.int32)
+    return acc.astype(np.float32)
+
+def quantize_weight(weight, axis):
+    """
+    按通道对称量化权重
+    @param axis: 输出通道所在的维度, Linear为1, Conv2D为0
+    @return: int8权重, 以及每个输出通道的量化步长 (float32)
+    """
+    other = tuple(i for i in range(weight.ndim) if i != axis)
+    amax = np.max(np.abs(weight), axis=other, keepdims=True)
+    scale = np.where(amax > 0, amax / QMAX, 1.0)
+    qweight = np.clip(np.rint(weight / scale), -QMAX, QMAX).astype(np.int8)
+    return qweight, scale.reshape(-1).astype(np.float32)
+
+class QuantNode(Node):
+    '''
+    int8量化节点的基类, 只用于推理
+    params: int8权重, 每个输出通道的量化步长wscale, bias
+    '''
+    # 编译推理时可以把输入端的仿射变换合并进量化: q = rint(X * xmul + xadd), None表示xmul = 1 / xscale
+    xmul = None
+    xadd = None
+
+    def quantizeinput(self, X):
+        if self.xmul is None:
+            return quantize(X, 1 / self.xscale)
+        return quantize(X, self.xmul, self.xadd)
+
+    def backcal(self, grad):
+        raise RuntimeError(f"{type(self).__name__}只用于推理, 量化的计算图不支持反向传播")
+
+    def astype(self, dtype):
+        # int8权重和量化步长保持不变, 输出为float32
+        pass
+
+class QuantLinear(QuantNode):
+    '''
+    int8量化的Linear, 由Quantize.quantize生成
+    out = int8dot(quantize(X, 1 / xscale), qweight) * (xscale * wscale) + bias
+    '''
+    def __init__(self, weight, bias, xscale):
+        """
+        @param weight: (d1, d2) 浮点权重
+        @param xscale: 输入的量化步长, 在验证集上校准
+        """
+        qweight, wscale = quantize_weight(weight, 1)
+        super().__init__("qlinear", qweight, wscale, np.asarray(bias, dtype=np.float32))
+        self.xscale = float(xscale)
+
+    def cal(self, X):
+        shape = X.shape
+        acc = int8dot(self.quantizeinput(X.reshape(-1, shape[-1])), self.params[0])
+        acc *= self.xscale * self.params[1]
+        acc += self.params[2]
+        return acc.reshape(shape[:-1] + acc.shape[-1:])
+
+class QuantConv2D(QuantNode):
+    '''
+    int8量化的Conv2D, 由Quantize.quantize生成, 总是使用im2col
+    '''
+    # 输入输出是否为(N, H, W, C)布局, 由Graph.channelslast设置
+    channels_last = False
+
+    def __init__(self, weight, bias, stride, padding, xscale):
+        """
+        @param weight: (FN, C, FH, FW) 浮点卷积核
+        @param xscale: 输入的量化步长, 在验证集上校准
+        """
+        qweight, wscale = quantize_weight(weight, 0)
+        super().__init__("qconv2d", qweight, wscale, np.asarray(bias, dtype=np.float32))
+        self.stride = stride
+        self.padding = padding
+        self.xscale = float(xscale)
+
+    def cal(self, X):
+        FN, C, FH, FW = self.params[0].shape
+        if self.channels_last:
+            N, H, W, C = X.shape
+        else:
+            N, C, H, W = X.shape
+        out_h = 1 + (H + 2 * self.padding - FH) // self.stride
+        out_w = 1 + (W + 2 * self.padding - FW) // self.stride
+        # 先量化输入再展开, 量化的元素数只有列矩阵的1/(FH*FW)
+        col = im2col(self.quantizeinput(X), FH, FW, self.stride, self.padding, self.channels_last)
+        out = int8dot(col, self.params[0].reshape(FN, -1).T)
+        out *= self.xscale * self.params[1]
+        out += self.params[2]
+        out = out.reshape(N, out_h, out_w, FN)
+        return out if self.channels_last else out.transpose(0, 3, 1, 2)
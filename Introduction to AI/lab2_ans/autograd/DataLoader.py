@@ -0,0 +1,122 @@
+import queue
+import threading
+import numpy as np
+
+
+class Prefetcher(object):
+    '''
+    在后台线程中运行一个可迭代对象, 提前准备好最多prefetch个元素
+    '''
+    def __init__(self, iterable, prefetch: int = 2):
+        """
+        @param iterable: 要预取的可迭代对象, 如生成batch的生成器
+        @param prefetch: 最多提前准备的元素个数
+        """
+        self.iterable = iterable
+        self.prefetch = prefetch
+
+    def __iter__(self):
+        """
+        消费者提前停止(break或关闭生成器)时, 通知后台线程退出并等待它结束
+        后台线程在产生下一个元素时才能检查到停止, 因此iterable的每个元素都应能在有限时间内产生
+        """
+        ready = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            # 队列满时定期检查消费者是否已停止, 避免永远阻塞
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for item in self.iterable:
+                    if not put(item):
+                        return
+                put(end)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, name="Prefetcher", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+
+class DataLoader(object):
+    '''
+    mini-batch数据加载器: 后台线程按随机排列取样本(gather)、做transform, 写入复用的缓冲区,
+    训练循环取到的batch已经准备好, 不需要等待
+    每次迭代(一个epoch)使用一个新的随机排列
+    '''
+    def __init__(self, X: np.ndarray, Y: np.ndarray, batchsize: int, prefetch: int = 2, shuffle: bool = True, transform=None):
+        """
+        @param X: n*... 全部样本
+        @param Y: n 全部label
+        @param batchsize: batch大小
+        @param prefetch: 最多提前准备的batch数
+        @param shuffle: 是否打乱顺序
+        @param transform: 可选, transform(tX, tY) -> (tX, tY), 在后台线程中执行, 如reshape、数据增强
+        """
+        self.X = X
+        self.Y = Y
+        self.batchsize = batchsize
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+        self.transform = transform
+        # prefetch个已准备好的batch, 1个正在准备的batch, 1个正在使用的batch
+        self.buffers = [(np.empty((batchsize,) + X.shape[1:], dtype=X.dtype),
+                         np.empty((batchsize,) + Y.shape[1:], dtype=Y.dtype)) for _ in range(prefetch + 2)]
+
+    def __len__(self):
+        return -(-self.X.shape[0] // self.batchsize)
+
+    def batches(self, perm, free):
+        for i in range(0, perm.shape[0], self.batchsize):
+            idx = perm[i:i + self.batchsize]
+            buf = free.get()
+            if buf is None:
+                # 消费者已停止
+                return
+            bufX, bufY = buf
+            tX, tY = bufX[:idx.shape[0]], bufY[:idx.shape[0]]
+            np.take(self.X, idx, axis=0, out=tX)
+            np.take(self.Y, idx, axis=0, out=tY)
+            if self.transform is not None:
+                tX, tY = self.transform(tX, tY)
+            yield idx, tX, tY, (bufX, bufY)
+
+    def __iter__(self):
+        """
+        @return: 依次产生 (perm, tX, tY), perm为这个batch的样本下标
+            tX, tY可能是复用的缓冲区, 只在取下一个batch之前有效
+        """
+        n = self.X.shape[0]
+        perm = np.random.permutation(n) if self.shuffle else np.arange(n)
+        free = queue.Queue()
+        for buf in self.buffers:
+            free.put(buf)
+        batches = iter(Prefetcher(self.batches(perm, free), self.prefetch))
+        try:
+            for idx, tX, tY, buf in batches:
+                yield idx, tX, tY
+                free.put(buf)
+        finally:
+            # 提前停止时后台线程可能在等待空闲缓冲区, 先唤醒它再等待其退出
+            free.put(None)
+            batches.close()
@@ -0,0 +1,327 @@
+from typing import List
+import copy
+import numpy as np
+from .BaseNode import *
+
+
+class InferOp(object):
+    '''
+    推理用的算子: 只有正向计算, 不保存cache
+    '''
+    def __call__(self, X):
+        pass
+
+
+class InferAffine(InferOp):
+    '''
+    逐元素的 X * scale + shift, 无法折叠进相邻层时使用
+    '''
+    def __init__(self, scale, shift):
+        self.scale = scale
+        self.shift = shift
+
+    def __call__(self, X):
+        return X * self.scale + self.shift
+
+
+class InferLinear(InferOp):
+    def __init__(self, weight, bias):
+        self.weight = weight
+        self.bias = bias
+        self.relu = False
+
+    def foldin(self, scale, shift):
+        """
+        把输入端的 X * scale + shift 折叠进权重
+        """
+        dtype = self.weight.dtype
+        scale = np.broadcast_to(scale, self.weight.shape[:1])
+        shift = np.broadcast_to(shift, self.weight.shape[:1])
+        self.bias = (self.bias + shift @ self.weight).astype(dtype)
+        self.weight = (scale[:, None] * self.weight).astype(dtype)
+
+    def foldout(self, scale, shift):
+        """
+        把输出端的 Y * scale + shift 折叠进权重
+        """
+        dtype = self.weight.dtype
+        self.weight = (self.weight * scale).astype(dtype)
+        self.bias = (self.bias * scale + shift).astype(dtype)
+
+    def __call__(self, X):
+        ret = np.dot(X, self.weight)
+        ret += self.bias
+        if self.relu:
+            np.maximum(ret, 0, out=ret)
+        return ret
+
+
+class InferConv2D(InferOp):
+    def __init__(self, weight, bias, stride, padding, backend="im2col", channels_last=False):
+        self.weight = weight
+        self.bias = bias
+        self.stride = stride
+        self.padding = padding
+        self.backend = autobackend(weight.shape, stride, padding) if backend == "auto" else backend
+        self.channels_last = channels_last
+        self.relu = False
+
+    def foldout(self, scale, shift):
+        """
+        把输出端按通道的 Y * scale + shift 折叠进卷积核
+        @param scale, shift: (FN, 1, 1) 或标量
+        """
+        dtype = self.weight.dtype
+        scale, shift = scale.reshape(-1), shift.reshape(-1)
+        self.weight = (self.weight * scale.reshape(-1, 1, 1, 1)).astype(dtype)
+        self.bias = (self.bias * scale + shift).astype(dtype)
+
+    def __call__(self, X):
+        if self.backend != "im2col":
+            ret, _ = conv_cal(self.backend, X, self.weight, self.bias, self.stride, self.padding, self.channels_last)
+            if self.relu:
+                np.maximum(ret, 0, out=ret)
+            return ret
+        FN, C, FH, FW = self.weight.shape
+        if self.channels_last:
+            N, H, W, C = X.shape
+        else:
+            N, C, H, W = X.shape
+        out_h = 1 + (H + 2 * self.padding - FH) // self.stride
+        out_w = 1 + (W + 2 * self.padding - FW) // self.stride
+        col = im2col(X, FH, FW, self.stride, self.padding, self.channels_last)
+        ret = np.dot(col, self.weight.reshape(FN, -1).T)
+        ret += self.bias
+        if self.relu:
+            np.maximum(ret, 0, out=ret)
+        ret = ret.reshape(N, out_h, out_w, FN)
+        return ret if self.channels_last else ret.transpose(0, 3, 1, 2)
+
+
+class InferQuant(InferOp):
+    '''
+    QuantLinear/QuantConv2D
+    numpy没有int8矩阵乘法, 权重预先转换为取值为整数的float32, 结果与int32累加相同(见int8dot)
+    '''
+    def __init__(self, node: QuantNode):
+        self.node = copy.copy(node)
+        self.node.params = list(node.params)
+        self.node.params[0] = node.params[0].astype(np.float32)
+        self.conv = isinstance(node, QuantConv2D)
+        self.channels_last = getattr(node, "channels_last", False)
+        self.relu = False
+
+    def foldin(self, scale, shift):
+        """
+        把输入端的 X * scale + shift 合并进输入的量化, 不改变量化后的权重
+        """
+        self.node.xmul = (scale / self.node.xscale).astype(np.float32)
+        self.node.xadd = (shift / self.node.xscale).astype(np.float32)
+
+    def foldout(self, scale, shift):
+        """
+        把输出端按通道的 Y * scale + shift 折叠进每个通道的量化步长和bias, 与量化无关, 是精确的
+        """
+        params = self.node.params
+        scale, shift = np.broadcast_to(scale.reshape(-1), params[1].shape), shift.reshape(-1)
+        params[1] = (params[1] * scale).astype(np.float32)
+        params[2] = (params[2] * scale + shift).astype(np.float32)
+
+    def __call__(self, X):
+        ret = self.node.cal(X)
+        if self.relu:
+            np.maximum(ret, 0, out=ret)
+        return ret
+
+
+class InferReLU(InferOp):
+    def __call__(self, X):
+        return np.maximum(X, 0)
+
+
+class InferMaxPool2D(InferOp):
+    def __init__(self, node: MaxPool2D):
+        self.node = node
+
+    def __call__(self, X):
+        node = self.node
+        if not node.isdirect():
+            ret = node.cal(X)
+            node.flush()
+            return ret
+        k = node.pool_size
+        if node.channels_last:
+            # 通道在最后一维, 逐个窗口位置取np.maximum比在中间的维度上求max快
+            win = node.windows(X, X.shape[1] // k, X.shape[2] // k)
+            ret = np.maximum(win[0], win[1])
+            for w in win[2:]:
+                np.maximum(ret, w, out=ret)
+            return ret
+        N, C, H, W = X.shape
+        out_h, out_w = H // k, W // k
+        return X[:, :, :out_h * k, :out_w * k].reshape(N, C, out_h, k, out_w, k).max(axis=(3, 5))
+
+
+class InferFlatten(InferOp):
+    def __init__(self, channels_last=False):
+        self.channels_last = channels_last
+
+    def __call__(self, X):
+        if self.channels_last and X.ndim == 4:
+            # 与Flatten相同, 按(C, H, W)的顺序展平
+            X = X.transpose(0, 3, 1, 2)
+        return X.reshape(X.shape[0], -1)
+
+
+class InferNode(InferOp):
+    '''
+    没有专门实现的节点, 调用其cal后立即清空cache
+    '''
+    def __init__(self, node: Node):
+        self.node = node
+
+    def __call__(self, X):
+        ret = self.node.cal(X)
+        self.node.flush()
+        return ret
+
+
+def affineof(node: Node):
+    """
+    eval模式下为逐元素仿射变换的节点, 返回(scale, shift), 否则返回None
+    scale与shift可以直接与该节点的输入broadcast: 按特征为(d,), 按通道为(c, 1, 1)(channels_last时为(c,)), 标量为()
+    没有滑动统计量的BatchNorm抛出ValueError
+    """
+    if isinstance(node, StdScaler):
+        scale = 1 / (np.asarray(node.std) + node.EPS)
+        shift = -np.asarray(node.mean) * scale
+        if scale.ndim > 1 and scale.size == scale.shape[-1]:
+            scale, shift = scale.reshape(-1), shift.reshape(-1)
+        return scale, shift
+    if isinstance(node, (BatchNorm, MyBatchNorm)):
+        checkstats(node)
+    if isinstance(node, BatchNorm):
+        scale = node.params[0] / (node.std + node.EPS).reshape(-1)
+        return scale, node.params[1] - node.mean.reshape(-1) * scale
+    if isinstance(node, MyBatchNorm):
+        scale = node.params[0] / (node.std + node.EPS).reshape(-1)
+        shift = node.params[1] - node.mean.reshape(-1) * scale
+        if node.channels_last:
+            return scale, shift
+        return scale.reshape(-1, 1, 1), shift.reshape(-1, 1, 1)
+    if isinstance(node, Dropout) and not node.inverted:
+        # 旧模型的Dropout在eval模式下只做缩放
+        return np.asarray(1 / (1 - node.p)), np.asarray(0.0)
+    return None
+
+
+class InferenceGraph(List):
+    '''
+    由Graph.compile_inference生成的推理流水线, 参数已冻结, 不保存任何cache
+    '''
+    def __init__(self, ops: List[InferOp] = (), dtype=None, channels_last=False):
+        super().__init__(ops)
+        self.dtype = dtype
+        self.channels_last = channels_last
+
+    def forward(self, X):
+        """
+        @param X: 输入样本, 图像为(N, C, H, W)
+        @return: 最后一个算子的输出
+        """
+        if self.dtype is not None:
+            X = np.asarray(X, dtype=self.dtype)
+        if self.channels_last and X.ndim == 4:
+            X = X.transpose(0, 2, 3, 1)
+        for op in self:
+            X = op(X)
+        return X
+
+    def __call__(self, X):
+        return self.forward(X)
+
+
+def compile_inference(nodes: List[Node], dtype=None, channels_last=False):
+    """
+    把eval模式下的节点编译为推理流水线:
+    StdScaler与eval模式的BatchNorm/MyBatchNorm/Dropout折叠进相邻的Linear/Conv2D, ReLU融合进前一个Linear/Conv2D
+    量化节点只折叠输出端的BatchNorm
+    @param nodes: 不含loss节点的节点列表
+    @param dtype: 输入转换为的精度, None表示不转换
+    @param channels_last: 卷积部分使用(N, H, W, C)布局, 见Graph.channelslast
+    @return: InferenceGraph
+    """
+    ops = InferenceGraph(dtype=dtype, channels_last=channels_last)
+    # 尚未折叠的输入端仿射变换 X * scale + shift
+    pending = None
+
+    def flushpending():
+        nonlocal pending
+        if pending is not None:
+            ops.append(InferAffine(*pending))
+            pending = None
+
+    for node in nodes:
+        if isinstance(node, Dropout) and node.inverted:
+            # eval模式下为恒等映射
+            continue
+        last = ops[-1] if len(ops) > 0 else None
+        affine = affineof(node)
+        if affine is not None:
+            scale, shift = affine
+            if isinstance(last, InferLinear) or (isinstance(last, InferQuant) and not last.conv):
+                foldable = scale.ndim <= 1 and shift.ndim <= 1
+            elif isinstance(last, (InferConv2D, InferQuant)):
+                ndims = (0, 1) if last.channels_last else (0, 3)
+                foldable = scale.ndim in ndims and shift.ndim in ndims
+            else:
+                foldable = False
+            if pending is None and foldable and not last.relu:
+                last.foldout(scale, shift)
+            elif pending is None:
+                pending = (scale, shift)
+            else:
+                pending = (pending[0] * scale, pending[1] * scale + shift)
+            continue
+
+        if isinstance(node, Linear):
+            op = InferLinear(node.params[0].copy(), node.params[1].copy())
+            if pending is not None and pending[0].ndim <= 1 and pending[1].ndim <= 1:
+                op.foldin(*pending)
+                pending = None
+            flushpending()
+            ops.append(op)
+        elif isinstance(node, Conv2D):
+            flushpending()
+            ops.append(InferConv2D(node.params[0].copy(), node.params[1].copy(), node.stride, node.padding,
+                                   node.backend, node.channels_last))
+        elif isinstance(node, QuantNode):
+            op = InferQuant(node)
+            if op.conv:
+                ndims = (0, 1) if op.channels_last else (0, 3)
+            else:
+                ndims = (0, 1)
+            if pending is not None and pending[0].ndim in ndims and pending[1].ndim in ndims:
+                # 合并进输入的量化, 不重新量化权重
+                op.foldin(*pending)
+                pending = None
+            flushpending()
+            ops.append(op)
+        elif isinstance(node, relu):
+            flushpending()
+            last = ops[-1] if len(ops) > 0 else None
+            if isinstance(last, (InferLinear, InferConv2D, InferQuant)) and not last.relu:
+                last.relu = True
+            else:
+                ops.append(InferReLU())
+        elif isinstance(node, MaxPool2D):
+            flushpending()
+            ops.append(InferMaxPool2D(node))
+        elif isinstance(node, Flatten):
+            flushpending()
+            ops.append(InferFlatten(node.channels_last))
+        else:
+            flushpending()
+            ops.append(InferNode(node))
+    flushpending()
+    return ops
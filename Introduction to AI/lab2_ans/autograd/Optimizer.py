@@ -0,0 +1,168 @@
+import numpy as np
+
+
+class Optimizer(object):
+    '''
+    优化器基类, 由Graph.optimstep调用
+    self.state[i] 保存第i个参数(按Graph.parameters()的顺序)的状态, 所有更新都原地进行
+    '''
+    def __init__(self):
+        self.state = []
+
+    def reset(self):
+        """
+        清空状态, 参数被替换(如Graph.astype)后调用
+        """
+        self.state = []
+
+    def step(self, params, grads, lr, wd1, wd2):
+        """
+        利用计算好的梯度对参数进行原地更新
+        @param params: 参数列表
+        @param grads: 梯度列表, grads[i]对应params[i]
+        @param lr: 学习率
+        @param wd1: L1正则化
+        @param wd2: L2正则化
+        @return: 不需要返回值
+        """
+        if len(self.state) != len(params):
+            self.state = [self.initstate(param) for param in params]
+        for param, grad, state in zip(params, grads, self.state):
+            self.update(param, grad, state, lr, wd1, wd2)
+
+    def initstate(self, param):
+        # buf: 用于存放中间结果, 避免每步分配临时数组
+        return {"buf": np.empty_like(param)}
+
+    def update(self, param, grad, state, lr, wd1, wd2):
+        pass
+
+    def decay(self, param, state, wd1, wd2):
+        """
+        在state["buf"]中原地计算正则项 wd1 * sign(param) + wd2 * param
+        @return: state["buf"], 正则项均为0时返回None
+        """
+        buf = state["buf"]
+        if wd1 == 0 and wd2 == 0:
+            return None
+        if wd1 == 0:
+            np.multiply(param, wd2, out=buf)
+        elif wd2 == 0:
+            np.sign(param, out=buf)
+            buf *= wd1
+        else:
+            np.sign(param, out=buf)
+            buf *= wd1 / wd2
+            buf += param
+            buf *= wd2
+        return buf
+
+    def decayedgrad(self, param, grad, state, wd1, wd2):
+        """
+        @return: grad + 正则项, 存放在state["buf"]中
+        """
+        buf = self.decay(param, state, wd1, wd2)
+        if buf is None:
+            buf = state["buf"]
+            np.copyto(buf, grad)
+        else:
+            buf += grad
+        return buf
+
+
+class SGD(Optimizer):
+    '''
+    带动量的随机梯度下降, momentum=0时即为普通SGD
+    '''
+    def __init__(self, momentum: float = 0.0, nesterov: bool = False):
+        super().__init__()
+        assert not nesterov or momentum > 0, "nesterov 需要 momentum > 0"
+        self.momentum = momentum
+        self.nesterov = nesterov
+
+    def initstate(self, param):
+        state = super().initstate(param)
+        if self.momentum > 0:
+            state["v"] = np.zeros_like(param)
+        return state
+
+    def update(self, param, grad, state, lr, wd1, wd2):
+        g = self.decayedgrad(param, grad, state, wd1, wd2)
+        if self.momentum > 0:
+            v = state["v"]
+            v *= self.momentum
+            v += g
+            if self.nesterov:
+                # g + momentum * v = momentum * (g / momentum + v)
+                g /= self.momentum
+                g += v
+                g *= self.momentum
+            else:
+                np.copyto(g, v)
+        g *= lr
+        param -= g
+
+
+class Adam(Optimizer):
+    '''
+    Adam, 正则项加在梯度上
+    '''
+    def __init__(self, beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8):
+        super().__init__()
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.t = 0
+
+    def reset(self):
+        super().reset()
+        self.t = 0
+
+    def step(self, params, grads, lr, wd1, wd2):
+        self.t += 1
+        super().step(params, grads, lr, wd1, wd2)
+
+    def initstate(self, param):
+        state = super().initstate(param)
+        state["m"] = np.zeros_like(param)
+        state["v"] = np.zeros_like(param)
+        return state
+
+    def gradient(self, param, grad, state, wd1, wd2):
+        return self.decayedgrad(param, grad, state, wd1, wd2)
+
+    def update(self, param, grad, state, lr, wd1, wd2):
+        g = self.gradient(param, grad, state, wd1, wd2)
+        m, v = state["m"], state["v"]
+        # m = beta1 * m + (1 - beta1) * g = beta1 * (m - g) + g
+        m -= g
+        m *= self.beta1
+        m += g
+        np.square(g, out=g)
+        v -= g
+        v *= self.beta2
+        v += g
+
+        # 偏差修正合并到步长中
+        step = lr * np.sqrt(1 - self.beta2 ** self.t) / (1 - self.beta1 ** self.t)
+        buf = state["buf"]
+        np.sqrt(v, out=buf)
+        buf += self.eps
+        np.divide(m, buf, out=buf)
+        buf *= step
+        param -= buf
+
+
+class AdamW(Adam):
+    '''
+    AdamW, 正则项与梯度解耦, 直接作用在参数上
+    '''
+    def gradient(self, param, grad, state, wd1, wd2):
+        return self.decayedgrad(param, grad, state, 0, 0)
+
+    def update(self, param, grad, state, lr, wd1, wd2):
+        buf = self.decay(param, state, wd1, wd2)
+        if buf is not None:
+            buf *= lr
+            param -= buf
+        super().update(param, grad, state, lr, wd1, wd2)
@@ -0,0 +1,292 @@
+import traceback
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from .BaseGraph import Graph
+
+
+def sharedarray(shape, dtype):
+    """
+    在共享内存中创建数组
+    @return: (SharedMemory, ndarray)
+    """
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def attacharray(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def bindparams(graph: Graph, flat: np.ndarray):
+    """
+    把计算图的参数替换为flat上的视图, flat中按Graph.parameters()的顺序连续存放
+    """
+    offset = 0
+    for node in graph:
+        for i, param in enumerate(node.params):
+            view = flat[offset:offset + param.size].reshape(param.shape)
+            np.copyto(view, param)
+            node.params[i] = view
+            offset += param.size
+
+
+def _worker(rank, conn, graph, specs, seed):
+    """
+    工作进程: 持有一份计算图副本, 参数与主进程共享, 梯度写入自己的梯度槽
+    """
+    shms = []
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        shm, arr = attacharray(name, shape, dtype)
+        shms.append(shm)
+        arrays[key] = arr
+    X, Y, grads = arrays["X"], arrays["Y"], arrays["grads"][rank]
+    # 参数直接指向共享内存, 主进程更新后无需再同步
+    offset = 0
+    for node in graph:
+        for i, param in enumerate(node.params):
+            node.params[i] = arrays["params"][offset:offset + param.size].reshape(param.shape)
+            offset += param.size
+    np.random.seed(seed + rank)
+
+    def reduce(arrays):
+        # BatchNorm的统计量由主进程在所有进程之间求和后发回
+        conn.send(("reduce", arrays))
+        return conn.recv()
+    for node in graph:
+        if "allreduce" in node.transient:
+            node.allreduce = reduce
+
+    while True:
+        cmd, arg = conn.recv()
+        try:
+            if cmd == "step":
+                graph[-1].y = Y[arg]
+                graph.flush()
+                pred, loss = graph.forward(X[arg])[-2:]
+                graph.backward()
+                offset = 0
+                for grad in graph.grads():
+                    grads[offset:offset + grad.size] = grad.ravel()
+                    offset += grad.size
+                conn.send(("done", (pred, loss)))
+            elif cmd == "train":
+                graph.train()
+                conn.send(None)
+            elif cmd == "eval":
+                graph.eval()
+                conn.send(None)
+            elif cmd == "state":
+                # 不属于参数的节点状态, 如BatchNorm的滑动均值和方差
+                conn.send([{k: getattr(node, k) for k in node.running} for node in graph])
+            elif cmd == "close":
+                break
+        except Exception:
+            conn.send(RuntimeError(f"worker {rank}:\n" + traceback.format_exc()))
+    for shm in shms:
+        shm.close()
+    conn.close()
+
+
+class DataParallel(object):
+    '''
+    数据并行训练: 每个mini-batch被切分到num_workers个进程上, 各进程持有一份计算图副本。
+    参数放在共享内存中, 各进程的梯度写入共享内存后求和(loss节点对样本求和, 因此与单进程的梯度相同),
+    再由主进程的graph.optimstep统一更新一次。
+    BatchNorm的均值、方差及其反向传播中的按通道求和在所有进程之间all-reduce, 与单进程只差浮点求和顺序;
+    只有Dropout的随机mask与单进程不同。
+    任何一步出错时结束所有工作进程并释放共享内存, DataParallel不能再使用。
+    '''
+    def __init__(self, graph: Graph, X: np.ndarray, Y: np.ndarray, num_workers: int = None, seed: int = 0):
+        """
+        @param graph: 主进程中的计算图, 参数会被替换为共享内存上的视图
+        @param X: 全部训练数据, 只在启动时复制到共享内存一次
+        @param Y: 全部训练标签
+        @param num_workers: 进程数, 默认为CPU核数; 为1时直接在主进程中训练
+        @param seed: 各进程的随机数种子为seed + rank
+        """
+        self.graph = graph
+        self.num_workers = mp.cpu_count() if num_workers is None else num_workers
+        if self.num_workers > 1 and getattr(graph, "profiler", None) is not None:
+            raise ValueError("the profiler only sees the main process; use num_workers = 1 when profiling")
+        self.shms = []
+        self.workers = []
+        self.conns = []
+        if self.num_workers <= 1:
+            self.X, self.Y = X, Y
+            return
+
+        params = graph.parameters()
+        size = sum(param.size for param in params)
+        dtype = params[0].dtype if params else np.float64
+        specs = {}
+        arrays = {}
+        for key, shape, dt in [("X", X.shape, X.dtype), ("Y", Y.shape, Y.dtype),
+                               ("params", (size,), dtype), ("grads", (self.num_workers, size), dtype)]:
+            shm, arr = sharedarray(shape, dt)
+            self.shms.append(shm)
+            specs[key] = (shm.name, shape, dt)
+            arrays[key] = arr
+        try:
+            np.copyto(arrays["X"], X)
+            np.copyto(arrays["Y"], Y)
+            bindparams(graph, arrays["params"])
+            self.gradbuf = arrays["grads"]
+            self.reduced = np.empty(size, dtype=dtype)
+
+            for rank in range(self.num_workers):
+                parent, child = mp.Pipe()
+                worker = mp.Process(target=_worker, args=(rank, child, graph, specs, seed), daemon=True)
+                worker.start()
+                child.close()
+                self.workers.append(worker)
+                self.conns.append(parent)
+        except BaseException:
+            self.terminate()
+            raise
+
+    def recvall(self, conns):
+        """
+        从每个进程各接收一条消息; 先全部接收再抛出其中的错误, 避免管道中留下未读的回复
+        """
+        rets = [conn.recv() for conn in conns]
+        for ret in rets:
+            if isinstance(ret, Exception):
+                raise ret
+        return rets
+
+    def broadcast(self, cmd, arg=None):
+        try:
+            for conn in self.conns:
+                conn.send((cmd, arg))
+            return self.recvall(self.conns)
+        except BaseException:
+            self.terminate()
+            raise
+
+    def gather(self, conns):
+        """
+        接收各进程step的结果; 期间各进程发来的("reduce", arrays)在所有进程之间求和后发回
+        @return: 各进程的(pred, loss)
+        """
+        while True:
+            rets = self.recvall(conns)
+            tags = set(tag for tag, _ in rets)
+            if tags == {"done"}:
+                return [ret for _, ret in rets]
+            if tags != {"reduce"}:
+                raise RuntimeError(f"workers out of sync: {tags}")
+            total = [sum(arrays) for arrays in zip(*(ret for _, ret in rets))]
+            for conn in conns:
+                conn.send(total)
+
+    def step(self, perm, lr, wd1, wd2, batch=None):
+        """
+        对一个mini-batch做一次forward、backward和参数更新
+        @param perm: mini-batch的样本下标
+        @param batch: 可选, 已经取好的(X[perm], Y[perm]), 如DataLoader预取的batch; 只在单进程时使用
+        @return: pred, loss 与graph.forward(X[perm])[-2:]相同
+        """
+        graph = self.graph
+        if not self.workers:
+            tX, tY = (self.X[perm], self.Y[perm]) if batch is None else batch
+            graph[-1].y = tY
+            graph.flush()
+            pred, loss = graph.forward(tX)[-2:]
+            graph.backward()
+            graph.optimstep(lr, wd1, wd2)
+            return pred, loss
+
+        chunks = [chunk for chunk in np.array_split(perm, self.num_workers) if chunk.size > 0]
+        try:
+            for conn, chunk in zip(self.conns, chunks):
+                conn.send(("step", chunk))
+            rets = self.gather(self.conns[:len(chunks)])
+        except BaseException:
+            self.terminate()
+            raise
+
+        # all-reduce: 各进程的梯度求和, 再拆分成各节点的梯度视图
+        np.sum(self.gradbuf[:len(chunks)], axis=0, out=self.reduced)
+        offset = 0
+        graph.flush()
+        for node in graph:
+            for param in node.params:
+                node.grad.append(self.reduced[offset:offset + param.size].reshape(param.shape))
+                offset += param.size
+        graph.optimstep(lr, wd1, wd2)
+
+        pred = np.concatenate([ret[0] for ret in rets], axis=0)
+        loss = sum(ret[1] for ret in rets)
+        return pred, loss
+
+    def train(self):
+        self.graph.train()
+        if self.workers:
+            self.broadcast("train")
+
+    def eval(self):
+        self.graph.eval()
+        if self.workers:
+            self.broadcast("eval")
+
+    def syncstate(self):
+        """
+        把BatchNorm等节点的滑动统计量复制回主进程的计算图, 保存模型前调用
+        统计量已经在所有进程之间同步, 数组仍取各进程的平均值; 其余状态(如Dropout的随机数生成器)取0号进程的
+        """
+        if not self.workers:
+            return
+        states = self.broadcast("state")
+        for k, node in enumerate(self.graph):
+            for key, v in states[0][k].items():
+                if isinstance(v, np.ndarray):
+                    v = np.mean([state[k][key] for state in states], axis=0)
+                setattr(node, key, v)
+
+    def release(self):
+        """
+        把参数从共享内存复制回普通数组, 并释放共享内存
+        """
+        for node in self.graph:
+            node.params = [np.array(param) for param in node.params]
+            node.grad = []
+        for shm in self.shms:
+            shm.close()
+            shm.unlink()
+        self.workers, self.conns, self.shms = [], [], []
+
+    def terminate(self):
+        """
+        出错时强制结束工作进程并释放共享内存, 不同步滑动统计量
+        """
+        for worker in self.workers:
+            worker.terminate()
+        for worker in self.workers:
+            worker.join()
+        self.release()
+
+    def close(self):
+        """
+        结束工作进程, 并把参数从共享内存复制回普通数组
+        """
+        if not self.workers:
+            return
+        try:
+            self.syncstate()
+            for conn in self.conns:
+                conn.send(("close", None))
+            for worker in self.workers:
+                worker.join()
+        finally:
+            self.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
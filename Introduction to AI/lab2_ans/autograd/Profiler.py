@@ -0,0 +1,149 @@
+import time
+import numpy as np
+from .BaseNode import *
+
+
+def nbytes(obj):
+    """
+    @return: obj中所有ndarray的总字节数, obj可以是嵌套的list/tuple
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(o) for o in obj)
+    return 0
+
+
+def newbytes(out, x):
+    """
+    @return: out中新分配的ndarray的总字节数, 与x共享内存的视图(如Flatten的reshape)不计入
+    """
+    if isinstance(out, np.ndarray):
+        if isinstance(x, np.ndarray) and np.may_share_memory(out, x):
+            return 0
+        return out.nbytes
+    if isinstance(out, (list, tuple)):
+        return sum(newbytes(o, x) for o in out)
+    return 0
+
+
+def cachebytes(node: Node):
+    """
+    @return: 节点为反向传播保留的数据的字节数, 包括cache和transient属性(如MaxPool2D的arg_max)
+    """
+    return nbytes(node.cache) + sum(nbytes(getattr(node, k, None)) for k in node.transient)
+
+
+def flopsof(node: Node, x, out):
+    """
+    估计节点一次正向传播的浮点运算次数, 乘加按2次计算
+    @param x: 节点的输入
+    @param out: 节点的输出
+    """
+    size = x.size if isinstance(x, np.ndarray) else 1
+    if isinstance(node, Linear):
+        indim, outdim = node.params[0].shape
+        return 2 * (size // indim) * indim * outdim
+    if isinstance(node, Conv2D):
+        FN, C, FH, FW = node.params[0].shape
+        # out.size // FN 为 N * out_h * out_w, 与布局无关
+        return 2 * out.size * C * FH * FW
+    if isinstance(node, (BatchNorm, MyBatchNorm)):
+        # 均值、方差、减均值、除标准差、缩放、平移
+        return 7 * size
+    if isinstance(node, (Softmax, LogSoftmax, SoftmaxCrossEntropy)):
+        return 5 * size
+    if isinstance(node, Flatten):
+        return 0
+    return size
+
+
+def backflopsof(node: Node, flops):
+    """
+    估计节点一次反向传播的浮点运算次数
+    @param flops: 对应的正向传播的浮点运算次数
+    """
+    if isinstance(node, (Linear, Conv2D)):
+        # 对输入和对参数各做一次矩阵乘法
+        return 2 * flops
+    return flops
+
+
+class Profiler(object):
+    '''
+    逐节点的性能统计: 正向/反向耗时、估计的FLOPs、新分配的字节数和为反向传播保留的cache大小
+    梯度检查点的重算单独计时(recompute列), 不计入forward和calls, 但计入FLOPs和alloc
+    用法: graph.profile(Profiler()), 训练若干步后调用report()输出并reset()
+    只统计主进程中的计算, 不能与多进程的DataParallel一起使用
+    '''
+    def __init__(self):
+        self.records = {}
+
+    def reset(self):
+        self.records = {}
+
+    def record(self, k, node):
+        if k not in self.records:
+            self.records[k] = {"name": node.name, "forward": 0.0, "backward": 0.0, "recompute": 0.0, "calls": 0,
+                               "flops": 0, "lastflops": 0, "alloc": 0, "cache": 0}
+        return self.records[k]
+
+    def forward(self, k, node: Node, x, debug=False, recompute=False):
+        """
+        代替node.forward, 记录第k个节点的正向传播
+        @param recompute: 是否为梯度检查点在反向传播时的重算
+        """
+        rec = self.record(k, node)
+        before = cachebytes(node)
+        start = time.perf_counter()
+        out = node.forward(x, debug)
+        rec["recompute" if recompute else "forward"] += time.perf_counter() - start
+        after = cachebytes(node)
+        if not recompute:
+            rec["calls"] += 1
+        rec["lastflops"] = flopsof(node, x, out)
+        rec["flops"] += rec["lastflops"]
+        rec["alloc"] += newbytes(out, x) + max(after - before, 0)
+        rec["cache"] = max(rec["cache"], after)
+        return out
+
+    def backward(self, k, node: Node, grad, debug=False):
+        """
+        代替node.backward, 记录第k个节点的反向传播
+        """
+        rec = self.record(k, node)
+        numgrad = len(node.grad)
+        start = time.perf_counter()
+        ret = node.backward(grad, debug)
+        rec["backward"] += time.perf_counter() - start
+        rec["flops"] += backflopsof(node, rec["lastflops"])
+        rec["alloc"] += newbytes(ret, grad) + nbytes(node.grad[numgrad:])
+        return ret
+
+    def report(self, title=""):
+        """
+        按节点输出统计结果, 时间和FLOPs为reset以来的累计值, cache为单步中保留的最大值
+        share和GFLOP/s使用的时间包括重算
+        @param title: 标题, 如"epoch 1"
+        @return: 各节点的统计结果列表
+        """
+        records = [self.records[k] for k in sorted(self.records)]
+        def elapsed(rec):
+            return rec["forward"] + rec["backward"] + rec["recompute"]
+        total = sum(elapsed(rec) for rec in records) or 1.0
+        print(f"== profile {title} ==")
+        print(f"{'#':>3s} {'node':12s} {'forward s':>10s} {'backward s':>11s} {'recompute s':>12s} {'share':>6s} "
+              f"{'GFLOP':>8s} {'GFLOP/s':>8s} {'alloc MiB':>10s} {'cache MiB':>10s}")
+        for k, rec in zip(sorted(self.records), records):
+            t = elapsed(rec)
+            print(f"{k:3d} {rec['name']:12s} {rec['forward']:10.3f} {rec['backward']:11.3f} "
+                  f"{rec['recompute']:12.3f} {t / total:6.1%} "
+                  f"{rec['flops'] / 1e9:8.2f} {rec['flops'] / 1e9 / max(t, 1e-12):8.2f} "
+                  f"{rec['alloc'] / 2**20:10.1f} {rec['cache'] / 2**20:10.2f}")
+        print(f"    {'total':12s} {sum(rec['forward'] for rec in records):10.3f} "
+              f"{sum(rec['backward'] for rec in records):11.3f} "
+              f"{sum(rec['recompute'] for rec in records):12.3f} {'':6s} "
+              f"{sum(rec['flops'] for rec in records) / 1e9:8.2f} {'':8s} "
+              f"{sum(rec['alloc'] for rec in records) / 2**20:10.1f} "
+              f"{sum(rec['cache'] for rec in records) / 2**20:10.2f}")
+        return records
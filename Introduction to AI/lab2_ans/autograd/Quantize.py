@@ -0,0 +1,110 @@
+import copy
+import os
+import tempfile
+import time
+import numpy as np
+from .BaseNode import *
+from .BaseGraph import Graph
+from .Serialize import savegraph
+
+'''
+训练后int8量化(post-training quantization), 只用于推理:
+    Linear/Conv2D的权重按输出通道对称量化为int8, 输入按整个张量对称量化, 量化步长在验证集的一部分上校准
+    矩阵乘法的累加与int32相同(见BaseNode.int8dot), 其余节点不变
+    量化的计算图没有反向传播, Graph.backward会抛出RuntimeError
+用法:
+    qgraph = quantize(graph, valX[:1000])
+    report(graph, qgraph, valX[1000:], valY[1000:])
+    savegraph(qgraph, quant_path(save_path))
+'''
+
+
+def quant_path(path):
+    """
+    @return: 量化模型的保存路径
+    """
+    return f"{path}.int8"
+
+
+def calibrate(graph: Graph, X: np.ndarray, percentile: float = 100.0, chunk: int = 256):
+    """
+    在校准集上运行浮点模型, 统计每个Linear/Conv2D节点输入的绝对值范围
+    @param X: 校准样本, 如验证集的一部分
+    @param percentile: 取绝对值的该百分位数作为范围, 100为最大值, 略小于100可以忽略离群值
+    @return: {节点下标: 输入的量化步长}
+    """
+    graph.eval()
+    graph.flush()
+    ranges = {}
+    for i in range(0, X.shape[0], chunk):
+        outs = graph.forward(X[i:i + chunk], removelossnode=1)
+        inputs = [X[i:i + chunk]] + outs[:-1]
+        for k, node in enumerate(graph[:-1]):
+            if isinstance(node, (Linear, Conv2D)):
+                x = np.abs(inputs[k])
+                r = np.max(x) if percentile >= 100 else np.percentile(x, percentile)
+                ranges[k] = max(ranges.get(k, 0.0), float(r))
+        graph.flush()
+    return {k: (r / QMAX if r > 0 else 1.0) for k, r in ranges.items()}
+
+
+def quantize(graph: Graph, X: np.ndarray, percentile: float = 100.0):
+    """
+    生成量化的计算图: Linear/Conv2D替换为QuantLinear/QuantConv2D, 其余节点复制
+    BatchNorm不预先折叠, compile_inference时折叠进每个通道的量化步长, 不影响量化误差
+    @param graph: 训练好的计算图
+    @param X: 校准样本
+    @param percentile: 见calibrate
+    @return: 只用于推理的Graph, 可以用savegraph保存, 用compile_inference或forward推理
+    """
+    xscales = calibrate(graph, X, percentile)
+    nodes = []
+    for k, node in enumerate(graph):
+        if k in xscales and isinstance(node, Linear):
+            nodes.append(QuantLinear(node.params[0], node.params[1], xscales[k]))
+        elif k in xscales:
+            qnode = QuantConv2D(node.params[0], node.params[1], node.stride, node.padding, xscales[k])
+            qnode.channels_last = node.channels_last
+            nodes.append(qnode)
+        else:
+            node = copy.deepcopy(node)
+            node.flush()
+            nodes.append(node)
+    # 其余节点(如StdScaler)转换为float32, 量化节点保持int8
+    qgraph = Graph(nodes, dtype=np.float32)
+    qgraph.eval()
+    return qgraph
+
+
+def accuracy(infer, X: np.ndarray, Y: np.ndarray, chunk: int = 1024):
+    """
+    @param infer: compile_inference得到的推理流水线
+    @return: 准确率, 以及每个样本平均的推理时间(秒)
+    """
+    hit = 0
+    start = time.perf_counter()
+    for i in range(0, X.shape[0], chunk):
+        hit += np.sum(np.argmax(infer(X[i:i + chunk]), axis=-1) == Y[i:i + chunk])
+    return hit / X.shape[0], (time.perf_counter() - start) / X.shape[0]
+
+
+def report(graph: Graph, qgraph: Graph, X: np.ndarray, Y: np.ndarray):
+    """
+    比较浮点模型和量化模型的准确率、推理时间和模型文件大小
+    @param X, Y: 测试样本, 不应与校准样本重叠
+    @return: {"acc", "qacc", "delta", "time", "qtime", "size", "qsize"}
+    """
+    acc, t = accuracy(graph.compile_inference(), X, Y)
+    qacc, qt = accuracy(qgraph.compile_inference(), X, Y)
+    sizes = []
+    # 在临时目录中保存一次以测量模型文件大小
+    with tempfile.TemporaryDirectory() as tmp:
+        for k, g in enumerate((graph, qgraph)):
+            path = os.path.join(tmp, f"{k}.model")
+            savegraph(g, path)
+            sizes.append(os.path.getsize(path))
+    print(f"float acc {acc:.4f}  int8 acc {qacc:.4f}  delta {qacc - acc:+.4f}")
+    print(f"float {t * 1e6:.1f} us/sample  int8 {qt * 1e6:.1f} us/sample  speedup {t / qt:.2f}x")
+    print(f"float {sizes[0] / 2**10:.1f} KiB  int8 {sizes[1] / 2**10:.1f} KiB  ratio {sizes[0] / sizes[1]:.1f}x")
+    return {"acc": acc, "qacc": qacc, "delta": qacc - acc, "time": t, "qtime": qt,
+            "size": sizes[0], "qsize": sizes[1]}
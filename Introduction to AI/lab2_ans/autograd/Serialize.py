@@ -0,0 +1,124 @@
+import json
+import numpy as np
+from . import BaseNode
+from .BaseGraph import Graph
+
+'''
+模型文件格式(只保存参数和必要的节点状态, 不使用pickle):
+    MAGIC (8字节)
+    头部长度 (8字节, little-endian)
+    头部: utf-8 JSON, 包含版本号、计算图结构和每个数组在数据区的位置
+    数据区: 所有数组连续存放, 每个数组按ALIGN字节对齐, 可以直接memmap
+'''
+MAGIC = b"AGMODEL\0"
+VERSION = 1
+ALIGN = 64
+
+# 不保存的节点属性
+SKIP = ("grad", "cache", "params")
+
+
+def nodeclass(name):
+    """
+    只允许BaseNode中定义的Node子类, 避免加载任意类
+    """
+    cls = getattr(BaseNode, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, BaseNode.Node)):
+        raise ValueError(f"unknown node type {name}")
+    return cls
+
+
+def savegraph(graph: Graph, path):
+    """
+    保存计算图的结构和参数
+    @param graph: 计算图
+    @param path: 文件路径
+    """
+    arrays = []
+    nodes = []
+
+    def addarray(arr):
+        arr = np.ascontiguousarray(arr)
+        arrays.append(arr)
+        return len(arrays) - 1
+
+    for node in graph:
+        attrs = {}
+        for k, v in vars(node).items():
+            if k in SKIP or k in node.transient:
+                continue
+            if isinstance(v, np.ndarray):
+                attrs[k] = {"array": addarray(v)}
+            elif isinstance(v, np.generic):
+                attrs[k] = v.item()
+            elif v is None or isinstance(v, (bool, int, float, str)):
+                attrs[k] = v
+            else:
+                raise TypeError(f"cannot save attribute {type(node).__name__}.{k} of type {type(v).__name__}")
+        nodes.append({"type": type(node).__name__, "params": [addarray(p) for p in node.params], "attrs": attrs})
+
+    offset = 0
+    layout = []
+    for arr in arrays:
+        offset = -(-offset // ALIGN) * ALIGN
+        layout.append({"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset})
+        offset += arr.nbytes
+    dtype = getattr(graph, "dtype", None)
+    header = json.dumps({"version": VERSION, "dtype": None if dtype is None else np.dtype(dtype).str,
+                         "nodes": nodes, "arrays": layout}).encode("utf-8")
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for arr, info in zip(arrays, layout):
+            f.seek(start + info["offset"])
+            f.write(arr.tobytes())
+
+
+def loadgraph(path, mmap_mode="c"):
+    """
+    从savegraph保存的文件重建计算图
+    @param path: 文件路径
+    @param mmap_mode: 传给np.memmap, "c"为写时复制(可以继续训练), "r"为只读, None表示读入内存
+    @return: Graph
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a saved graph")
+        size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(size).decode("utf-8"))
+    if header["version"] > VERSION:
+        raise ValueError(f"unsupported model version {header['version']}")
+    start = -(-(len(MAGIC) + 8 + size) // ALIGN) * ALIGN
+
+    if mmap_mode is None:
+        raw = np.fromfile(path, dtype=np.uint8)
+    else:
+        # 转为普通ndarray视图, 底层仍是映射的文件
+        raw = np.memmap(path, dtype=np.uint8, mode=mmap_mode).view(np.ndarray)
+    arrays = []
+    for info in header["arrays"]:
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"]))
+        begin = start + info["offset"]
+        arrays.append(raw[begin:begin + count * dtype.itemsize].view(dtype).reshape(info["shape"]))
+
+    nodes = []
+    for spec in header["nodes"]:
+        cls = nodeclass(spec["type"])
+        # 不调用__init__, 直接恢复属性
+        node = cls.__new__(cls)
+        node.grad = []
+        node.cache = []
+        node.params = [arrays[i] for i in spec["params"]]
+        for k in cls.transient:
+            setattr(node, k, None)
+        for k, v in spec["attrs"].items():
+            setattr(node, k, arrays[v["array"]] if isinstance(v, dict) else v)
+        nodes.append(node)
+    graph = Graph(nodes)
+    if header["dtype"] is not None:
+        graph.dtype = np.dtype(header["dtype"])
+    return graph
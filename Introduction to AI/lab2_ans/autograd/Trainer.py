@@ -0,0 +1,219 @@
+import copy
+import math
+import os
+import threading
+import numpy as np
+from .BaseGraph import Graph
+from .DataLoader import DataLoader
+from .Parallel import DataParallel
+from .Serialize import savegraph
+
+'''
+学习率调度: schedule(epoch) 返回学习率, epoch为从0开始、带小数的训练进度, 每个mini-batch调用一次
+'''
+
+
+class ConstantLR(object):
+    def __init__(self, lr):
+        self.lr = lr
+
+    def __call__(self, epoch):
+        return self.lr
+
+
+class StepLR(object):
+    '''
+    每step_size个epoch学习率乘以gamma
+    '''
+    def __init__(self, lr, step_size: int, gamma: float = 0.1):
+        self.lr = lr
+        self.step_size = step_size
+        self.gamma = gamma
+
+    def __call__(self, epoch):
+        return self.lr * self.gamma ** (int(epoch) // self.step_size)
+
+
+class CosineLR(object):
+    '''
+    在max_epoch个epoch内按余弦从lr下降到min_lr
+    '''
+    def __init__(self, lr, max_epoch: int, min_lr: float = 0.0):
+        self.lr = lr
+        self.max_epoch = max_epoch
+        self.min_lr = min_lr
+
+    def __call__(self, epoch):
+        t = min(epoch / self.max_epoch, 1.0)
+        return self.min_lr + (self.lr - self.min_lr) * (1 + math.cos(math.pi * t)) / 2
+
+
+class WarmupLR(object):
+    '''
+    前warmup个epoch学习率从0线性增加到schedule的值, 之后与schedule相同
+    '''
+    def __init__(self, schedule, warmup: float = 1.0):
+        self.schedule = schedule
+        self.warmup = warmup
+
+    def __call__(self, epoch):
+        lr = self.schedule(epoch)
+        if epoch < self.warmup:
+            lr *= epoch / self.warmup
+        return lr
+
+
+def snapshot(graph: Graph):
+    """
+    复制计算图的参数和滑动统计量, 得到一个与训练互不影响的计算图, 用于保存或恢复
+    """
+    nodes = []
+    for node in graph:
+        node = copy.copy(node)
+        node.params = [param.copy() for param in node.params]
+        node.flush()
+        for k in node.running:
+            setattr(node, k, copy.deepcopy(getattr(node, k)))
+        nodes.append(node)
+    ret = Graph(nodes)
+    ret.dtype = getattr(graph, "dtype", None)
+    return ret
+
+
+class Trainer(object):
+    '''
+    训练循环: 预取mini-batch、按schedule调整学习率、每个epoch在验证集上评估,
+    验证集准确率连续patience个epoch没有提升时提前停止, 最好的模型在后台线程中写入文件
+    '''
+    def __init__(self, graph: Graph, X: np.ndarray, Y: np.ndarray, batchsize: int, schedule,
+                 wd1: float = 0.0, wd2: float = 0.0, valX: np.ndarray = None, valY: np.ndarray = None,
+                 patience: int = None, min_delta: float = 0.0, save_path=None, num_workers: int = 1,
+                 prefetch: int = 2):
+        """
+        @param graph: 以loss节点结尾的计算图
+        @param X, Y: 训练数据
+        @param schedule: 学习率调度, 如CosineLR; 也可以是一个数, 表示固定学习率
+        @param valX, valY: 验证集, None表示用训练集准确率选择模型且不提前停止
+        @param patience: 验证集准确率连续多少个epoch提升不超过min_delta时停止, None表示不提前停止
+        @param save_path: 最好的模型保存的路径, None表示不保存
+        @param num_workers: 数据并行的进程数, 见DataParallel
+        @param prefetch: 预取的batch数, 见DataLoader
+        """
+        self.graph = graph
+        self.X, self.Y = X, Y
+        self.schedule = ConstantLR(schedule) if isinstance(schedule, (int, float)) else schedule
+        self.wd1, self.wd2 = wd1, wd2
+        self.valX, self.valY = valX, valY
+        self.patience = patience
+        self.min_delta = min_delta
+        self.save_path = save_path
+        self.dataloader = DataLoader(X, Y, batchsize, prefetch)
+        self.parallel = DataParallel(graph, X, Y, num_workers)
+        self.best = None
+        self.bestacc = -1.0
+        self.writer = None
+
+    def evaluate(self, X, Y, chunk: int = 1024):
+        """
+        @return: 计算图在(X, Y)上的准确率
+        """
+        infer = self.graph.compile_inference()
+        hit = 0
+        for i in range(0, X.shape[0], chunk):
+            hit += np.sum(np.argmax(infer(X[i:i + chunk]), axis=-1) == Y[i:i + chunk])
+        return hit / X.shape[0]
+
+    def save(self, graph: Graph):
+        """
+        在后台线程中把graph写入save_path, 先写临时文件再替换, 避免中断时留下不完整的文件
+        """
+        if self.save_path is None:
+            return
+        self.wait()
+
+        def write():
+            tmp = f"{self.save_path}.tmp"
+            savegraph(graph, tmp)
+            os.replace(tmp, self.save_path)
+        self.writer = threading.Thread(target=write)
+        self.writer.start()
+
+    def wait(self):
+        """
+        等待正在进行的保存结束
+        """
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+    def fit(self, max_epoch: int):
+        """
+        训练最多max_epoch个epoch, 结束后计算图的参数恢复为最好的模型
+        @return: 每个epoch的记录 {"epoch", "lr", "loss", "acc", "valacc"}
+        """
+        graph = self.graph
+        history = []
+        steps = len(self.dataloader)
+        stale = 0
+        for i in range(max_epoch):
+            self.parallel.train()
+            hatys = []
+            ys = []
+            losss = []
+            for j, (perm, tX, tY) in enumerate(self.dataloader):
+                lr = self.schedule(i + j / steps)
+                pred, loss = self.parallel.step(perm, lr, self.wd1, self.wd2, (tX, tY))
+                hatys.append(np.argmax(pred, axis=1))
+                ys.append(self.Y[perm])
+                losss.append(loss)
+            loss = np.average(losss)
+            acc = np.average(np.concatenate(hatys) == np.concatenate(ys))
+            self.parallel.syncstate()
+            valacc = None if self.valX is None else self.evaluate(self.valX, self.valY)
+            history.append({"epoch": i + 1, "lr": lr, "loss": loss, "acc": acc, "valacc": valacc})
+            print(f"epoch {i + 1} lr {lr:.2e} loss {loss:.3e} acc {acc:.4f}"
+                  + ("" if valacc is None else f" val acc {valacc:.4f}"))
+            if getattr(graph, "profiler", None) is not None:
+                graph.profiler.report(f"epoch {i + 1}")
+                graph.profiler.reset()
+
+            score = acc if valacc is None else valacc
+            if score > self.bestacc + self.min_delta:
+                self.bestacc = score
+                self.best = snapshot(graph)
+                self.save(self.best)
+                stale = 0
+            else:
+                stale += 1
+                if self.valX is not None and self.patience is not None and stale >= self.patience:
+                    print(f"early stopping at epoch {i + 1}, best val acc {self.bestacc:.4f}")
+                    break
+        self.restore()
+        return history
+
+    def restore(self):
+        """
+        把最好的模型的参数和滑动统计量复制回计算图
+        """
+        if self.best is None:
+            return
+        for node, best in zip(self.graph, self.best):
+            for param, value in zip(node.params, best.params):
+                np.copyto(param, value)
+            for k in node.running:
+                setattr(node, k, copy.deepcopy(getattr(best, k)))
+
+    def close(self):
+        """
+        等待保存结束并结束工作进程
+        """
+        self.wait()
+        self.parallel.close()
+        # close会把工作进程中最新的滑动统计量复制回来, 需要再恢复一次
+        self.restore()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
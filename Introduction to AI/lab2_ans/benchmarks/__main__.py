@@ -0,0 +1,26 @@
+'''
+运行全部性能测试, 使用随机数据, 不依赖mnist
+用法: python -m benchmarks (在lab2_ans目录下运行)
+性能测试只输出耗时和内存, 数值正确性由tests中的测试检查
+'''
+import numpy as np
+from .im2col import bench_im2col
+from .maxpool import bench_maxpool
+from .dtype import bench_dtype
+from .inference import bench_inference
+from .checkpoint import bench_checkpoint
+from .batchnorm import bench_batchnorm
+from .conv import bench_conv
+from .layout import bench_layout
+from .quantization import bench_quantize
+
+np.random.seed(0)
+bench_im2col()
+bench_maxpool()
+bench_dtype()
+bench_inference()
+bench_checkpoint()
+bench_batchnorm()
+bench_conv()
+bench_layout()
+bench_quantize()
@@ -0,0 +1,85 @@
+'''
+MyBatchNorm: 原先的实现(用滑动统计量归一化)与batch统计量实现的耗时和收敛速度
+用法: python -m benchmarks.batchnorm
+'''
+import numpy as np
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from .common import batchsize, timeit, trainstep, syntheticDigits
+
+
+# 原先的MyBatchNorm: 用滑动统计量归一化, 反向传播忽略batch统计量的梯度, 作为对照
+class MyBatchNormOld(BaseNode.MyBatchNorm):
+    def cal(self, X):
+        n, c, h, w = X.shape
+        X = X.reshape(n, c, -1)
+        if self.updatemean:
+            tmean, tstd = np.mean(X, axis=(0, 2), keepdims=True, dtype=np.float64), np.std(X, axis=(0, 2), keepdims=True, dtype=np.float64)
+            if self.mean is None or self.std is None:
+                self.mean = tmean
+                self.std = tstd
+            else:
+                self.mean *= self.momentum
+                self.mean += (1-self.momentum) * tmean
+                self.std *= self.momentum
+                self.std += (1-self.momentum) * tstd
+        X = X.copy()
+        X -= self.mean
+        X /= (self.std + self.EPS)
+        self.cache.append(X.copy())
+        X *= self.params[0].reshape(1, c, 1)
+        X += self.params[1].reshape(1, c, 1)
+        return X.reshape(n, c, h, w)
+
+    def backcal(self, grad):
+        n, c, h, w = grad.shape
+        grad = grad.reshape(n, c, -1)
+        X = self.cache[-1]
+        self.grad.append(np.multiply(X, grad).sum(axis=(0, 2)))
+        self.grad.append(grad.sum(axis=(0, 2)))
+        return ((grad * self.params[0].reshape(1, c, 1)) / (self.std + self.EPS).astype(grad.dtype)).reshape(n, c, h, w)
+
+
+def bench_batchnorm():
+    print("== BatchNorm ==")
+    x = np.random.rand(batchsize, 32, 26, 26).astype(np.float32)
+    grad = np.random.rand(*x.shape).astype(np.float32)
+    for name, cls in [("old", MyBatchNormOld), ("new", BaseNode.MyBatchNorm)]:
+        node = cls(32)
+        node.astype(np.float32)
+
+        def step():
+            node.flush()
+            node.cal(x)
+            node.backcal(grad)
+        print(f"{name:4s} forward+backward {timeit(step) * 1e3:7.2f} ms")
+
+    X, Y = syntheticDigits(6000)
+    trnX, trnY, valX, valY = X[:5000], Y[:5000], X[5000:], Y[5000:]
+    for name, cls in [("old", MyBatchNormOld), ("new", BaseNode.MyBatchNorm)]:
+        np.random.seed(0)
+        graph = Graph([
+            BaseNode.Conv2D(input_channels=1, output_channels=8, kernel_size=3),
+            cls(indim=8),
+            BaseNode.relu(),
+            BaseNode.MaxPool2D(pool_size=2),
+            BaseNode.Flatten(),
+            BaseNode.Linear(indim=8 * 13 * 13, outdim=10),
+            BaseNode.SoftmaxCrossEntropy(trnY)
+        ], dtype=np.float32)
+        accs = []
+        for epoch in range(5):
+            graph.train()
+            perm = np.random.permutation(trnX.shape[0])
+            for i in range(0, perm.shape[0], batchsize):
+                trainstep(graph, trnX[perm[i:i + batchsize]], trnY[perm[i:i + batchsize]])
+            graph.eval()
+            graph.flush()
+            pred = graph.forward(valX, removelossnode=1)[-1]
+            accs.append(np.mean(np.argmax(pred, axis=1) == valY))
+        print(f"{name:4s} val acc per epoch " + " ".join(f"{acc:.3f}" for acc in accs))
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_batchnorm()
@@ -0,0 +1,25 @@
+'''
+梯度检查点的内存峰值与耗时
+用法: python -m benchmarks.checkpoint
+'''
+import numpy as np
+from .common import batchsize, randomBatch, buildCNN, trainstep, timeit, peakmemory
+
+
+def bench_checkpoint():
+    print("== gradient checkpointing ==")
+    X, Y = randomBatch(4 * batchsize)
+    for segments in [1, [4, 8], None]:
+        np.random.seed(0)
+        graph = buildCNN(Y)
+        graph.checkpoint(segments)
+        trainstep(graph, X, Y)
+        graph.flush()
+        peak = peakmemory(lambda: trainstep(graph, X, Y))
+        t = timeit(lambda: trainstep(graph, X, Y), 3)
+        print(f"segments {str(graph.checkpoints):16s} peak {peak / 2**20:6.1f} MiB  step {t * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_checkpoint()
@@ -0,0 +1,108 @@
+'''
+性能测试共用的工具函数, 使用随机数据, 不依赖mnist
+'''
+import time
+import tracemalloc
+import numpy as np
+from autograd.BaseGraph import Graph
+import autograd.BaseNode as BaseNode
+
+num_train = 60000   # 用于把单步耗时换算为每个epoch的耗时
+batchsize = 128
+
+
+def timeit(func, repeat=5):
+    """
+    多次运行取最快的一次
+    @param func: 无参数的函数
+    @param repeat: 重复次数
+    @return: 单次运行时间(秒)
+    """
+    func()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def buildCNN(Y):
+    """
+    与YourTraining.buildGraph相同的网络结构
+    """
+    nodes = [
+        BaseNode.Conv2D(input_channels=1, output_channels=32, kernel_size=3),
+        BaseNode.MyBatchNorm(indim=32),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Conv2D(input_channels=32, output_channels=64, kernel_size=3),
+        BaseNode.MyBatchNorm(indim=64),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=1600, outdim=128),
+        BaseNode.relu(),
+        BaseNode.Dropout(p=0.1),
+        BaseNode.Linear(indim=128, outdim=10),
+        BaseNode.SoftmaxCrossEntropy(Y)
+    ]
+    return Graph(nodes)
+
+
+def randomBatch(n=batchsize):
+    X = np.random.rand(n, 1, 28, 28)
+    Y = np.random.randint(0, 10, n)
+    return X, Y
+
+
+def trainstep(graph, X, Y):
+    graph[-1].y = Y
+    graph.flush()
+    graph.forward(X)
+    graph.backward()
+    graph.optimstep(3e-4, 1e-4, 7e-4)
+
+
+def epochtime(graph, X, Y, repeat=5):
+    """
+    @return: 估计的每个epoch训练时间(秒)
+    """
+    step = timeit(lambda: trainstep(graph, X, Y), repeat)
+    return step * (num_train // X.shape[0])
+
+
+def cachebytes(graph):
+    """
+    @return: 计算图中所有节点缓存的ndarray(激活值与梯度)的总字节数
+    """
+    def nbytes(obj):
+        if isinstance(obj, np.ndarray):
+            return obj.nbytes
+        if isinstance(obj, (list, tuple)):
+            return sum(nbytes(o) for o in obj)
+        return 0
+    return sum(nbytes(node.cache) + nbytes(node.grad) for node in graph)
+
+
+def peakmemory(func):
+    """
+    @return: func运行期间numpy数组占用内存的峰值(字节)
+    """
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def syntheticDigits(n, noise=1.0):
+    """
+    可学习的随机数据: 10个平滑的28*28模板加噪声, 用于比较收敛速度
+    @return: X (n, 1, 28, 28), Y (n)
+    """
+    rng = np.random.default_rng(1)
+    templates = rng.random((10, 1, 7, 7)).repeat(4, axis=2).repeat(4, axis=3)
+    Y = rng.integers(0, 10, n)
+    X = templates[Y] + noise * rng.standard_normal((n, 1, 28, 28))
+    return X.astype(np.float32), Y
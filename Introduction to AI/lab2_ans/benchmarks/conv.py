@@ -0,0 +1,36 @@
+'''
+Conv2D各卷积实现的耗时, BaseNode.autobackend的阈值来自这里
+用法: python -m benchmarks.conv
+'''
+import numpy as np
+import autograd.BaseNode as BaseNode
+from .common import batchsize, timeit
+
+
+def bench_conv():
+    print("== Conv2D backends (float32) ==")
+    # 前两行为buildCNN中的两个卷积层
+    shapes = [((batchsize, 1, 28, 28), 32, 3), ((batchsize, 32, 13, 13), 64, 3),
+              ((batchsize, 64, 13, 13), 64, 3), ((32, 128, 14, 14), 128, 3),
+              ((batchsize, 8, 28, 28), 16, 7), ((batchsize, 3, 28, 28), 16, 9)]
+    for xshape, FN, K in shapes:
+        x = np.random.rand(*xshape).astype(np.float32)
+        W = (0.01 * np.random.randn(FN, xshape[1], K, K)).astype(np.float32)
+        b = np.zeros(FN, dtype=np.float32)
+        auto = BaseNode.autobackend(W.shape, 1, 0)
+        for backend in ["im2col", "winograd", "fft"]:
+            if backend == "winograd" and K != 3:
+                continue
+            out, cache = BaseNode.conv_cal(backend, x, W, b)
+            grad = np.random.rand(*out.shape).astype(np.float32)
+            t_fwd = timeit(lambda: BaseNode.conv_cal(backend, x, W, b))
+            t_bwd = timeit(lambda: BaseNode.conv_backcal(backend, grad, W, cache))
+            # autobackend按total选择
+            print(f"{str(xshape):18s} {FN:4d} {K}x{K} {backend:8s} forward {t_fwd * 1e3:7.2f} ms  "
+                  f"backward {t_bwd * 1e3:7.2f} ms  total {(t_fwd + t_bwd) * 1e3:7.2f} ms"
+                  + ("  <- auto" if backend == auto else ""))
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_conv()
@@ -0,0 +1,28 @@
+'''
+float64与float32训练的耗时和内存
+用法: python -m benchmarks.dtype
+'''
+import numpy as np
+from .common import randomBatch, buildCNN, epochtime, cachebytes
+
+
+def bench_dtype():
+    print("== float64 / float32 ==")
+    X, Y = randomBatch()
+    for dtype in [np.float64, np.float32]:
+        np.random.seed(0)
+        graph = buildCNN(Y)
+        graph.astype(dtype)
+        t = epochtime(graph, X, Y)
+        graph[-1].y = Y
+        graph.flush()
+        graph.forward(X)
+        graph.backward()
+        params = sum(p.nbytes for p in graph.parameters())
+        print(f"{np.dtype(dtype).name:8s} epoch {t:6.1f} s  params {params / 2**20:5.2f} MiB  "
+              f"activations+grads {cachebytes(graph) / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_dtype()
@@ -0,0 +1,75 @@
+'''
+im2col/col2im: 原先的循环实现与strided实现的比较
+用法: python -m benchmarks.im2col
+'''
+import numpy as np
+import autograd.BaseNode as BaseNode
+from .common import batchsize, timeit, buildCNN, randomBatch, epochtime
+
+
+# 原先的im2col/col2im实现, 作为对照
+# channels_last与BaseNode.im2col/col2im相同, 先转换为(N, C, H, W)再用原来的循环, 以便在整个CNN中替换
+def im2col_loop(input_data, filter_h, filter_w, stride=1, pad=0, channels_last=False):
+    if channels_last:
+        input_data = input_data.transpose(0, 3, 1, 2)
+    N, C, H, W = input_data.shape
+    out_h = (H + 2 * pad - filter_h) // stride + 1
+    out_w = (W + 2 * pad - filter_w) // stride + 1
+
+    img = np.pad(input_data, [(0, 0), (0, 0), (pad, pad), (pad, pad)], 'constant')
+    col = np.zeros((N, C, filter_h, filter_w, out_h, out_w))
+
+    for y in range(filter_h):
+        y_max = y + stride * out_h
+        for x in range(filter_w):
+            x_max = x + stride * out_w
+            col[:, :, y, x, :, :] = img[:, :, y:y_max:stride, x:x_max:stride]
+
+    col = col.transpose(0, 4, 5, 1, 2, 3).reshape(N * out_h * out_w, -1)
+    return col
+
+
+def col2im_loop(col, input_shape, filter_h, filter_w, stride=1, pad=0, channels_last=False):
+    if channels_last:
+        N, H, W, C = input_shape
+    else:
+        N, C, H, W = input_shape
+    out_h = (H + 2 * pad - filter_h) // stride + 1
+    out_w = (W + 2 * pad - filter_w) // stride + 1
+    col = col.reshape(N, out_h, out_w, C, filter_h, filter_w).transpose(0, 3, 4, 5, 1, 2)
+
+    img = np.zeros((N, C, H + 2 * pad + stride - 1, W + 2 * pad + stride - 1))
+    for y in range(filter_h):
+        y_max = y + stride * out_h
+        for x in range(filter_w):
+            x_max = x + stride * out_w
+            img[:, :, y:y_max:stride, x:x_max:stride] += col[:, :, y, x, :, :]
+
+    img = img[:, :, pad:H + pad, pad:W + pad]
+    return img.transpose(0, 2, 3, 1) if channels_last else img
+
+
+def bench_im2col():
+    print("== im2col / col2im ==")
+    X, Y = randomBatch()
+    x = np.random.rand(batchsize, 32, 13, 13)
+    col = BaseNode.im2col(x, 3, 3)
+    for name, f in [("loop", im2col_loop), ("strided", BaseNode.im2col)]:
+        print(f"im2col  {name:8s} {timeit(lambda: f(x, 3, 3)) * 1e3:8.2f} ms")
+    for name, f in [("loop", col2im_loop), ("strided", BaseNode.col2im)]:
+        print(f"col2im  {name:8s} {timeit(lambda: f(col, x.shape, 3, 3)) * 1e3:8.2f} ms")
+
+    fast = (BaseNode.im2col, BaseNode.col2im)
+    graph = buildCNN(Y)
+    BaseNode.im2col, BaseNode.col2im = im2col_loop, col2im_loop
+    try:
+        t_loop = epochtime(graph, X, Y)
+    finally:
+        BaseNode.im2col, BaseNode.col2im = fast
+    t_fast = epochtime(graph, X, Y)
+    print(f"CNN epoch  loop {t_loop:.1f} s  strided {t_fast:.1f} s  speedup {t_loop / t_fast:.2f}x")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_im2col()
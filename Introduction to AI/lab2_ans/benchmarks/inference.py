@@ -0,0 +1,29 @@
+'''
+Graph.forward与compile_inference的单张图片推理耗时
+用法: python -m benchmarks.inference
+'''
+import numpy as np
+from .common import randomBatch, buildCNN, trainstep, timeit
+
+
+def bench_inference():
+    print("== single-image inference ==")
+    X, Y = randomBatch()
+    graph = buildCNN(Y)
+    trainstep(graph, X, Y)
+    graph.eval()
+    figure = X[:1]
+
+    def run():
+        graph.flush()
+        return graph.forward(figure, removelossnode=1)[-1]
+    t_graph = timeit(run, 50)
+    infer = graph.compile_inference()
+    t_infer = timeit(lambda: infer(figure), 50)
+    print(f"Graph.forward {t_graph * 1e3:6.3f} ms  compiled {t_infer * 1e3:6.3f} ms  "
+          f"speedup {t_graph / t_infer:.2f}x  max diff {np.abs(run() - infer(figure)).max():.1e}")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_inference()
@@ -0,0 +1,28 @@
+'''
+NCHW与NHWC布局的训练和推理耗时
+用法: python -m benchmarks.layout
+'''
+import numpy as np
+from .common import num_train, batchsize, randomBatch, buildCNN, trainstep, timeit
+
+
+def bench_layout():
+    print("== NCHW / NHWC (float32) ==")
+    X, Y = randomBatch()
+    for name, channels_last in [("NCHW", False), ("NHWC", True)]:
+        np.random.seed(0)
+        graph = buildCNN(Y)
+        graph.astype(np.float32)
+        graph.channelslast(channels_last)
+        t_step = timeit(lambda: trainstep(graph, X, Y), 10)
+        graph.eval()
+        infer = graph.compile_inference()
+        t_infer = timeit(lambda: infer(X), 10)
+        graph.train()
+        print(f"{name} train step {t_step * 1e3:7.2f} ms  epoch {t_step * (num_train // batchsize):5.1f} s  "
+              f"inference {t_infer * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_layout()
@@ -0,0 +1,26 @@
+'''
+MaxPool2D: im2col实现与直接实现的比较
+用法: python -m benchmarks.maxpool
+'''
+import numpy as np
+import autograd.BaseNode as BaseNode
+from .common import batchsize, timeit
+
+
+def bench_maxpool():
+    print("== MaxPool2D ==")
+    x = np.random.rand(batchsize, 32, 26, 26)
+    for name, direct in [("im2col", False), ("direct", True)]:
+        pool = BaseNode.MaxPool2D(pool_size=2)
+        pool.isdirect = lambda: direct
+        out = pool.cal(x)
+        grad = np.random.rand(*out.shape)
+        t_fwd = timeit(lambda: pool.cal(x))
+        t_bwd = timeit(lambda: pool.backcal(grad))
+        cache = pool.arg_max.nbytes + (x.nbytes if pool.x is not None else 0)
+        print(f"{name:8s} forward {t_fwd * 1e3:7.2f} ms  backward {t_bwd * 1e3:7.2f} ms  cache {cache / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_maxpool()
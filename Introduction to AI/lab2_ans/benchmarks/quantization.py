@@ -0,0 +1,39 @@
+'''
+int8量化前后的准确率、推理耗时和模型大小
+用法: python -m benchmarks.quantization
+'''
+import numpy as np
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Quantize import quantize, report
+from .common import batchsize, buildCNN, trainstep, syntheticDigits
+
+
+def bench_quantize():
+    print("== int8 quantization ==")
+    X, Y = syntheticDigits(8000, noise=1.5)
+    trnX, trnY, calX, tstX, tstY = X[:5000], Y[:5000], X[5000:6000], X[6000:], Y[6000:]
+
+    def flat(x):
+        # MLP与MnistModel.MLPModel相同, 输入展平为float64
+        return x.reshape(x.shape[0], -1).astype(np.float64)
+    for name, graph, prep in [
+        ("MLP float64", Graph([BaseNode.StdScaler(flat(trnX).mean(0), flat(trnX).std(0)),
+                               BaseNode.Linear(784, 128), BaseNode.relu(), BaseNode.Linear(128, 10),
+                               BaseNode.SoftmaxCrossEntropy(trnY)]), flat),
+        ("CNN float32", buildCNN(trnY), lambda x: x)]:
+        np.random.seed(0)
+        if name.startswith("CNN"):
+            graph.astype(np.float32)
+        for epoch in range(2):
+            graph.train()
+            perm = np.random.permutation(trnX.shape[0])
+            for i in range(0, perm.shape[0], batchsize):
+                trainstep(graph, prep(trnX[perm[i:i + batchsize]]), trnY[perm[i:i + batchsize]])
+        print(name)
+        report(graph, quantize(graph, prep(calX)), prep(tstX), tstY)
+
+
+if __name__ == "__main__":
+    np.random.seed(0)
+    bench_quantize()
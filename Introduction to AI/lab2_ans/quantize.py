@@ -0,0 +1,36 @@
+'''
+训练后int8量化: 用验证集的前calib_size个样本校准, 在其余样本上比较准确率、推理时间和模型文件大小
+用法: python quantize.py, 量化后的模型由MnistModel中的QMLPModel和QCNNModel加载
+'''
+import pickle
+import mnist
+import modelMultiLayerPerceptron as MLP
+import YourTraining as lxy
+from autograd.Serialize import savegraph, loadgraph
+from autograd.Quantize import quantize, report, quant_path
+
+calib_size = 1000   # 校准样本数
+percentile = 100.0  # 输入范围取绝对值的百分位数, 见Quantize.calibrate
+
+
+def quantizemodel(graph, X, Y, path):
+    """
+    量化graph并保存到quant_path(path)
+    @param X, Y: 前calib_size个样本用于校准, 其余用于比较
+    """
+    qgraph = quantize(graph, X[:calib_size], percentile)
+    report(graph, qgraph, X[calib_size:], Y[calib_size:])
+    savegraph(qgraph, quant_path(path))
+    return qgraph
+
+
+if __name__ == "__main__":
+    print("== MLP ==")
+    with open(MLP.save_path, "rb") as f:
+        graph = pickle.load(f)
+    quantizemodel(graph, mnist.val_X.reshape(mnist.val_X.shape[0], -1), mnist.val_Y, MLP.save_path)
+
+    print("== CNN ==")
+    # 只使用没有加入训练集的验证样本
+    graph = loadgraph(lxy.save_path, mmap_mode=None)
+    quantizemodel(graph, lxy.val_X.reshape(-1, 1, 28, 28), lxy.val_Y, lxy.save_path)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试从lab2_ans导入autograd等模块, autograd/Init.py由课程提供
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+
+
+def numgrad(f, x, eps=1e-6):
+    # 中心差分, 逐元素
+    g = np.zeros_like(x)
+    for i in np.ndindex(*x.shape):
+        old = x[i]
+        x[i] = old + eps
+        fp = f()
+        x[i] = old - eps
+        fm = f()
+        x[i] = old
+        g[i] = (fp - fm) / (2 * eps)
+    return g
+
+
+def makenode(kind, channels_last):
+    if kind == "BatchNorm":
+        node = BaseNode.BatchNorm(indim=3)
+    else:
+        node = BaseNode.MyBatchNorm(indim=3)
+        node.channels_last = channels_last
+    rng = np.random.default_rng(1)
+    node.params = [rng.uniform(0.5, 1.5, 3), rng.standard_normal(3)]
+    return node
+
+
+@pytest.mark.parametrize("kind, shape, channels_last", [
+    ("BatchNorm", (6, 3), False),
+    ("MyBatchNorm", (4, 3, 2, 3), False),
+    ("MyBatchNorm", (4, 2, 3, 3), True),
+])
+@pytest.mark.parametrize("training", [True, False])
+def test_gradient_matches_finite_difference(kind, shape, channels_last, training):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal(shape) * 2 + 1
+    R = rng.standard_normal(shape)
+    node = makenode(kind, channels_last)
+    node.cal(X)
+    if not training:
+        node.eval()
+
+    def loss():
+        # 训练模式下输出只依赖当前batch的统计量, 与滑动统计量无关
+        node.flush()
+        return np.sum(node.cal(X) * R)
+    loss()
+    dx = node.backcal(R)
+    dgamma, dbeta = node.grad
+    np.testing.assert_allclose(dx, numgrad(loss, X), rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(dgamma, numgrad(loss, node.params[0]), rtol=1e-5, atol=1e-7)
+    np.testing.assert_allclose(dbeta, numgrad(loss, node.params[1]), rtol=1e-5, atol=1e-7)
+
+
+def test_training_output_is_normalised():
+    X = np.random.default_rng(0).standard_normal((64, 3, 4, 4)) * 3 + 2
+    node = BaseNode.MyBatchNorm(indim=3)
+    out = node.cal(X)
+    np.testing.assert_allclose(out.mean(axis=(0, 2, 3)), 0, atol=1e-12)
+    np.testing.assert_allclose(out.std(axis=(0, 2, 3)), X.std(axis=(0, 2, 3)) / (X.std(axis=(0, 2, 3)) + node.EPS), rtol=1e-12)
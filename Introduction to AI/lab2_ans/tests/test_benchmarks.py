@@ -0,0 +1,25 @@
+import numpy as np
+import autograd.BaseNode as BaseNode
+import benchmarks.common as common
+import benchmarks.im2col as bench
+
+
+def test_loop_reference_matches_im2col():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((2, 3, 7, 8))
+    for channels_last in (False, True):
+        xx = x.transpose(0, 2, 3, 1) if channels_last else x
+        col = bench.im2col_loop(xx, 3, 3, 2, 1, channels_last)
+        np.testing.assert_array_equal(col, BaseNode.im2col(xx, 3, 3, 2, 1, channels_last))
+        c = rng.standard_normal(col.shape)
+        np.testing.assert_allclose(bench.col2im_loop(c, xx.shape, 3, 3, 2, 1, channels_last),
+                                   BaseNode.col2im(c, xx.shape, 3, 3, 2, 1, channels_last), rtol=1e-12, atol=1e-12)
+
+
+def test_bench_im2col_runs(monkeypatch, capsys):
+    # 用很小的batch运行一遍, 只检查能在当前的Conv2D/MaxPool2D上替换并跑完
+    monkeypatch.setattr(bench, "batchsize", 4)
+    monkeypatch.setattr(bench, "randomBatch", lambda: common.randomBatch(4))
+    bench.bench_im2col()
+    assert BaseNode.im2col is not bench.im2col_loop and BaseNode.col2im is not bench.col2im_loop
+    assert "speedup" in capsys.readouterr().out
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Optimizer import SGD
+
+
+def buildnet(Y):
+    np.random.seed(0)
+    return Graph([
+        BaseNode.Conv2D(input_channels=2, output_channels=4, kernel_size=3, padding=1),
+        BaseNode.MyBatchNorm(indim=4),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Dropout(p=0.3),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=4 * 4 * 4, outdim=16),
+        BaseNode.BatchNorm(indim=16),
+        BaseNode.relu(),
+        BaseNode.Dropout(p=0.2),
+        BaseNode.Linear(indim=16, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ], optimizer=SGD(momentum=0.9))
+
+
+def train(graph, X, Y, steps=3):
+    # 每步更换batch和label; 返回每步的loss和输入梯度, 以及结束时的全局随机数状态
+    np.random.seed(1)
+    results = []
+    for k in range(steps):
+        idx = np.arange(k, k + 6)
+        graph[-1].y = Y[idx]
+        graph.flush()
+        loss = graph.forward(X[idx])[-1]
+        dx = graph.backward()
+        graph.optimstep(0.1, 1e-4, 1e-3)
+        results.append((loss, dx))
+    return results, np.random.get_state()[1].copy()
+
+
+@pytest.mark.parametrize("segments", [None, 3, [4, 5, 10]])
+def test_checkpoint_training_is_identical(segments):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((10, 2, 8, 8))
+    Y = rng.integers(0, 3, 10)
+    plain, ckpt = buildnet(Y), buildnet(Y)
+    ckpt.checkpoint(segments)
+    assert len(ckpt.segments()) > 1
+    (ra, sa), (rb, sb) = train(plain, X, Y), train(ckpt, X, Y)
+    # 重算时恢复了随机数状态, 之后的随机数与不使用检查点时相同
+    np.testing.assert_array_equal(sa, sb)
+    for (la, da), (lb, db) in zip(ra, rb):
+        assert la == lb
+        np.testing.assert_array_equal(da, db)
+    for a, b in zip(plain.parameters(), ckpt.parameters()):
+        np.testing.assert_array_equal(a, b)
+    for a, b in zip(plain.optimizer.state, ckpt.optimizer.state):
+        np.testing.assert_array_equal(a["v"], b["v"])
+    for k in (1, 7):
+        np.testing.assert_array_equal(plain[k].mean, ckpt[k].mean)
+        np.testing.assert_array_equal(plain[k].std, ckpt[k].std)
+    for k in (4, 9):
+        assert plain[k].rng.bit_generator.state == ckpt[k].rng.bit_generator.state
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+
+CASES = [  # (N, C, H, W), FN, K, stride, pad, backends
+    ((2, 3, 8, 8), 4, 3, 1, 0, ["winograd", "fft"]),
+    ((2, 3, 7, 9), 5, 3, 1, 1, ["winograd", "fft"]),
+    ((1, 2, 6, 5), 3, 3, 1, 2, ["winograd", "fft"]),
+    ((2, 2, 11, 10), 3, 5, 2, 1, ["fft"]),
+    ((1, 3, 12, 12), 2, 7, 1, 3, ["fft"]),
+]
+
+
+def conv(backend, x, W, b, g, stride, pad, channels_last=False):
+    out, cache = BaseNode.conv_cal(backend, x, W, b, stride, pad, channels_last)
+    return (out,) + BaseNode.conv_backcal(backend, g, W, cache, stride, pad, channels_last)
+
+
+@pytest.mark.parametrize("xshape, FN, K, stride, pad, backends", CASES)
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_backends_match_im2col(xshape, FN, K, stride, pad, backends, channels_last):
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal(xshape)
+    W = rng.standard_normal((FN, xshape[1], K, K))
+    b = rng.standard_normal(FN)
+    if channels_last:
+        x = np.ascontiguousarray(x.transpose(0, 2, 3, 1))
+    out = BaseNode.conv_cal("im2col", x, W, b, stride, pad, channels_last)[0]
+    g = rng.standard_normal(out.shape)
+    expect = conv("im2col", x, W, b, g, stride, pad, channels_last)
+    for backend in backends:
+        for got, ref in zip(conv(backend, x, W, b, g, stride, pad, channels_last), expect):
+            assert got.shape == ref.shape
+            np.testing.assert_allclose(got, ref, rtol=1e-9, atol=1e-10)
+
+
+def test_float32_stays_single_precision():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((2, 3, 9, 9)).astype(np.float32)
+    W = rng.standard_normal((4, 3, 5, 5)).astype(np.float32)
+    b = np.zeros(4, dtype=np.float32)
+    out, cache = BaseNode.conv_cal("fft", x, W, b)
+    assert out.dtype == np.float32
+    Xf, Wf = cache[3], cache[4]
+    assert Xf.dtype == np.complex64 and Wf.dtype == np.complex64
+    np.testing.assert_allclose(out, BaseNode.conv_cal("im2col", x, W, b)[0], rtol=1e-4, atol=1e-4)
+
+
+def test_winograd_rejects_other_kernels():
+    with pytest.raises(ValueError, match="3x3"):
+        BaseNode.Conv2D(input_channels=2, output_channels=2, kernel_size=5, backend="winograd")
+    with pytest.raises(ValueError, match="stride"):
+        BaseNode.Conv2D(input_channels=2, output_channels=2, kernel_size=3, stride=2, backend="winograd")
+    with pytest.raises(ValueError, match="unknown"):
+        BaseNode.Conv2D(input_channels=2, output_channels=2, kernel_size=3, backend="direct")
+    x = np.zeros((1, 2, 8, 8))
+    with pytest.raises(ValueError):
+        BaseNode.conv_cal("winograd", x, np.zeros((2, 2, 3, 3)), np.zeros(2), stride=2)
+    with pytest.raises(ValueError):
+        BaseNode.conv_cal("winograd", x, np.zeros((2, 2, 5, 5)), np.zeros(2))
+
+
+def test_autobackend():
+    assert BaseNode.autobackend((128, 128, 3, 3), 1, 1) == "winograd"
+    # 64通道时winograd的正向加反向慢于im2col
+    assert BaseNode.autobackend((64, 64, 3, 3), 1, 1) == "im2col"
+    assert BaseNode.autobackend((32, 1, 3, 3), 1, 0) == "im2col"
+    assert BaseNode.autobackend((16, 8, 7, 7), 1, 0) == "fft"
+    assert BaseNode.autobackend((128, 128, 3, 3), 2, 1) == "im2col"
@@ -0,0 +1,57 @@
+import itertools
+import threading
+import numpy as np
+import pytest
+from autograd.DataLoader import Prefetcher, DataLoader
+
+
+def producers():
+    return [t for t in threading.enumerate() if t.name == "Prefetcher" and t.is_alive()]
+
+
+def test_prefetcher_yields_everything():
+    assert list(Prefetcher(iter(range(50)), prefetch=3)) == list(range(50))
+    assert producers() == []
+
+
+def test_prefetcher_raises_producer_error():
+    def broken():
+        yield 1
+        raise ValueError("bad batch")
+    with pytest.raises(ValueError, match="bad batch"):
+        list(Prefetcher(broken()))
+    assert producers() == []
+
+
+def test_prefetcher_stops_with_consumer():
+    # 无限的生成器, 生产者总是领先消费者并在队列满时等待
+    for k, item in enumerate(Prefetcher(itertools.count(), prefetch=2)):
+        assert item == k
+        if k == 3:
+            break
+    assert producers() == []
+    it = iter(Prefetcher(itertools.count(), prefetch=1))
+    assert next(it) == 0
+    it.close()
+    assert producers() == []
+
+
+@pytest.mark.parametrize("prefetch", [1, 3])
+def test_dataloader_stops_with_consumer(prefetch):
+    X = np.arange(200, dtype=np.float64).reshape(100, 2)
+    Y = np.arange(100)
+    loader = DataLoader(X, Y, batchsize=4, prefetch=prefetch)
+    seen = []
+    for perm, tX, tY in loader:
+        np.testing.assert_array_equal(tX, X[perm])
+        np.testing.assert_array_equal(tY, Y[perm])
+        seen.append(perm.copy())
+        if len(seen) == 2:
+            # 此时后台线程已用完所有缓冲区, 在等待空闲缓冲区
+            break
+    assert producers() == []
+    # 之后的epoch不受影响
+    perms = [perm.copy() for perm, _, _ in loader]
+    assert len(perms) == len(loader)
+    np.testing.assert_array_equal(np.sort(np.concatenate(perms)), np.arange(100))
+    assert producers() == []
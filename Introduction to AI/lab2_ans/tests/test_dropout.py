@@ -0,0 +1,105 @@
+import pickle
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Inference import InferLinear
+
+
+def numgrad(f, x, eps=1e-6):
+    # 中心差分, 逐元素
+    g = np.zeros_like(x)
+    for i in np.ndindex(*x.shape):
+        old = x[i]
+        x[i] = old + eps
+        fp = f()
+        x[i] = old - eps
+        fm = f()
+        x[i] = old
+        g[i] = (fp - fm) / (2 * eps)
+    return g
+
+
+def test_inverted_scaling_keeps_expectation():
+    node = BaseNode.Dropout(p=0.3)
+    node.rng = np.random.default_rng(0)
+    out = node.cal(np.ones(200000))
+    assert set(np.unique(out)) == {0.0, 1 / 0.7}
+    assert abs(out.mean() - 1) < 0.01
+    assert abs(np.mean(out == 0) - 0.3) < 0.01
+
+
+def test_gradient_matches_finite_difference():
+    rng = np.random.default_rng(1)
+    X = rng.standard_normal((4, 6))
+    R = rng.standard_normal((4, 6))
+    node = BaseNode.Dropout(p=0.4)
+
+    def loss():
+        # 每次使用相同的mask
+        node.flush()
+        node.rng = np.random.default_rng(2)
+        return np.sum(node.cal(X) * R)
+    loss()
+    grad = node.backcal(R)
+    np.testing.assert_allclose(grad, numgrad(loss, X), rtol=1e-6, atol=1e-8)
+    # 被丢弃的位置梯度为0, 保留的位置乘以1/(1-p)
+    node.rng = np.random.default_rng(2)
+    out = node.cal(X)
+    np.testing.assert_allclose(grad, np.where(out != 0, R / 0.6, 0.0))
+
+
+@pytest.mark.parametrize("shape", [(3, 5, 7), (16,), (2, 1, 9)])
+def test_mask_packbits_round_trip(shape):
+    X = np.random.default_rng(3).uniform(1, 2, shape)
+    node = BaseNode.Dropout(p=0.5)
+    out = node.cal(X)
+    packed = node.cache[-1]
+    assert packed.dtype == np.uint8 and packed.size == -(-X.size // 8)
+    keep = np.unpackbits(packed, count=X.size).reshape(shape).astype(bool)
+    np.testing.assert_array_equal(keep, out != 0)
+    np.testing.assert_array_equal(node.backcal(np.ones(shape)), np.where(keep, 2.0, 0.0))
+
+
+def test_eval_is_identity():
+    X = np.random.default_rng(4).standard_normal((5, 3))
+    node = BaseNode.Dropout(p=0.5)
+    node.eval()
+    assert node.cal(X) is X
+    assert node.backcal(X) is X
+    assert node.cache == []
+
+
+def oldpickle(p):
+    # 旧版本的Dropout没有inverted和rng属性
+    node = object.__new__(BaseNode.Dropout)
+    node.__dict__.update({"name": "dropout", "grad": [], "cache": [], "params": [], "p": p, "dropout": True})
+    return pickle.loads(pickle.dumps(node))
+
+
+def test_old_pickle_keeps_old_behaviour():
+    X = np.random.default_rng(5).uniform(1, 2, (50, 4))
+    node = oldpickle(0.2)
+    assert not node.inverted
+    out = node.cal(X)
+    # 训练时不缩放, eval时乘以1/(1-p)
+    np.testing.assert_array_equal(out[out != 0], X[out != 0])
+    node.eval()
+    np.testing.assert_allclose(node.cal(X), X / 0.8)
+
+
+@pytest.mark.parametrize("old", [False, True])
+def test_compile_inference(old):
+    rng = np.random.default_rng(6)
+    X = rng.standard_normal((7, 5))
+    np.random.seed(0)
+    dropout = oldpickle(0.25) if old else BaseNode.Dropout(p=0.25)
+    graph = Graph([BaseNode.Linear(5, 4), BaseNode.relu(), dropout, BaseNode.Linear(4, 3),
+                   BaseNode.SoftmaxCrossEntropy(np.zeros(7, dtype=np.int64))])
+    graph.eval()
+    graph.flush()
+    expected = graph.forward(X, removelossnode=1)[-1]
+    infer = graph.compile_inference()
+    # Dropout被去掉(新模型)或折叠进下一个Linear(旧模型)
+    assert len(infer) == 2 and all(isinstance(op, InferLinear) for op in infer)
+    np.testing.assert_allclose(infer(X), expected, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Optimizer import Adam
+
+
+def buildnet(Y, backend):
+    np.random.seed(0)
+    return Graph([
+        BaseNode.Conv2D(input_channels=2, output_channels=4, kernel_size=3, padding=1, backend=backend),
+        BaseNode.MyBatchNorm(indim=4),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Dropout(p=0.2),
+        BaseNode.Conv2D(input_channels=4, output_channels=6, kernel_size=3, backend=backend),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=6 * 2 * 2, outdim=8),
+        BaseNode.BatchNorm(indim=8),
+        BaseNode.tanh(),
+        BaseNode.Linear(indim=8, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ], optimizer=Adam(), dtype=np.float32)
+
+
+@pytest.mark.parametrize("backend", ["im2col", "winograd", "fft"])
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_float32_end_to_end(backend, channels_last):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((5, 2, 8, 8))  # float64输入, forward时转换
+    Y = rng.integers(0, 3, 5)
+    graph = buildnet(Y, backend)
+    graph.channelslast(channels_last)
+    assert all(p.dtype == np.float32 for p in graph.parameters())
+
+    # 逐节点记录反传的梯度
+    backward = graph.nodebackward
+    upstream = []
+
+    def nodebackward(k, node, grad, debug=False):
+        out = backward(k, node, grad, debug)
+        upstream.append(out)
+        return out
+    graph.nodebackward = nodebackward
+
+    for _ in range(2):
+        graph.flush()
+        outputs = graph.forward(X)
+        # loss按约定用float64求和, 其余激活值都是float32
+        assert [o.dtype for o in outputs[:-1]] == [np.float32] * (len(graph) - 1)
+        upstream.clear()
+        dx = graph.backward()
+        assert dx.dtype == np.float32
+        assert all(np.asarray(g).dtype == np.float32 for g in upstream)
+        assert all(g.dtype == np.float32 for g in graph.grads())
+        graph.optimstep(1e-3, 1e-4, 1e-4)
+        assert all(p.dtype == np.float32 for p in graph.parameters())
+        assert all(a.dtype == np.float32 for state in graph.optimizer.state for a in state.values())
+
+    graph.eval()
+    graph.flush()
+    assert graph.forward(X, removelossnode=1)[-1].dtype == np.float32
+    assert graph.compile_inference()(X).dtype == np.float32
@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+import answerTree
+from answerTree import buildTree, inferTree, inferTreeBatch, negginiDA
+
+# answerRandomForest导入课程提供的mnist模块, 不在路径中时跳过
+pytest.importorskip("mnist")
+import answerRandomForest as Forest
+
+
+def randomdata(n=240, d=16, seed=0):
+    # 标签由前几个特征决定, 再加一些噪声, 使树有一定深度
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 3, (n, d))
+    Y = (X[:, 0] + X[:, 3] * 2 + X[:, 5]) % 4
+    flip = rng.random(n) < 0.1
+    Y[flip] = rng.integers(0, 4, flip.sum())
+    return X, Y
+
+
+def unseendata(n=300, d=16, seed=1):
+    # 训练集中没有出现过的特征值3和4, 会走到"没有对应子节点"的分支
+    return np.random.default_rng(seed).integers(0, 5, (n, d))
+
+
+def test_tree_batch_matches_infertree():
+    X, Y = randomdata()
+    root = buildTree(X, Y, list(range(X.shape[1])), 6, 1.0, negginiDA)
+    T = np.concatenate([X, unseendata()])
+    expected = np.array([inferTree(root, x) for x in T])
+    np.testing.assert_array_equal(inferTreeBatch(root, T), expected)
+    # 确认用到了默认标签的分支
+    assert np.any(T[:, root.featidx] > 2)
+
+
+@pytest.mark.parametrize("gainfunc", [negginiDA, lambda X, Y, idx: answerTree.gain(X, Y, idx)])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_forest_batch_matches_infertrees(monkeypatch, gainfunc, workers):
+    monkeypatch.setattr(Forest, "num_tree", 6)
+    monkeypatch.setattr(Forest, "num_workers", 1)
+    monkeypatch.setattr(Forest, "ratio_feat", 0.5)
+    monkeypatch.setattr(Forest, "hyperparams", {"depth": 5, "purity_bound": 1.0, "gainfunc": gainfunc})
+    X, Y = randomdata()
+    trees = Forest.buildtrees(X, Y)
+    # 每棵树只用一部分特征, 批量预测需要把特征下标映射回原始输入
+    assert all(len(tree.feature_indices) == X.shape[1] // 2 for tree in trees)
+    T = np.concatenate([X, unseendata()])
+    expected = np.array([Forest.infertrees(trees, x) for x in T])
+    np.testing.assert_array_equal(Forest.infertreesBatch(trees, T, workers=workers), expected)
+
+
+def sameforest(a, b):
+    assert len(a) == len(b)
+    for ta, tb in zip(a, b):
+        np.testing.assert_array_equal(ta.feature_indices, tb.feature_indices)
+    fa, fb = Forest.flattenTrees(a), Forest.flattenTrees(b)
+    for key in ("featidx", "label", "children", "values", "roots"):
+        np.testing.assert_array_equal(getattr(fa, key), getattr(fb, key))
+
+
+def test_forest_independent_of_workers(monkeypatch):
+    monkeypatch.setattr(Forest, "num_tree", 7)
+    monkeypatch.setattr(Forest, "hyperparams", {"depth": 5, "purity_bound": 1.0, "gainfunc": negginiDA})
+    X, Y = randomdata()
+    results = []
+    # 工作进程由fork启动, 继承这里修改后的超参数
+    for workers in (1, 2, 3):
+        monkeypatch.setattr(Forest, "num_workers", workers)
+        results.append(Forest.buildtrees(X, Y, oob=True))
+    trees, curve = results[0]
+    for other, othercurve in results[1:]:
+        sameforest(trees, other)
+        assert othercurve == curve
+
+
+def sametree(a, b):
+    assert a.label == b.label and a.featidx == b.featidx
+    assert a.children.keys() == b.children.keys()
+    for k in a.children:
+        sametree(a.children[k], b.children[k])
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_weighted_tree_matches_bootstrap_copy(monkeypatch, seed):
+    monkeypatch.setattr(Forest, "ratio_feat", 0.5)
+    monkeypatch.setattr(Forest, "hyperparams", {"depth": 4, "purity_bound": 0.9, "gainfunc": negginiDA})
+    X, Y = randomdata(seed=seed)
+    values, Xc = answerTree.encode(X)
+    labels, Yc = answerTree.encode(Y)
+    seedseq = np.random.SeedSequence(seed)
+    tree, oob, _ = Forest.buildonetree(Xc, Yc, values, labels, seedseq)
+
+    # 按buildonetree的方式重新采样, 显式复制bootstrap样本后建树
+    rng = np.random.default_rng(seedseq)
+    n, d = X.shape
+    sample = rng.choice(n, int(n * Forest.ratio_data), replace=True)
+    feats = rng.choice(d, int(d * Forest.ratio_feat), replace=False)
+    expected = buildTree(X[sample][:, feats], Y[sample], list(range(feats.size)), 4, 0.9, negginiDA)
+    np.testing.assert_array_equal(tree.feature_indices, feats)
+    assert not tree.isLeaf()
+    sametree(tree, expected)
+    np.testing.assert_array_equal(oob, np.setdiff1d(np.arange(n), sample))
+
+
+def bruteforceoob(trees, X, Y):
+    # 按种子重新得到每棵树的袋外样本, 用前k棵树中没见过该样本的树投票
+    n = X.shape[0]
+    seeds = np.random.SeedSequence(Forest.seed).spawn(Forest.num_tree)
+    labels = np.unique(Y)
+    votes = np.zeros((n, labels.size), dtype=np.int64)
+    curve = []
+    for tree, s in zip(trees, seeds):
+        sample = np.random.default_rng(s).choice(n, int(n * Forest.ratio_data), replace=True)
+        for i in np.setdiff1d(np.arange(n), sample):
+            pred = inferTree(tree, X[i][tree.feature_indices])
+            votes[i, np.searchsorted(labels, pred)] += 1
+        voted = votes.sum(axis=1) > 0
+        curve.append(np.mean(labels[np.argmax(votes[voted], axis=1)] == Y[voted]))
+    return curve
+
+
+def test_oob_curve_matches_bruteforce(monkeypatch):
+    monkeypatch.setattr(Forest, "num_tree", 10)
+    monkeypatch.setattr(Forest, "num_workers", 1)
+    monkeypatch.setattr(Forest, "ratio_data", 0.8)
+    monkeypatch.setattr(Forest, "hyperparams", {"depth": 4, "purity_bound": 1.0, "gainfunc": negginiDA})
+    X, Y = randomdata()
+    trees, curve = Forest.buildtrees(X, Y, oob=True)
+    assert len(trees) == len(curve) == 10
+    np.testing.assert_allclose(curve, bruteforceoob(trees, X, Y), rtol=0, atol=1e-12)
+
+
+def test_oob_patience_stops_early(monkeypatch, capsys):
+    monkeypatch.setattr(Forest, "num_tree", 30)
+    monkeypatch.setattr(Forest, "num_workers", 1)
+    monkeypatch.setattr(Forest, "hyperparams", {"depth": 4, "purity_bound": 1.0, "gainfunc": negginiDA})
+    monkeypatch.setattr(Forest, "oob_tol", 0.01)
+    X, Y = randomdata()
+    full, fullcurve = Forest.buildtrees(X, Y, oob=True)
+    # 从完整曲线推出应当停止的位置
+    best, since, stop = 0.0, 0, None
+    for i, acc in enumerate(fullcurve):
+        if acc > best + Forest.oob_tol:
+            best, since = acc, 0
+        else:
+            since += 1
+        if since >= 3:
+            stop = i + 1
+            break
+    assert stop is not None and stop < 30
+    monkeypatch.setattr(Forest, "oob_patience", 3)
+    trees, curve = Forest.buildtrees(X, Y, oob=True)
+    assert len(trees) == len(curve) == stop
+    assert curve == fullcurve[:stop]
+    sameforest(trees, full[:stop])
+    Forest.printOOB(curve)
+    out = capsys.readouterr().out
+    assert f"trees {stop:4d}  oob acc {curve[-1]:.4f}" in out
+    assert f"在第{stop}棵树停止" in out
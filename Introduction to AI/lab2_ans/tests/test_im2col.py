@@ -0,0 +1,48 @@
+import numpy as np
+import autograd.BaseNode as BaseNode
+
+SHAPES = [  # (N, C, H, W), filter, stride, pad
+    ((2, 3, 7, 7), 3, 1, 0),
+    ((2, 3, 7, 8), 3, 2, 1),
+    ((1, 2, 9, 6), 2, 3, 2),
+    ((3, 1, 5, 5), 5, 1, 0),
+]
+
+
+def im2col_patches(x, fh, fw, stride, pad):
+    # 逐个输出位置取出感受野, 行按(n, i, j), 列按(c, y, x)排列
+    N, C, H, W = x.shape
+    img = np.pad(x, [(0, 0), (0, 0), (pad, pad), (pad, pad)])
+    out_h = (H + 2 * pad - fh) // stride + 1
+    out_w = (W + 2 * pad - fw) // stride + 1
+    rows = []
+    for n in range(N):
+        for i in range(out_h):
+            for j in range(out_w):
+                rows.append(img[n, :, i * stride:i * stride + fh, j * stride:j * stride + fw].ravel())
+    return np.array(rows)
+
+
+def test_im2col_matches_patches():
+    rng = np.random.default_rng(0)
+    for shape, f, stride, pad in SHAPES:
+        x = rng.standard_normal(shape)
+        expect = im2col_patches(x, f, f, stride, pad)
+        np.testing.assert_array_equal(BaseNode.im2col(x, f, f, stride, pad), expect)
+        # channels_last的输入展开后与NCHW相同
+        col = BaseNode.im2col(x.transpose(0, 2, 3, 1), f, f, stride, pad, channels_last=True)
+        np.testing.assert_array_equal(col, expect)
+
+
+def test_col2im_is_adjoint():
+    # col2im是im2col的转置: <im2col(x), c> == <x, col2im(c)>
+    rng = np.random.default_rng(1)
+    for shape, f, stride, pad in SHAPES:
+        x = rng.standard_normal(shape)
+        col = BaseNode.im2col(x, f, f, stride, pad)
+        c = rng.standard_normal(col.shape)
+        img = BaseNode.col2im(c, shape, f, f, stride, pad)
+        assert img.shape == shape
+        np.testing.assert_allclose(np.sum(col * c), np.sum(x * img), rtol=1e-12)
+        nhwc = BaseNode.col2im(c, (shape[0], shape[2], shape[3], shape[1]), f, f, stride, pad, channels_last=True)
+        np.testing.assert_allclose(nhwc.transpose(0, 3, 1, 2), img, rtol=1e-12, atol=1e-12)
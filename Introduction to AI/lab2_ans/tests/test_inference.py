@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+
+
+def buildmlp(Y):
+    np.random.seed(0)
+    return Graph([
+        BaseNode.Linear(indim=6, outdim=5),
+        BaseNode.BatchNorm(indim=5),
+        BaseNode.relu(),
+        BaseNode.Linear(indim=5, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ])
+
+
+def test_compiled_matches_forward():
+    X = np.random.default_rng(0).standard_normal((16, 6))
+    Y = np.arange(16) % 3
+    graph = buildmlp(Y)
+    graph.flush()
+    graph.forward(X)
+    graph.eval()
+    graph.flush()
+    expect = graph.forward(X, removelossnode=1)[-1]
+    np.testing.assert_allclose(graph.compile_inference()(X), expect, rtol=1e-12, atol=1e-12)
+
+
+def test_untrained_batchnorm_raises():
+    graph = buildmlp(np.zeros(4, dtype=np.int64))
+    graph.eval()
+    with pytest.raises(ValueError, match="running statistics"):
+        graph.compile_inference()
+    with pytest.raises(ValueError, match="running statistics"):
+        graph.forward(np.zeros((4, 6)), removelossnode=1)
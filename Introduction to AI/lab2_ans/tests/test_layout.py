@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+
+
+def buildcnn(Y, backend, channels_last):
+    np.random.seed(0)
+    graph = Graph([
+        BaseNode.Conv2D(input_channels=2, output_channels=4, kernel_size=3, padding=1, backend=backend),
+        BaseNode.MyBatchNorm(indim=4),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Conv2D(input_channels=4, output_channels=6, kernel_size=3, backend=backend),
+        BaseNode.MyBatchNorm(indim=6),
+        BaseNode.relu(),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=6 * 3 * 3, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ])
+    graph.channelslast(channels_last)
+    return graph
+
+
+@pytest.mark.parametrize("backend", ["im2col", "winograd", "fft"])
+def test_nhwc_matches_nchw(backend):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((6, 2, 10, 10))
+    Y = rng.integers(0, 3, 6)
+    graphs = [buildcnn(Y, backend, channels_last) for channels_last in (False, True)]
+    results = []
+    for graph in graphs:
+        graph.flush()
+        pred, loss = graph.forward(X)[-2:]
+        dx = graph.backward()
+        results.append([pred, loss, dx] + [g.copy() for g in graph.grads()])
+        graph.optimstep(0.1, 0.0, 0.0)
+        graph.eval()
+        graph.flush()
+        results[-1].append(graph.forward(X, removelossnode=1)[-1])
+        results[-1].append(graph.compile_inference()(X))
+    nchw, nhwc = results
+    assert len(nchw) == len(nhwc)
+    for a, b in zip(nhwc, nchw):
+        assert np.shape(a) == np.shape(b)
+        # 只差浮点求和顺序; BatchNorm前的卷积bias梯度理论上为0, 只有舍入误差
+        np.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-13)
+    for k in (1, 5):
+        np.testing.assert_allclose(graphs[1][k].mean.reshape(-1), graphs[0][k].mean.reshape(-1), rtol=1e-13)
+        np.testing.assert_allclose(graphs[1][k].std.reshape(-1), graphs[0][k].std.reshape(-1), rtol=1e-13)
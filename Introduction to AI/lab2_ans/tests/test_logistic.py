@@ -0,0 +1,37 @@
+import pickle
+import numpy as np
+import answerLogisticRegression as LR
+
+
+def separable(n=400, d=20, k=4):
+    rng = np.random.default_rng(0)
+    Y = rng.integers(0, k, n)
+    X = (rng.random((n, d)) < 0.1).astype(np.uint8)
+    X[np.arange(n), Y] = 1
+    X[np.arange(n), k + Y] = 1
+    return X, Y
+
+
+def test_trainovr_integer_input(tmp_path, capsys):
+    X, Y = separable()
+    np.random.seed(0)
+    model = LR.trainOVR(X, Y, num_class=4)
+    assert capsys.readouterr().out == ""
+    # uint8输入时参数为float32, 不会被截断为整数
+    assert model.weight.dtype == np.float32 and model.bias.dtype == np.float32
+    assert np.mean(model(X) == Y) > 0.95
+
+    path = tmp_path / "lr.npy"
+    model.save(path)
+    with open(path, "rb") as f:
+        weight, bias = pickle.load(f)
+    # 与MnistModel.LRModel相同的逐样本预测
+    pred = [int(np.argmax(x @ weight + bias)) for x in X.astype(np.float32)]
+    np.testing.assert_array_equal(pred, model(X))
+
+
+def test_trainovr_verbose(capsys):
+    X, Y = separable()
+    LR.trainOVR(X.astype(np.float64), Y, num_class=4, verbose=True)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == LR.max_epoch and lines[0].startswith("epoch 1 ")
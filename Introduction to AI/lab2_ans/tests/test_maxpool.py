@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+
+
+def pool(x, grad, direct, channels_last, k):
+    node = BaseNode.MaxPool2D(pool_size=k, stride=k)
+    node.channels_last = channels_last
+    node.isdirect = lambda: direct
+    out = node.cal(x)
+    return out, node.backcal(grad)
+
+
+@pytest.mark.parametrize("shape", [(2, 3, 8, 8), (2, 2, 7, 9)])
+@pytest.mark.parametrize("k", [2, 3])
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_direct_matches_im2col(shape, k, channels_last):
+    rng = np.random.default_rng(0)
+    # 取值很少, 窗口内有大量相等的最大值; 两种实现都把梯度给第一个最大值
+    x = rng.integers(0, 3, shape).astype(np.float64)
+    if channels_last:
+        x = np.ascontiguousarray(x.transpose(0, 2, 3, 1))
+    H, W = x.shape[1:3] if channels_last else x.shape[2:]
+    outshape = (x.shape[0], H // k, W // k, x.shape[3]) if channels_last else x.shape[:2] + (H // k, W // k)
+    grad = rng.standard_normal(outshape)
+    ref = pool(x, grad, False, channels_last, k)
+    got = pool(x, grad, True, channels_last, k)
+    np.testing.assert_array_equal(got[0], ref[0])
+    np.testing.assert_array_equal(got[1], ref[1])
+    # 每个窗口的梯度只给一个位置
+    assert np.count_nonzero(got[1]) == np.count_nonzero(grad)
@@ -0,0 +1,104 @@
+import tracemalloc
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Optimizer import SGD, Adam, AdamW
+
+
+LR, WD1, WD2 = 0.1, 1e-3, 1e-2
+
+
+def reference(name, p, gs):
+    # 教科书公式, 逐步展开, 不做任何原地优化
+    p = p.copy()
+    v = np.zeros_like(p)
+    m = np.zeros_like(p)
+    for t, g in enumerate(gs, start=1):
+        decay = WD1 * np.sign(p) + WD2 * p
+        if name == "momentum":
+            v = 0.9 * v + (g + decay)
+            p = p - LR * v
+        elif name == "nesterov":
+            v = 0.9 * v + (g + decay)
+            p = p - LR * ((g + decay) + 0.9 * v)
+        else:
+            if name == "adamw":
+                p = p - LR * decay
+            else:
+                g = g + decay
+            m = 0.9 * m + 0.1 * g
+            v = 0.999 * v + 0.001 * g ** 2
+            mhat = m / (1 - 0.9 ** t)
+            vhat = v / (1 - 0.999 ** t)
+            p = p - LR * mhat / (np.sqrt(vhat) + 1e-8)
+    return p
+
+
+def make(name):
+    return {
+        "momentum": lambda: SGD(momentum=0.9),
+        "nesterov": lambda: SGD(momentum=0.9, nesterov=True),
+        "adam": lambda: Adam(),
+        "adamw": lambda: AdamW(),
+    }[name]()
+
+
+NAMES = ["momentum", "nesterov", "adam", "adamw"]
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_step_matches_textbook(name):
+    rng = np.random.default_rng(0)
+    p0 = rng.standard_normal((4, 5))
+    gs = [rng.standard_normal((4, 5)) for _ in range(3)]
+    p = p0.copy()
+    opt = make(name)
+    for g in gs:
+        opt.step([p], [g.copy()], LR, WD1, WD2)
+    # 实现把偏差修正合并进步长, eps的位置与教科书差一个sqrt(1-beta2^t)因子, 影响在1e-8量级
+    np.testing.assert_allclose(p, reference(name, p0, gs), rtol=1e-6, atol=1e-7)
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_step_is_inplace(name):
+    rng = np.random.default_rng(1)
+    p = rng.standard_normal(100000)
+    g = rng.standard_normal(100000)
+    opt = make(name)
+    ident = id(p)
+    # 第一步分配状态, 之后每步不应再分配与参数同大小的数组
+    opt.step([p], [g], LR, WD1, WD2)
+    bufs = [id(a) for a in opt.state[0].values()]
+    tracemalloc.start()
+    try:
+        opt.step([p], [g], LR, WD1, WD2)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert id(p) == ident
+    assert [id(a) for a in opt.state[0].values()] == bufs
+    assert peak < p.nbytes // 4
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_astype_resets_state(name):
+    rng = np.random.default_rng(2)
+    lin = BaseNode.Linear(3, 2)
+    graph = Graph([lin], optimizer=make(name))
+    for node in graph:
+        node.grad = [rng.standard_normal(p.shape) for p in node.params]
+    graph.optimstep(LR, WD1, WD2)
+    assert opt_dtypes(graph) == {np.float64}
+    graph.astype(np.float32)
+    assert graph.optimizer.state == []
+    assert getattr(graph.optimizer, "t", 0) == 0
+    for node in graph:
+        node.grad = [g.astype(np.float32) for g in node.grad]
+    graph.optimstep(LR, WD1, WD2)
+    assert opt_dtypes(graph) == {np.float32}
+    assert all(p.dtype == np.float32 for p in graph.parameters())
+
+
+def opt_dtypes(graph):
+    return {a.dtype.type for state in graph.optimizer.state for a in state.values()}
@@ -0,0 +1,72 @@
+import numpy as np
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Optimizer import SGD
+from autograd.Parallel import DataParallel
+
+
+def buildcnn(Y, channels_last):
+    np.random.seed(0)
+    graph = Graph([
+        BaseNode.Conv2D(input_channels=2, output_channels=4, kernel_size=3, padding=1),
+        BaseNode.MyBatchNorm(indim=4),
+        BaseNode.relu(),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=4 * 6 * 6, outdim=8),
+        BaseNode.BatchNorm(indim=8),
+        BaseNode.relu(),
+        BaseNode.Linear(indim=8, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ], SGD(momentum=0.9), np.float64)
+    graph.channelslast(channels_last)
+    return graph
+
+
+def train(num_workers, channels_last=False, steps=4):
+    rng = np.random.default_rng(1)
+    X = rng.standard_normal((24, 2, 6, 6))
+    Y = rng.integers(0, 3, 24)
+    graph = buildcnn(Y, channels_last)
+    losses = []
+    with DataParallel(graph, X, Y, num_workers) as dp:
+        dp.train()
+        for i in range(steps):
+            perm = np.arange(24)[i % 2::2] if i % 2 else np.arange(24)
+            losses.append(dp.step(perm, 0.05, 0.0, 1e-4)[1])
+    return graph, losses
+
+
+def test_batchnorm_matches_serial():
+    # BatchNorm的统计量在进程之间all-reduce后, 数据并行与单进程的训练结果只差浮点求和顺序
+    for channels_last in (False, True):
+        serial, serial_losses = train(1, channels_last)
+        parallel, parallel_losses = train(2, channels_last)
+        np.testing.assert_allclose(parallel_losses, serial_losses, rtol=1e-10)
+        for p, q in zip(parallel.parameters(), serial.parameters()):
+            np.testing.assert_allclose(p, q, rtol=1e-9, atol=1e-12)
+        for k in (1, 5):
+            np.testing.assert_allclose(parallel[k].mean, serial[k].mean, rtol=1e-9, atol=1e-12)
+            np.testing.assert_allclose(parallel[k].std, serial[k].std, rtol=1e-9, atol=1e-12)
+
+
+def test_worker_error_releases_shared_memory():
+    X = np.random.standard_normal((8, 2, 6, 6))
+    Y = np.zeros(8, dtype=np.int64)
+    graph = buildcnn(Y, False)
+    dp = DataParallel(graph, X, Y, 2)
+    names = [shm.name for shm in dp.shms]
+    try:
+        dp.step(np.array([0, 1, 100, 101]), 0.05, 0.0, 0.0)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("out-of-range index should fail in the workers")
+    assert dp.workers == [] and dp.shms == []
+    assert all(isinstance(p, np.ndarray) and p.base is None for p in graph.parameters())
+    from multiprocessing import shared_memory
+    for name in names:
+        try:
+            shared_memory.SharedMemory(name=name).close()
+        except FileNotFoundError:
+            continue
+        raise AssertionError(f"{name} was not unlinked")
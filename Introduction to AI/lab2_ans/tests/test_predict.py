@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+
+# MnistModel依赖课程提供的mnist和model*模块, 不在仓库中时跳过
+MnistModel = pytest.importorskip("MnistModel")
+import answerRandomForest
+
+
+def randomdata(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((n, 784)), rng.integers(0, 10, n)
+
+
+def persample(model, X):
+    return np.array([np.ravel(model(x))[0] for x in X])
+
+
+def test_lr_batch_matches_persample():
+    X, _ = randomdata()
+    rng = np.random.default_rng(1)
+    model = object.__new__(MnistModel.LRModel)
+    model.weight, model.bias = rng.standard_normal((784, 10)), rng.standard_normal(10)
+    np.testing.assert_array_equal(model.predict_batch(X), persample(model, X))
+    model.weight, model.bias = rng.standard_normal(784), 0.1
+    np.testing.assert_array_equal(model.predict_batch(X), persample(model, X))
+
+
+def test_tree_batch_matches_persample():
+    X, Y = randomdata()
+    Xd = MnistModel.Tree.discretize(X)
+    model = object.__new__(MnistModel.TreeModel)
+    model.root = answerRandomForest.buildTree(Xd, Y, list(range(784)), 6, 1.0, answerRandomForest.negginiDA)
+    model.flat = MnistModel.Tree.flattenTrees([model.root])
+    np.testing.assert_array_equal(model.predict_batch(X), persample(model, X))
+
+
+def test_forest_batch_matches_persample(monkeypatch):
+    X, Y = randomdata()
+    monkeypatch.setattr(answerRandomForest, "num_tree", 5)
+    monkeypatch.setattr(answerRandomForest, "num_workers", 1)
+    monkeypatch.setitem(answerRandomForest.hyperparams, "depth", 6)
+    model = object.__new__(MnistModel.ForestModel)
+    model.roots = answerRandomForest.buildtrees(MnistModel.Forest.discretize(X), Y)
+    model.flat = MnistModel.Forest.flattenTrees(model.roots)
+    np.testing.assert_array_equal(model.predict_batch(X), persample(model, X))
+
+
+@pytest.mark.parametrize("kind", ["MLPModel", "CNNModel"])
+def test_graph_batch_matches_persample(kind):
+    X, Y = randomdata(n=50)
+    np.random.seed(0)
+    if kind == "MLPModel":
+        nodes = [BaseNode.Linear(784, 32), BaseNode.relu(), BaseNode.Linear(32, 10)]
+    else:
+        nodes = [BaseNode.Conv2D(input_channels=1, output_channels=2, kernel_size=3), BaseNode.relu(),
+                 BaseNode.MaxPool2D(pool_size=2), BaseNode.Flatten(), BaseNode.Linear(2 * 13 * 13, 10)]
+    graph = Graph(nodes + [BaseNode.SoftmaxCrossEntropy(Y)])
+    model = object.__new__(getattr(MnistModel, kind))
+    model.graph = graph.compile_inference()
+    np.testing.assert_array_equal(model.predict_batch(X), persample(model, X))
+    # 分块不影响结果
+    inputs = X if kind == "MLPModel" else X.reshape(-1, 1, 28, 28)
+    np.testing.assert_allclose(MnistModel.chunkedforward(model.graph, inputs, chunk=7), model.graph(inputs))
+
+
+def test_missing_quantized_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError, match="quantize.py"):
+        MnistModel.QMLPModel()
+    with pytest.raises(FileNotFoundError, match="quantize.py"):
+        MnistModel.QCNNModel()
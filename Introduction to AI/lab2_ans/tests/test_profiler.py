@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Parallel import DataParallel
+from autograd.Profiler import Profiler
+
+
+def buildgraph(Y):
+    np.random.seed(0)
+    return Graph([
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=36, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ])
+
+
+def test_views_are_not_allocations():
+    X = np.random.default_rng(0).standard_normal((5, 1, 6, 6))
+    Y = np.arange(5) % 3
+    graph = buildgraph(Y)
+    profiler = graph.profile(Profiler())
+    graph.flush()
+    graph.forward(X)
+    graph.backward()
+    records = profiler.records
+    # 连续输入上Flatten的正向和反向都只是reshape; Linear反向的FLOPs为正向的2倍
+    assert records[0]["alloc"] == 0
+    assert records[1]["alloc"] >= 5 * 3 * 8
+    assert records[1]["calls"] == 1 and records[1]["flops"] == 3 * (2 * 5 * 36 * 3)
+
+
+def test_profiler_requires_single_process():
+    X = np.zeros((4, 1, 6, 6))
+    Y = np.zeros(4, dtype=np.int64)
+    graph = buildgraph(Y)
+    graph.profile(Profiler())
+    with pytest.raises(ValueError, match="num_workers = 1"):
+        DataParallel(graph, X, Y, 2)
+    with DataParallel(graph, X, Y, 1) as dp:
+        dp.step(np.arange(4), 0.1, 0.0, 0.0)
+    assert graph.profiler.records[0]["calls"] == 1
+
+
+def test_checkpoint_recompute_has_own_column(capsys):
+    X = np.random.default_rng(0).standard_normal((5, 1, 6, 6))
+    Y = np.arange(5) % 3
+    graph = Graph([
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=36, outdim=8),
+        BaseNode.relu(),
+        BaseNode.Linear(indim=8, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ])
+    graph.checkpoint([2])
+    profiler = graph.profile(Profiler())
+    graph.flush()
+    graph.forward(X)
+    graph.backward()
+    records = profiler.records
+    # 第一段(0, 1)在反向传播时重算一次, 不计入forward的调用次数
+    assert all(rec["calls"] == 1 for rec in records.values())
+    assert records[1]["recompute"] > 0 and records[3]["recompute"] == 0
+    f1, f3 = 2 * 5 * 36 * 8, 2 * 5 * 8 * 3
+    # 正向、重算各一次, 反向为正向的2倍
+    assert records[1]["flops"] == f1 + f1 + 2 * f1
+    assert records[3]["flops"] == f3 + 2 * f3
+    profiler.report("ckpt")
+    assert "recompute s" in capsys.readouterr().out
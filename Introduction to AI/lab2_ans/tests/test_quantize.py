@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Quantize import quantize, report
+
+
+@pytest.mark.parametrize("K", [5, BaseNode.INT8_EXACT_K, BaseNode.INT8_EXACT_K + 1, 3 * BaseNode.INT8_EXACT_K + 7])
+def test_int8dot_matches_int64(K):
+    rng = np.random.default_rng(K)
+    xq = rng.integers(-127, 128, (9, K))
+    wq = rng.integers(-127, 128, (K, 6)).astype(np.int8)
+    # 最坏情况: 每一项都为127*127, 检查float32分块后仍然精确
+    xq[0] = 127
+    wq[:, 0] = 127
+    xq[1] = -127
+    got = BaseNode.int8dot(xq.astype(np.float32), wq)
+    assert got.dtype == np.float32
+    # 累加精确, 只在最后转换为float32时舍入一次
+    np.testing.assert_array_equal(got, (xq @ wq.astype(np.int64)).astype(np.float32))
+
+
+def test_quantize_rounds_and_clips():
+    X = np.array([[0.24, -0.26, 3.0, -3.0, 0.5]], dtype=np.float32)
+    np.testing.assert_array_equal(BaseNode.quantize(X, 100.0), [[24, -26, 127, -127, 50]])
+    np.testing.assert_array_equal(BaseNode.quantize(X, 10.0, np.full(5, 1.0, dtype=np.float32)), [[3, -2, 31, -29, 6]])
+
+
+def trainedmlp():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((3, 20)) * 2
+    Y = rng.integers(0, 3, 600)
+    X = (centers[Y] + rng.standard_normal((600, 20))).astype(np.float32)
+    np.random.seed(0)
+    graph = Graph([BaseNode.Linear(20, 16), BaseNode.relu(), BaseNode.Linear(16, 3),
+                   BaseNode.SoftmaxCrossEntropy(Y[:400])], dtype=np.float32)
+    for _ in range(50):
+        graph.flush()
+        graph.forward(X[:400])
+        graph.backward()
+        graph.optimstep(0.5 / 400, 0.0, 0.0)
+    return graph, X, Y
+
+
+def test_quantized_graph(tmp_path, monkeypatch):
+    graph, X, Y = trainedmlp()
+    qgraph = quantize(graph, X[400:500])
+    assert isinstance(qgraph[0], BaseNode.QuantLinear)
+    # report不在当前目录留下文件
+    monkeypatch.chdir(tmp_path)
+    stats = report(graph, qgraph, X[500:], Y[500:])
+    assert list(tmp_path.iterdir()) == []
+    assert stats["acc"] > 0.9 and abs(stats["delta"]) <= 0.03
+    assert stats["qsize"] < stats["size"]
+
+    qgraph[-1].y = Y[:10]
+    qgraph.flush()
+    qgraph.forward(X[:10])
+    with pytest.raises(RuntimeError, match="只用于推理"):
+        qgraph.backward()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Serialize import savegraph, loadgraph
+
+
+def buildcnn(Y, dtype, channels_last):
+    np.random.seed(0)
+    graph = Graph([
+        BaseNode.Conv2D(input_channels=1, output_channels=4, kernel_size=3),
+        BaseNode.MyBatchNorm(indim=4),
+        BaseNode.relu(),
+        BaseNode.MaxPool2D(pool_size=2),
+        BaseNode.Flatten(),
+        BaseNode.Linear(indim=4 * 3 * 3, outdim=6),
+        BaseNode.BatchNorm(indim=6),
+        BaseNode.relu(),
+        BaseNode.Dropout(p=0.2),
+        BaseNode.Linear(indim=6, outdim=3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ], dtype=dtype)
+    graph.channelslast(channels_last)
+    return graph
+
+
+@pytest.mark.parametrize("dtype, channels_last", [(np.float64, False), (np.float32, True)])
+@pytest.mark.parametrize("mmap_mode", ["c", None])
+def test_roundtrip(tmp_path, dtype, channels_last, mmap_mode):
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((10, 1, 8, 8)).astype(dtype)
+    Y = rng.integers(0, 3, 10)
+    graph = buildcnn(Y, dtype, channels_last)
+    for _ in range(2):
+        graph.flush()
+        graph.forward(X)
+        graph.backward()
+        graph.optimstep(0.1, 0.0, 0.0)
+    graph.eval()
+    graph.flush()
+    expect = graph.forward(X, removelossnode=1)[-1]
+
+    path = tmp_path / "cnn.model"
+    savegraph(graph, path)
+    loaded = loadgraph(path, mmap_mode=mmap_mode)
+    assert [type(node) for node in loaded] == [type(node) for node in graph]
+    assert loaded.dtype == np.dtype(dtype)
+    for p, q in zip(loaded.parameters(), graph.parameters()):
+        assert p.dtype == q.dtype
+        np.testing.assert_array_equal(p, q)
+    for k in (1, 6):
+        np.testing.assert_array_equal(loaded[k].mean, graph[k].mean)
+        np.testing.assert_array_equal(loaded[k].std, graph[k].std)
+    assert loaded[0].channels_last == channels_last
+    loaded.eval()
+    loaded.flush()
+    np.testing.assert_array_equal(loaded.forward(X, removelossnode=1)[-1], expect)
+    np.testing.assert_array_equal(loaded.compile_inference()(X), graph.compile_inference()(X))
+
+    # 加载的模型可以继续训练, 写时复制不修改文件
+    loaded.train()
+    loaded[-1].y = Y
+    loaded.flush()
+    loaded.forward(X)
+    loaded.backward()
+    loaded.optimstep(0.1, 0.0, 0.0)
+    np.testing.assert_array_equal(loadgraph(path)[0].params[0], graph[0].params[0])
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.model"
+    path.write_bytes(b"not a model")
+    with pytest.raises(ValueError):
+        loadgraph(path)
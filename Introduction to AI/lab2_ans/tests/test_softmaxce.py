@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+
+
+def numgrad(f, x, eps=1e-6):
+    # 中心差分, 逐元素
+    g = np.zeros_like(x)
+    for i in np.ndindex(*x.shape):
+        old = x[i]
+        x[i] = old + eps
+        fp = f()
+        x[i] = old - eps
+        fm = f()
+        x[i] = old
+        g[i] = (fp - fm) / (2 * eps)
+    return g
+
+
+def randomlogits(shape=(6, 5), seed=0):
+    rng = np.random.default_rng(seed)
+    # 较大的logits检验数值稳定性
+    return rng.standard_normal(shape) * 4, rng.integers(0, shape[-1], shape[:-1])
+
+
+@pytest.mark.parametrize("shape", [(6, 5), (3, 4, 5)])
+@pytest.mark.parametrize("upstream", [1.0, 0.25])
+def test_matches_logsoftmax_nllloss(shape, upstream):
+    X, y = randomlogits(shape)
+    fused = BaseNode.SoftmaxCrossEntropy(y)
+    logsoftmax, nll = BaseNode.LogSoftmax(), BaseNode.NLLLoss(y)
+    loss = fused.cal(X)
+    expected = nll.cal(logsoftmax.cal(X))
+    # LogSoftmax在log中加了1e-6, 两者只差这一项
+    np.testing.assert_allclose(loss, expected, rtol=0, atol=1e-5 * y.size)
+    np.testing.assert_allclose(fused.backcal(upstream), logsoftmax.backcal(nll.backcal(upstream)), rtol=0, atol=1e-5)
+
+
+def test_gradient_matches_finite_difference():
+    X, y = randomlogits()
+    node = BaseNode.SoftmaxCrossEntropy(y)
+
+    def loss():
+        node.flush()
+        return node.cal(X)
+    loss()
+    grad = node.backcal(1.0)
+    np.testing.assert_allclose(grad, numgrad(loss, X), rtol=1e-6, atol=1e-8)
+
+
+def test_repeated_backward():
+    X, y = randomlogits()
+    node = BaseNode.SoftmaxCrossEntropy(y)
+    node.cal(X)
+    prob = node.cache[-1].copy()
+    first = node.backcal(1.0)
+    # 缓存的softmax不被修改, 第二次反向传播结果相同
+    np.testing.assert_array_equal(node.cache[-1], prob)
+    np.testing.assert_array_equal(node.backcal(1.0), first)
+    np.testing.assert_allclose(node.backcal(0.5), 0.5 * first)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import autograd.BaseNode as BaseNode
+from autograd.BaseGraph import Graph
+from autograd.Serialize import loadgraph
+from autograd.Trainer import Trainer, ConstantLR, StepLR, CosineLR, WarmupLR
+
+
+def test_steplr():
+    schedule = StepLR(0.1, step_size=2, gamma=0.5)
+    for epoch, lr in [(0, 0.1), (1, 0.1), (1.999, 0.1), (2, 0.05), (3.5, 0.05), (4, 0.025)]:
+        assert schedule(epoch) == pytest.approx(lr)
+
+
+def test_cosinelr():
+    schedule = CosineLR(1.0, max_epoch=4, min_lr=0.1)
+    for epoch, lr in [(0, 1.0), (2, 0.55), (4, 0.1), (6, 0.1)]:
+        assert schedule(epoch) == pytest.approx(lr)
+    assert schedule(1) == pytest.approx(0.1 + 0.9 * (1 + np.cos(np.pi / 4)) / 2)
+
+
+def test_warmuplr():
+    schedule = WarmupLR(CosineLR(0.2, max_epoch=10), warmup=2)
+    assert schedule(0) == 0
+    assert schedule(1) == pytest.approx(0.5 * CosineLR(0.2, max_epoch=10)(1))
+    for epoch in (2, 3, 10):
+        assert schedule(epoch) == pytest.approx(CosineLR(0.2, max_epoch=10)(epoch))
+
+
+def makedata(n, seed):
+    # 线性可分的三分类
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, 4))
+    Y = np.argmax(X[:, :3] + 0.5 * X[:, 3:], axis=1)
+    return X, Y
+
+
+def buildgraph(Y):
+    np.random.seed(0)
+    return Graph([
+        BaseNode.Linear(4, 16),
+        BaseNode.BatchNorm(16),
+        BaseNode.relu(),
+        BaseNode.Linear(16, 3),
+        BaseNode.SoftmaxCrossEntropy(Y),
+    ])
+
+
+def test_patience_stops_training():
+    X, Y = makedata(64, 0)
+    valX, valY = makedata(32, 1)
+    # 学习率为0, 验证集准确率在第一个epoch之后不会再提升
+    with Trainer(buildgraph(Y), X, Y, 16, ConstantLR(0.0), valX=valX, valY=valY, patience=2) as trainer:
+        history = trainer.fit(10)
+    assert len(history) == 3
+    assert len({h["valacc"] for h in history}) == 1
+
+
+def test_restores_best_model(tmp_path):
+    X, Y = makedata(256, 0)
+    valX, valY = makedata(128, 1)
+    path = str(tmp_path / "best.model")
+
+    def schedule(epoch):
+        # 前几个epoch正常训练, 之后学习率过大, 模型变差
+        return 0.1 if epoch < 4 else 50.0
+    with Trainer(buildgraph(Y), X, Y, 32, schedule, valX=valX, valY=valY, save_path=path) as trainer:
+        history = trainer.fit(7)
+        graph = trainer.graph
+    valaccs = [h["valacc"] for h in history]
+    best = max(valaccs)
+    assert valaccs[-1] < best and trainer.bestacc == best
+    # 恢复后的计算图和保存的文件都得到最好的验证集准确率
+    assert trainer.evaluate(valX, valY) == best
+    saved = loadgraph(path)
+    np.testing.assert_array_equal(saved[1].mean, graph[1].mean)
+    infer = saved.compile_inference()
+    assert np.mean(np.argmax(infer(valX), axis=-1) == valY) == best
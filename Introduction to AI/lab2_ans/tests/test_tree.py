@@ -0,0 +1,71 @@
+import numpy as np
+import answerTree
+from answerTree import countMatrix, buildTree, buildTreeSplit, encode, gain, gainratio, negginiDA
+
+
+def randomdata(n=300, d=12, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 4, (n, d))
+    Y = (X[:, 0] + X[:, 3] * (X[:, 5] > 1) + rng.integers(0, 2, n)) % 3
+    return X, Y
+
+
+def sametree(a, b):
+    assert a.label == b.label and a.featidx == b.featidx
+    assert a.children.keys() == b.children.keys()
+    for k in a.children:
+        sametree(a.children[k], b.children[k])
+
+
+def test_countmatrix_chunks(monkeypatch):
+    X, Y = randomdata()
+    values, Xc = encode(X)
+    labels, Yc = encode(Y)
+    idx = np.flatnonzero(np.arange(X.shape[0]) % 3)
+    feats = [7, 1, 4, 0, 10]
+    weight = np.random.default_rng(1).integers(0, 3, X.shape[0]).astype(np.float64)
+    expect = np.zeros((len(feats), values.size, labels.size))
+    for i, f in enumerate(feats):
+        np.add.at(expect[i], (Xc[idx, f], Yc[idx]), weight[idx])
+    # 每块只有一个或两个特征
+    for chunk in [1 << 22, idx.size, 2 * idx.size]:
+        monkeypatch.setattr(answerTree, "COUNT_CHUNK", chunk)
+        np.testing.assert_array_equal(countMatrix(Xc, Yc, idx, feats, values.size, labels.size, weight), expect)
+        counts = countMatrix(Xc, Yc, idx, feats, values.size, labels.size)
+        assert counts.dtype == np.int64
+        np.testing.assert_array_equal(counts, countMatrix(Xc, Yc, idx, feats, values.size, labels.size, np.ones(X.shape[0])))
+
+
+def test_counts_match_gainfunc():
+    # 计数矩阵上的增益与逐特征调用gainfunc相同(含没有出现的特征值)
+    X, Y = randomdata()
+    values, Xc = encode(X)
+    labels, Yc = encode(Y)
+    rng = np.random.default_rng(2)
+    feats = list(range(X.shape[1]))
+    for gainfunc, countfunc in answerTree.countgains.items():
+        for size in [X.shape[0], 40, 7]:
+            idx = np.sort(rng.choice(X.shape[0], size, replace=False))
+            counts = countMatrix(Xc, Yc, idx, feats, values.size, labels.size)
+            expect = [gainfunc(X[idx], Y[idx], f) for f in feats]
+            np.testing.assert_allclose(countfunc(counts), expect, rtol=1e-9, atol=1e-12)
+
+
+def test_counts_tree_matches_split():
+    X, Y = randomdata(1000)
+    for gainfunc in [gain, gainratio, negginiDA]:
+        fast = buildTree(X, Y, list(range(X.shape[1])), 4, 0.95, gainfunc)
+        slow = buildTreeSplit(X, Y, list(range(X.shape[1])), 4, 0.95, gainfunc)
+        sametree(fast, slow)
+
+
+def test_custom_gainfunc_not_replaced():
+    # 与内置函数同名的自定义gainfunc不走计数矩阵的实现
+    X, Y = randomdata()
+    calls = []
+
+    def gain(X, Y, idx):
+        calls.append(idx)
+        return -idx
+    root = buildTree(X, Y, list(range(X.shape[1])), 1, 0.99, gain)
+    assert calls and root.featidx == 0
@@ -1,11 +1,19 @@
 import math
+import itertools
+import os
+import sys
 from SST_2.dataset import traindataset, minitraindataset
 from fruit import get_document, tokenize
 import pickle
 import numpy as np
 from importlib.machinery import SourcelessFileLoader
+# autograd直接从lab2_ans导入, 不需要把lab2的文件复制过来
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "lab2_ans"))
 from autograd.BaseGraph import Graph
 from autograd.BaseNode import *
+from autograd.Serialize import savegraph, loadgraph
+from autograd.DataLoader import Prefetcher
+from autograd.Quantize import quantize, report, quant_path
 
 class NullModel:
     def __init__(self):
@@ -60,7 +68,7 @@ class NaiveBayesModel:
 def buildGraph(dim, num_classes): #dim: 输入一维向量长度， num_classes:分类数
     # TODO: YOUR CODE HERE
     # 填写网络结构，请参考lab2相关部分
-    # 填写代码前，请确定已经将lab2写好的BaseNode.py与BaseGraph.py放在autograd文件夹下
+    # 使用的是lab2_ans/autograd中写好的BaseNode与BaseGraph(见文件开头)
     nodes = [
         Linear(dim, 128),
         relu(),
@@ -71,7 +79,7 @@ def buildGraph(dim, num_classes): #dim: 输入一维向量长度， num_classes:
     graph = Graph(nodes)
     return graph
 
-save_path = "model/mlp.npy"
+save_path = "model/mlp.model"
 
 class Embedding():
     def __init__(self):
@@ -98,8 +106,7 @@ class Embedding():
 class MLPModel():
     def __init__(self):
         self.embedding = Embedding()
-        with open(save_path, "rb") as f:
-            self.network = pickle.load(f)
+        self.network = loadgraph(save_path, mmap_mode="r")
         self.network.eval()
         self.network.flush()
 
@@ -110,6 +117,19 @@ class MLPModel():
         return haty[0]
 
 
+class QMLPModel(MLPModel):
+    '''
+    int8量化的MLP, 由训练结束后的量化生成
+    '''
+    def __init__(self):
+        if not os.path.exists(quant_path(save_path)):
+            raise FileNotFoundError(f"{quant_path(save_path)} 不存在, 请先运行 python FruitModel.py 训练并生成量化模型")
+        self.embedding = Embedding()
+        self.network = loadgraph(quant_path(save_path), mmap_mode="r")
+        self.network.eval()
+        self.network.flush()
+
+
 class QAModel():
     def __init__(self):
         self.document_list = get_document()
@@ -149,6 +169,26 @@ modeldict = {
     "QA": QAModel,
 }
 
+# 量化模型不随代码提交, 只在训练(见__main__)生成之后才注册
+if os.path.exists(quant_path(save_path)):
+    modeldict["QMLP"] = QMLPModel
+
+
+def embedbatches(dataloader, embedding, batchsize):
+    """
+    把数据集逐条embedding后拼成mini-batch, 不足batchsize的最后一个batch丢弃
+    @return: 依次产生 (X, Y)
+    """
+    X = []
+    Y = []
+    for text, label in dataloader:
+        X.append(embedding(text))
+        Y.append(np.zeros((1)).astype(np.int32) + label)
+        if len(X) == batchsize:
+            yield np.concatenate(X, 0), np.concatenate(Y, 0)
+            X = []
+            Y = []
+
 
 if __name__ == '__main__':
     embedding = Embedding()
@@ -165,39 +205,46 @@ if __name__ == '__main__':
     best_train_acc = 0
     dataloader = traindataset() # 完整训练集
     #dataloader = minitraindataset() # 用来调试的小训练集
+    # int8量化用2 * calib_batches个batch校准和比较; 默认取自训练集,
+    # holdout为True时随机留出这些样本不参与训练(训练集相应变小), 比较的准确率不受训练数据影响
+    calib_batches = 16
+    holdout = False
+    if holdout:
+        samples = list(dataloader)
+        heldout = np.zeros(len(samples), dtype=bool)
+        heldout[np.random.default_rng(0).permutation(len(samples))[:2 * calib_batches * batchsize]] = True
+        dataloader = [sample for sample, held in zip(samples, heldout) if not held]
+        quantset = [sample for sample, held in zip(samples, heldout) if held]
+    else:
+        quantset = dataloader
     for i in range(1, max_epoch+1):
         hatys = []
         ys = []
         losss = []
         graph.train()
-        X = []
-        Y = []
-        cnt = 0
-        for text, label in dataloader:
-            x = embedding(text)
-            label = np.zeros((1)).astype(np.int32) + label
-            X.append(x)
-            Y.append(label)
-            cnt += 1
-            if cnt == batchsize:
-                X = np.concatenate(X, 0)
-                Y = np.concatenate(Y, 0)
-                graph[-1].y = Y
-                graph.flush()
-                pred, loss = graph.forward(X)[-2:]
-                hatys.append(np.argmax(pred, axis=1))
-                ys.append(Y)
-                graph.backward()
-                graph.optimstep(lr, wd1, wd2)
-                losss.append(loss)
-                cnt = 0
-                X = []
-                Y = []
+        # 后台线程做下一个batch的embedding, 与当前batch的计算重叠
+        for X, Y in Prefetcher(embedbatches(dataloader, embedding, batchsize)):
+            graph[-1].y = Y
+            graph.flush()
+            pred, loss = graph.forward(X)[-2:]
+            hatys.append(np.argmax(pred, axis=1))
+            ys.append(Y)
+            graph.backward()
+            graph.optimstep(lr, wd1, wd2)
+            losss.append(loss)
 
         loss = np.average(losss)
         acc = np.average(np.concatenate(hatys)==np.concatenate(ys))
         print(f"epoch {i} loss {loss:.3e} acc {acc:.4f}")
         if acc > best_train_acc:
             best_train_acc = acc
-            with open(save_path, "wb") as f:
-                pickle.dump(graph, f)
\ No newline at end of file
+            savegraph(graph, save_path)
+
+    # int8量化: 前calib_batches个batch用于校准, 之后的calib_batches个batch用于比较准确率
+    batches = list(itertools.islice(embedbatches(quantset, embedding, batchsize), 2 * calib_batches))
+    X = np.concatenate([X for X, _ in batches])
+    Y = np.concatenate([Y for _, Y in batches])
+    graph = loadgraph(save_path, mmap_mode=None)
+    qgraph = quantize(graph, X[:calib_batches * batchsize])
+    report(graph, qgraph, X[calib_batches * batchsize:], Y[calib_batches * batchsize:])
+    savegraph(qgraph, quant_path(save_path))
\ No newline at end of file